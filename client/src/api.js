@@ -9,6 +9,21 @@ export const apiClient = axios.create({
   withCredentials: true,
 });
 
+// Turn a server-relative path (e.g. an EHTool layer image URL) into an absolute URL.
+export const resolveApiUrl = (path) =>
+  path && path.startsWith("/") ? `${BASE_URL}${path}` : path;
+
+// Fetch a binary image endpoint and return it as a data URL (for canvas use).
+export async function fetchImageDataUrl(path) {
+  const res = await apiClient.get(path, { responseType: "blob" });
+  return new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = () => resolve(reader.result);
+    reader.onerror = () => reject(reader.error);
+    reader.readAsDataURL(res.data);
+  });
+}
+
 const buildFilePath = (file) => {
   if (!file) return "";
   if (typeof file === "string") return file;
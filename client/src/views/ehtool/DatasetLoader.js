@@ -1,5 +1,5 @@
 import React, { useState } from "react";
-import { Card, Form, Input, Button, message } from "antd";
+import { Card, Form, Input, Button, Progress, message } from "antd";
 import { FolderOpenOutlined, UploadOutlined } from "@ant-design/icons";
 import UnifiedFileInput from "../../components/UnifiedFileInput";
 
@@ -7,7 +7,7 @@ import UnifiedFileInput from "../../components/UnifiedFileInput";
  * Dataset Loader Component
  * Interface for loading image datasets
  */
-function DatasetLoader({ onLoad, loading }) {
+function DatasetLoader({ onLoad, loading, progress }) {
   const [form] = Form.useForm();
 
   const handleSubmit = (values) => {
@@ -85,6 +85,8 @@ function DatasetLoader({ onLoad, loading }) {
         </Form.Item>
       </Form>
 
+      {progress && <LoadProgress progress={progress} />}
+
       <div
         style={{
           marginTop: "24px",
@@ -104,4 +106,47 @@ function DatasetLoader({ onLoad, loading }) {
   );
 }
 
+const STAGE_LABELS = {
+  queued: "Waiting to start",
+  opening: "Opening dataset",
+  creating_layers: "Creating layers",
+  warming: "Preparing first page",
+  done: "Ready",
+  failed: "Failed",
+};
+
+/**
+ * Progress of a background dataset load (fed by the load job event stream)
+ */
+function LoadProgress({ progress }) {
+  let percent = 0;
+  if (progress.stage === "creating_layers" && progress.total_layers > 0) {
+    percent = (progress.layers_created / progress.total_layers) * 50;
+  } else if (progress.stage === "warming") {
+    percent =
+      50 +
+      (progress.slices_to_warm > 0
+        ? (progress.slices_decoded / progress.slices_to_warm) * 50
+        : 50);
+  } else if (progress.stage === "done") {
+    percent = 100;
+  }
+
+  return (
+    <div style={{ marginTop: "8px" }}>
+      <Progress
+        percent={Math.round(percent)}
+        status={progress.stage === "failed" ? "exception" : "active"}
+      />
+      <div style={{ color: "#888", fontSize: "12px" }}>
+        {STAGE_LABELS[progress.stage] || progress.stage}
+        {" - "}
+        {progress.files_scanned} file(s), {progress.layers_created}/
+        {progress.total_layers} layers, {progress.slices_decoded} slices
+        decoded ({(progress.bytes_read / 1024 ** 2).toFixed(1)} MB)
+      </div>
+    </div>
+  );
+}
+
 export default DatasetLoader;
@@ -5,7 +5,7 @@ import LayerGrid from "./LayerGrid";
 import ClassificationPanel from "./ClassificationPanel";
 import ProgressTracker from "./ProgressTracker";
 import UnifiedImageEditor from "./UnifiedImageEditor";
-import { apiClient } from "../../api";
+import { apiClient, resolveApiUrl } from "../../api";
 
 const { Sider, Content } = Layout;
 
@@ -22,6 +22,7 @@ function DetectionWorkflow({ sessionId, setSessionId, refreshTrigger }) {
   const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(false);
   const [editingLayer, setEditingLayer] = useState(null);
+  const [loadProgress, setLoadProgress] = useState(null);
 
   const pageSize = 12; // 12 layers per page (3x4 grid)
 
@@ -70,27 +71,66 @@ function DetectionWorkflow({ sessionId, setSessionId, refreshTrigger }) {
     return () => window.removeEventListener("keydown", handleKeyPress);
   }, [sessionId, selectedLayers, layers, editingLayer]);
 
+  // Follow a background load over Server-Sent Events until it finishes
+  const followLoadJob = (jobId) =>
+    new Promise((resolve, reject) => {
+      const source = new EventSource(
+        resolveApiUrl(`/eh/detection/load/jobs/${jobId}/events`),
+        { withCredentials: true },
+      );
+      source.addEventListener("progress", (event) => {
+        setLoadProgress(JSON.parse(event.data));
+      });
+      source.addEventListener("done", (event) => {
+        source.close();
+        const job = JSON.parse(event.data);
+        setLoadProgress(job);
+        resolve(job);
+      });
+      source.addEventListener("failed", (event) => {
+        source.close();
+        const job = JSON.parse(event.data);
+        setLoadProgress(job);
+        reject(new Error(job.error || "Failed to load dataset"));
+      });
+      source.onerror = () => {
+        // Network errors are retried by EventSource; a closed stream is not
+        if (source.readyState === EventSource.CLOSED) {
+          reject(new Error("Lost connection to the server"));
+        }
+      };
+    });
+
   const handleDatasetLoad = async (datasetPath, maskPath, projectName) => {
     setLoading(true);
+    setLoadProgress(null);
     try {
-      const response = await apiClient.post("/eh/detection/load", {
-        dataset_path: datasetPath,
-        mask_path: maskPath || null,
-        project_name: projectName,
-      });
+      const response = await apiClient.post(
+        "/eh/detection/load/jobs",
+        {
+          dataset_path: datasetPath,
+          mask_path: maskPath || null,
+          project_name: projectName,
+        },
+        { params: { page_size: pageSize } },
+      );
+      const job = await followLoadJob(response.data.job_id);
 
-      setSessionId(response.data.session_id);
-      setProjectName(response.data.project_name);
-      setTotalLayers(response.data.total_layers);
+      setSessionId(job.session_id);
+      setProjectName(projectName);
+      setTotalLayers(job.total_layers);
       setCurrentPage(1);
-      message.success(
-        `Loaded ${response.data.total_layers} layers successfully`,
-      );
+      message.success(`Loaded ${job.total_layers} layers successfully`);
     } catch (error) {
       console.error("Failed to load dataset:", error);
-      message.error(error.response?.data?.detail || "Failed to load dataset");
+      message.error(
+        error.response?.data?.detail ||
+          error.message ||
+          "Failed to load dataset",
+      );
     } finally {
       setLoading(false);
+      setLoadProgress(null);
     }
   };
 
@@ -102,7 +142,9 @@ function DetectionWorkflow({ sessionId, setSessionId, refreshTrigger }) {
           session_id: sessionId,
           page: currentPage,
           page_size: pageSize,
-          include_images: true,
+          include_images: false,
+          // Thumbnails are previews; lossy JPEG is a fraction of the PNG size
+          format: "jpeg",
         },
       });
 
@@ -172,6 +214,28 @@ function DetectionWorkflow({ sessionId, setSessionId, refreshTrigger }) {
     // We'll pass both to LayerGrid and let it decide.
   };
 
+  const openNextIncorrectLayer = async () => {
+    // Ask the server, so layers on other pages are found too
+    try {
+      const response = await apiClient.get("/eh/detection/layers/next", {
+        params: {
+          session_id: sessionId,
+          classification: "incorrect",
+          page_size: pageSize,
+        },
+      });
+      setCurrentPage(response.data.page);
+      setEditingLayer(response.data.layer);
+    } catch (error) {
+      if (error.response?.status === 404) {
+        message.info("No layers are classified as incorrect.");
+      } else {
+        console.error("Failed to find next incorrect layer:", error);
+        message.error("Failed to find next incorrect layer");
+      }
+    }
+  };
+
   const handleOpenEditor = (layer) => {
     setEditingLayer(layer);
   };
@@ -194,7 +258,11 @@ function DetectionWorkflow({ sessionId, setSessionId, refreshTrigger }) {
   if (!sessionId) {
     return (
       <div style={{ padding: "24px" }}>
-        <DatasetLoader onLoad={handleDatasetLoad} loading={loading} />
+        <DatasetLoader
+          onLoad={handleDatasetLoad}
+          loading={loading}
+          progress={loadProgress}
+        />
       </div>
     );
   }
@@ -220,19 +288,7 @@ function DetectionWorkflow({ sessionId, setSessionId, refreshTrigger }) {
             setSessionId(null);
             setSelectedLayers([]);
           }}
-          onStartProofreading={() => {
-            // Find first incorrect layer and open it
-            const firstIncorrect = layers.find(
-              (l) => l.classification === "incorrect",
-            );
-            if (firstIncorrect) {
-              setEditingLayer(firstIncorrect);
-            } else {
-              message.info(
-                "No incorrect layers visible on this page. Try scrolling or filtering.",
-              );
-            }
-          }}
+          onStartProofreading={openNextIncorrectLayer}
         />
       </Sider>
 
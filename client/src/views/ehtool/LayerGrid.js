@@ -6,6 +6,7 @@ import {
   QuestionCircleOutlined,
   ExclamationCircleOutlined,
 } from "@ant-design/icons";
+import { resolveApiUrl } from "../../api";
 
 /**
  * Layer Grid Component
@@ -94,6 +95,13 @@ function LayerGrid({
       <Row gutter={[16, 16]}>
         {layers.map((layer) => {
           const isSelected = selectedLayers.includes(layer.id);
+          // Prefer the pyramid thumbnail so the grid only moves small tiles
+          const imageUrl = layer.thumbnail_url || layer.image_url;
+          const maskUrl = layer.mask_thumbnail_url || layer.mask_url;
+          const imageSrc = imageUrl
+            ? resolveApiUrl(imageUrl)
+            : layer.image_base64;
+          const maskSrc = maskUrl ? resolveApiUrl(maskUrl) : layer.mask_base64;
 
           return (
             <Col key={layer.id} xs={24} sm={12} md={8} lg={6}>
@@ -138,7 +146,7 @@ function LayerGrid({
                         />
                       </div>
 
-                      {layer.image_base64 ? (
+                      {imageSrc ? (
                         <div
                           style={{
                             position: "relative",
@@ -148,7 +156,8 @@ function LayerGrid({
                           }}
                         >
                           <img
-                            src={layer.image_base64}
+                            src={imageSrc}
+                            loading="lazy"
                             alt={layer.layer_name}
                             style={{
                               position: "absolute",
@@ -159,9 +168,10 @@ function LayerGrid({
                               objectFit: "contain",
                             }}
                           />
-                          {layer.mask_base64 && (
+                          {maskSrc && (
                             <img
-                              src={layer.mask_base64}
+                              src={maskSrc}
+                              loading="lazy"
                               alt="mask"
                               style={{
                                 position: "absolute",
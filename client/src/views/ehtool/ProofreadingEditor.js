@@ -31,6 +31,52 @@ import {
   DragOutlined,
 } from "@ant-design/icons";
 
+/**
+ * Bounding box of the mask pixels that differ between two ImageData objects,
+ * with the new values inside it run-length encoded (row-major, red channel)
+ * as [value, length, ...]. Returns null when nothing changed.
+ */
+const computeMaskPatch = (original, current) => {
+  const { width, height } = current;
+  const before = original.data;
+  const after = current.data;
+  let minX = width;
+  let minY = height;
+  let maxX = -1;
+  let maxY = -1;
+  for (let y = 0; y < height; y++) {
+    for (let x = 0; x < width; x++) {
+      const idx = (y * width + x) * 4;
+      if (before[idx] !== after[idx]) {
+        if (x < minX) minX = x;
+        if (x > maxX) maxX = x;
+        if (y < minY) minY = y;
+        if (y > maxY) maxY = y;
+      }
+    }
+  }
+  if (maxX < 0) return null;
+
+  const runs = [];
+  for (let y = minY; y <= maxY; y++) {
+    for (let x = minX; x <= maxX; x++) {
+      const value = after[(y * width + x) * 4];
+      if (runs.length > 0 && runs[runs.length - 2] === value) {
+        runs[runs.length - 1] += 1;
+      } else {
+        runs.push(value, 1);
+      }
+    }
+  }
+  return {
+    x: minX,
+    y: minY,
+    width: maxX - minX + 1,
+    height: maxY - minY + 1,
+    runs,
+  };
+};
+
 /**
  * Proofreading Editor Component
  * Canvas-based image editor with paint/erase brush tools for mask correction
@@ -454,18 +500,21 @@ const ProofreadingEditor = forwardRef(
       setOffset({ x: newOffsetX, y: newOffsetY });
     };
 
-    const handleSave = () => {
+    const handleSave = async () => {
       if (!maskDataRef.current) {
         message.error("No mask data to save");
         return;
       }
-      const tempCanvas = document.createElement("canvas");
-      tempCanvas.width = maskDataRef.current.width;
-      tempCanvas.height = maskDataRef.current.height;
-      const tempCtx = tempCanvas.getContext("2d");
-      tempCtx.putImageData(maskDataRef.current, 0, 0);
-      const mBase64 = tempCanvas.toDataURL("image/png").split(",")[1];
-      if (onSave) onSave(mBase64);
+      // Only the changed region is uploaded
+      const snapshot = new ImageData(
+        new Uint8ClampedArray(maskDataRef.current.data),
+        maskDataRef.current.width,
+        maskDataRef.current.height,
+      );
+      const patch = computeMaskPatch(originalMaskRef.current, snapshot);
+      if (!onSave) return;
+      const saved = await onSave(patch);
+      if (saved !== false) originalMaskRef.current = snapshot;
     };
 
     useEffect(() => {
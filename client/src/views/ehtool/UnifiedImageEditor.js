@@ -7,7 +7,7 @@ import {
   QuestionCircleOutlined,
 } from "@ant-design/icons";
 import ProofreadingEditor from "./ProofreadingEditor";
-import { apiClient } from "../../api";
+import { apiClient, fetchImageDataUrl } from "../../api";
 
 /**
  * Unified Image Editor Component
@@ -22,6 +22,8 @@ function UnifiedImageEditor({
 }) {
   const [currentLabel, setCurrentLabel] = useState("error");
   const [saving, setSaving] = useState(false);
+  const [imageSrc, setImageSrc] = useState(null);
+  const [maskSrc, setMaskSrc] = useState(null);
   const editorRef = useRef(null);
 
   useEffect(() => {
@@ -30,6 +32,37 @@ function UnifiedImageEditor({
     }
   }, [layer, visible]);
 
+  // The editor draws into a canvas, so it needs the pixels as data URLs.
+  useEffect(() => {
+    if (!layer || !visible) return;
+    let cancelled = false;
+    setImageSrc(layer.image_base64 || null);
+    setMaskSrc(layer.mask_base64 || null);
+    const load = async () => {
+      try {
+        const [image, mask] = await Promise.all([
+          layer.image_base64 || !layer.image_url
+            ? layer.image_base64 || null
+            : fetchImageDataUrl(layer.image_url),
+          layer.mask_base64 || !layer.mask_url
+            ? layer.mask_base64 || null
+            : fetchImageDataUrl(layer.mask_url),
+        ]);
+        if (!cancelled) {
+          setImageSrc(image);
+          setMaskSrc(mask);
+        }
+      } catch (error) {
+        console.error("Failed to load layer images:", error);
+        message.error("Failed to load layer images");
+      }
+    };
+    load();
+    return () => {
+      cancelled = true;
+    };
+  }, [layer, visible]);
+
   // Keyboard shortcuts for Modal
   useEffect(() => {
     const handleKeyDown = (e) => {
@@ -75,15 +108,18 @@ function UnifiedImageEditor({
     }
   };
 
-  const handleSave = async (maskBase64) => {
+  const handleSave = async (maskPatch) => {
     setSaving(true);
     try {
-      // 1. Save Mask
-      await apiClient.post("/eh/detection/mask", {
-        session_id: sessionId,
-        layer_index: layer.layer_index,
-        mask_base64: maskBase64,
-      });
+      // 1. Save Mask (only the edited region, if anything changed)
+      if (maskPatch) {
+        await apiClient.post("/eh/detection/mask/patch", {
+          session_id: sessionId,
+          layer_index: layer.layer_index,
+          encoding: "rle",
+          ...maskPatch,
+        });
+      }
 
       // 2. Save Classification
       await apiClient.post("/eh/detection/classify", {
@@ -95,9 +131,11 @@ function UnifiedImageEditor({
       message.success("Layer updated successfully");
       if (onSaveSuccess) onSaveSuccess();
       onClose();
+      return true;
     } catch (error) {
       console.error("Failed to save layer updates:", error);
       message.error(error.response?.data?.detail || "Failed to save changes");
+      return false;
     } finally {
       setSaving(false);
     }
@@ -166,8 +204,8 @@ function UnifiedImageEditor({
       <div style={{ height: "100%", overflow: "hidden" }}>
         <ProofreadingEditor
           ref={editorRef}
-          imageBase64={layer.image_base64}
-          maskBase64={layer.mask_base64}
+          imageBase64={imageSrc}
+          maskBase64={maskSrc}
           onSave={handleSave}
           layerName={layer.layer_name}
           currentLayer={layer.layer_index}
@@ -1,4 +1,15 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Float
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -65,6 +76,50 @@ class Synapse(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class FileMetadata(Base):
+    """
+    Derived facts about a file on disk, reused until the file changes
+
+    Rows are keyed by (physical_path, size, mtime_ns); a modified file gets
+    a new row and the stale ones are deleted. Columns are filled in lazily
+    by whichever operation first needs them.
+    """
+
+    __tablename__ = "file_metadata"
+
+    id = Column(Integer, primary_key=True)
+    physical_path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    # Header metadata
+    format = Column(String, nullable=True)
+    shape = Column(String, nullable=True)  # comma-separated, e.g. "100,512,512"
+    dtype = Column(String, nullable=True)
+    chunks = Column(String, nullable=True)
+    # Label classification
+    is_label = Column(Boolean, nullable=True)
+    label_values = Column(Integer, nullable=True)
+    label_exact = Column(Boolean, nullable=True)
+    # Display intensity window and the percentiles it was fitted with
+    intensity_low = Column(Float, nullable=True)
+    intensity_high = Column(Float, nullable=True)
+    intensity_percentiles = Column(String, nullable=True)
+    thumbnail = Column(LargeBinary, nullable=True)  # PNG
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_file_metadata_signature",
+            "physical_path",
+            "size",
+            "mtime_ns",
+            unique=True,
+        ),
+    )
+
+
 # Pydantic Schemas
 class UserBase(BaseModel):
     username: str
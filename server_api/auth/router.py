@@ -14,10 +14,14 @@ try:  # Optional preview dependencies
     import cv2
     import numpy as np
     import tifffile
+    from server_api.utils import file_metadata
+    from server_api.utils.formats import handle_cache
 except Exception:  # pragma: no cover - preview is best-effort
     cv2 = None
     np = None
     tifffile = None
+    handle_cache = None
+    file_metadata = None
 
 router = APIRouter()
 
@@ -219,13 +223,19 @@ def file_preview(
         return np.clip(scaled * 255.0, 0, 255).astype(np.uint8)
 
     def load_image(path: str) -> Optional["np.ndarray"]:
-        ext = os.path.splitext(path)[1].lower()
-        if ext in {".tif", ".tiff"} and tifffile is not None:
-            try:
-                img = tifffile.imread(path)
-            except Exception:
-                img = None
-        else:
+        try:
+            # Stacks: read only the middle slice, not the whole volume
+            with handle_cache.acquire(path) as handle:
+                is_rgb = handle.ndim == 3 and handle.shape[2] in (3, 4)
+                if handle.ndim >= 3 and not is_rgb:
+                    img = handle[handle.shape[0] // 2]
+                else:
+                    img = handle[...]
+            if is_rgb:
+                # Registry images are RGB(A); cv2 encodes BGR
+                img = np.ascontiguousarray(img[..., 2::-1])
+        except Exception:
+            # Formats the registry does not know (bmp, webp, ...)
             img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
         if img is None:
             return None
@@ -248,21 +258,28 @@ def file_preview(
             return to_uint8(img)
         return None
 
-    image = load_image(file.physical_path)
-    if image is None:
-        raise HTTPException(status_code=415, detail="Unsupported image format")
+    def render() -> Optional[bytes]:
+        image = load_image(file.physical_path)
+        if image is None:
+            return None
 
-    max_dim = 160
-    height, width = image.shape[:2]
-    scale = min(1.0, max_dim / max(height, width))
-    if scale < 1.0:
-        new_size = (int(width * scale), int(height * scale))
-        image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
-
-    success, buffer = cv2.imencode(".png", image)
-    if not success:
-        raise HTTPException(status_code=500, detail="Failed to encode preview")
-    return Response(content=buffer.tobytes(), media_type="image/png")
+        max_dim = 160
+        height, width = image.shape[:2]
+        scale = min(1.0, max_dim / max(height, width))
+        if scale < 1.0:
+            new_size = (int(width * scale), int(height * scale))
+            image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
+
+        success, buffer = cv2.imencode(".png", image)
+        if not success:
+            raise HTTPException(status_code=500, detail="Failed to encode preview")
+        return buffer.tobytes()
+
+    # Unchanged files are served from the metadata cache without reading them
+    content = file_metadata.thumbnail(file.physical_path, render)
+    if content is None:
+        raise HTTPException(status_code=415, detail="Unsupported image format")
+    return Response(content=content, media_type="image/png")
 
 
 @router.post("/files/upload", response_model=models.FileResponse)
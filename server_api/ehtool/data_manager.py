@@ -4,72 +4,124 @@ Handles loading and processing image datasets for error detection workflow
 """
 
 import os
-import glob
+import hashlib
+import uuid
 import numpy as np
-import tifffile
 from PIL import Image
-from typing import List, Tuple, Optional, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 
+from server_api.utils import file_metadata
+
 from .utils import (
     to_uint8,
     ensure_grayscale_2d,
     enhance_contrast,
+    enhance_contrast_batch,
+    ClaheParams,
+    DEFAULT_CLAHE,
     array_to_base64,
-    load_image_file,
-    get_image_dimensions,
+    array_to_bytes,
+)
+from .volume import Volume, ImageSequenceVolume, TiffVolume, open_volume
+from .mask_store import TiffMaskStore
+from .mask_journal import MaskJournal
+from .mask_patch import InversePatch, MaskUndoHistory, changed_bbox, check_values_fit
+from .normalization import (
+    HIGH_PERCENTILE,
+    LOW_PERCENTILE,
+    IntensityNormalizer,
+    fit_normalizer,
+)
+from .image_codecs import LOSSLESS, ImageEncoding
+from .pyramid import (
+    PyramidCache,
+    build_pyramid,
+    describe_levels,
+    downsample_to_level,
+    extract_tile,
 )
 
 
 class DataManager:
     """
     Manages image and mask data for error detection workflow
-    Supports both 2D images and 3D TIFF stacks
+    Supports both 2D images and 3D stacks; slices are read lazily on demand
     """
 
     def __init__(self):
-        self.image_volume: Optional[np.ndarray] = None
-        self.mask_volume: Optional[np.ndarray] = None
+        self.image_volume: Optional[Volume] = None
+        self.mask_volume: Optional[Volume] = None
         self.mask_path: Optional[str] = None
+        self.mask_store: Optional[TiffMaskStore] = None
         self.is_3d: bool = False
         self.total_layers: int = 0
         self.image_shape: Optional[Tuple[int, ...]] = None
+        # Fingerprint of the image source, used to key rendered output
+        self.source_id: str = ""
+        # Intensity window shared by every image slice, fitted at load time
+        self.normalizer: Optional[IntensityNormalizer] = None
+        # Edits applied per layer in this session; see mask_stamp for cache keys
+        self.mask_versions: Dict[int, int] = {}
+        # Distinguishes this load's unsaved edits from any other session's
+        self._load_token: str = ""
+        # Mask file fingerprint at load, and after this session's last write
+        self._mask_fingerprint: str = ""
+        self._mask_written: Optional[str] = None
+        # Mask edits applied in memory but not yet written to disk
+        self.mask_journal = MaskJournal()
+        # Inverse patches of recent mask edits
+        self.mask_undo = MaskUndoHistory()
+        # Downsampled display pyramids of recently viewed slices
+        self._pyramids = PyramidCache()
 
     def load_dataset(
-        self, dataset_path: str, mask_path: Optional[str] = None
+        self,
+        dataset_path: str,
+        mask_path: Optional[str] = None,
+        progress: Optional[Callable[[int, int, int], None]] = None,
     ) -> Dict[str, Any]:
-        """Load image dataset and optional mask dataset"""
+        """
+        Load image dataset and optional mask dataset
+
+        progress is called as progress(decoded, total, nbytes) while small
+        image sequences are decoded up front.
+        """
         # Discover and load images
-        image_data = self._load_volume(dataset_path)
+        image_data = self._load_volume(dataset_path, progress)
 
         # Load masks if provided
         mask_data = None
-        if mask_path:
-            mask_data = self._load_volume(mask_path)
-
-            # Validate mask dimensions match image
-            if image_data["num_slices"] != mask_data["num_slices"]:
-                raise ValueError(
-                    f"Mask layer count ({mask_data['num_slices']}) does not match "
-                    f"image layer count ({image_data['num_slices']})"
-                )
-
-            # Validate 2D dimensions match
-            img_shape = image_data["shape"]
-            mask_shape = mask_data["shape"]
-            if img_shape[-2:] != mask_shape[-2:]:
-                raise ValueError(
-                    f"Mask dimensions {mask_shape[-2:]} do not match "
-                    f"image dimensions {img_shape[-2:]}"
-                )
+        try:
+            if mask_path:
+                mask_data = self._load_volume(mask_path, progress)
+                self._validate_mask(image_data, mask_data)
+            # Samples a few slices once so every layer shares one contrast window
+            normalizer = self._fit_normalizer(dataset_path, image_data["volume"])
+        except Exception:
+            image_data["volume"].close()
+            if mask_data is not None:
+                mask_data["volume"].close()
+            raise
 
         # Store volume data
         self.image_volume = image_data["volume"]
         self.mask_volume = mask_data["volume"] if mask_data else None
         self.mask_path = mask_path
+        self.mask_store = None
+        if isinstance(self.mask_volume, TiffVolume):
+            # Re-applies edits a previous run saved but never compacted
+            self.mask_store = TiffMaskStore(mask_path, self.mask_volume)
         self.is_3d = image_data["is_3d"]
         self.total_layers = image_data["num_slices"]
         self.image_shape = image_data["shape"]
+        self.source_id = _source_fingerprint(dataset_path)
+        self.normalizer = normalizer
+        self.mask_versions = {}
+        self._load_token = uuid.uuid4().hex[:8]
+        self._mask_fingerprint = _source_fingerprint(mask_path) if mask_path else ""
+        self._mask_written = None
+        self._pyramids.clear()
 
         return {
             "total_layers": self.total_layers,
@@ -78,17 +130,46 @@ class DataManager:
             "has_masks": mask_data is not None,
         }
 
+    def _fit_normalizer(self, path: str, volume: Volume) -> IntensityNormalizer:
+        """Intensity window of a dataset, reused while the file is unchanged"""
+
+        def fit():
+            normalizer = fit_normalizer(volume)
+            return normalizer.low, normalizer.high
+
+        low, high = file_metadata.intensity_window(
+            path, f"{LOW_PERCENTILE:g}:{HIGH_PERCENTILE:g}", fit
+        )
+        return IntensityNormalizer(volume.dtype, low, high)
+
+    def _validate_mask(self, image_data: Dict[str, Any], mask_data: Dict[str, Any]):
+        """Check that a mask volume lines up with its image volume"""
+        # Validate mask dimensions match image
+        if image_data["num_slices"] != mask_data["num_slices"]:
+            raise ValueError(
+                f"Mask layer count ({mask_data['num_slices']}) does not match "
+                f"image layer count ({image_data['num_slices']})"
+            )
+
+        # Validate 2D dimensions match
+        img_shape = image_data["shape"]
+        mask_shape = mask_data["shape"]
+        if img_shape[-2:] != mask_shape[-2:]:
+            raise ValueError(
+                f"Mask dimensions {mask_shape[-2:]} do not match "
+                f"image dimensions {img_shape[-2:]}"
+            )
+
     def save_mask(self, layer_index: int, mask_base64: str) -> None:
         """Update mask for a specific layer and save to disk"""
+        self.update_mask(layer_index, self.decode_mask(mask_base64))
+        self.flush_masks()
+
+    def decode_mask(self, mask_base64: str) -> np.ndarray:
+        """Decode a base64 PNG mask at the dataset's slice size"""
         import base64
         from io import BytesIO
 
-        if self.mask_volume is None:
-            raise ValueError("No mask volume loaded")
-
-        if layer_index < 0 or layer_index >= self.total_layers:
-            raise IndexError(f"Layer index {layer_index} out of range")
-
         # Decode base64 to numpy array
         if "," in mask_base64:
             mask_base64 = mask_base64.split(",")[1]
@@ -107,86 +188,219 @@ class DataManager:
             # Resize if needed (nearest neighbor to preserve classes)
             img = img.resize(expected_shape[::-1], Image.NEAREST)
             new_mask = np.array(img.convert("L"))
+        return new_mask
 
-        # Update in-memory volume
-        if self.mask_volume.ndim == 3:
-            self.mask_volume[layer_index] = new_mask
-        else:
-            self.mask_volume = new_mask
+    def update_mask(
+        self, layer_index: int, new_mask: np.ndarray, record_undo: bool = True
+    ) -> int:
+        """
+        Apply a mask edit in memory and queue the layer for saving
+
+        Returns:
+            The layer's new mask version
+        """
+        if self.mask_volume is None:
+            raise ValueError("No mask volume loaded")
+
+        if layer_index < 0 or layer_index >= self.total_layers:
+            raise IndexError(f"Layer index {layer_index} out of range")
+
+        if new_mask.shape != self.mask_volume.slice_shape:
+            raise ValueError(
+                f"Mask shape {new_mask.shape} does not match layer shape "
+                f"{self.mask_volume.slice_shape}"
+            )
+
+        # Edits take the stored mask dtype
+        new_mask = new_mask.astype(self.mask_volume.dtype, copy=False)
+        if record_undo:
+            previous = self.mask_volume.get_slice(layer_index)
+            box = changed_bbox(previous, new_mask)
+            if box is not None:
+                rows, cols = box
+                self.mask_undo.push(
+                    layer_index,
+                    InversePatch(
+                        int(rows.start), int(cols.start), np.array(previous[box])
+                    ),
+                )
+
+        # Update in-memory overlay
+        self.mask_volume.set_slice(layer_index, new_mask)
+        return self._mask_edited(layer_index)
+
+    def _mask_edited(self, layer_index: int) -> int:
+        """Bump a layer's mask version after an edit and queue it for saving"""
+        version = self.mask_version(layer_index) + 1
+        self.mask_versions[layer_index] = version
+        self._pyramids.discard(lambda key: key[:2] == ("mask", layer_index))
 
-        # Save to disk
         if self.mask_path:
-            self._save_volume(self.mask_path, self.mask_volume, layer_index)
+            self.mask_journal.record(layer_index, version)
+        return version
+
+    def check_mask_patch(
+        self, layer_index: int, y: int, x: int, height: int, width: int
+    ) -> None:
+        """Raise ValueError/IndexError unless the box lies inside a mask layer"""
+        if self.mask_volume is None:
+            raise ValueError("No mask volume loaded")
+        self._check_layer_index(layer_index)
+
+        slice_height, slice_width = self.mask_volume.slice_shape[-2:]
+        if (
+            y < 0
+            or x < 0
+            or height < 1
+            or width < 1
+            or y + height > slice_height
+            or x + width > slice_width
+        ):
+            raise ValueError(
+                f"Patch box ({x}, {y}, {width}x{height}) is outside the "
+                f"{slice_width}x{slice_height} layer"
+            )
 
-    def _save_volume(self, path: str, volume: np.ndarray, layer_index: int = -1):
+    def apply_mask_patch(
+        self,
+        layer_index: int,
+        y: int,
+        x: int,
+        patch: np.ndarray,
+        where: Optional[np.ndarray] = None,
+    ) -> int:
+        """
+        Overwrite a bounding box of a layer's mask
+
+        Args:
+            layer_index: Layer to edit
+            y: Top row of the box
+            x: Left column of the box
+            patch: New label values for the box
+            where: Optional boolean mask; only these pixels of the box change
+
+        Returns:
+            The layer's new mask version
+        """
+        height, width = patch.shape
+        self.check_mask_patch(layer_index, y, x, height, width)
+        check_values_fit(patch, self.mask_volume.dtype)
+
+        # Only the box is copied, into the undo record
+        previous = self.mask_volume.set_region(layer_index, y, x, patch, where)
+        self.mask_undo.push(layer_index, InversePatch(y, x, previous))
+        return self._mask_edited(layer_index)
+
+    def undo_mask(self, layer_index: int) -> Optional[Tuple[InversePatch, int]]:
+        """
+        Revert the most recent edit of a layer's mask
+
+        Returns:
+            The restored patch and the layer's new mask version, or None if
+            there is nothing to undo
+        """
+        patch = self.mask_undo.pop(layer_index)
+        if patch is None:
+            return None
+        self.mask_volume.set_region(layer_index, patch.y, patch.x, patch.data)
+        return patch, self._mask_edited(layer_index)
+
+    def flush_masks(self, final: bool = False) -> int:
+        """Write queued mask edits to disk; returns the number of layers written"""
+        return self.mask_journal.flush(self._write_mask_layer, final=final)
+
+    def _write_mask_layer(self, layer_index: int) -> None:
+        if self.mask_volume is None:
+            raise ValueError("No mask volume loaded")
+        before = _source_fingerprint(self.mask_path)
+        self._save_volume(self.mask_path, self.mask_volume, layer_index)
+        if before != self._mask_written:
+            # Changed outside EHTool since our last write (or never written)
+            self._mask_fingerprint = before
+        self._mask_written = _source_fingerprint(self.mask_path)
+
+    def _save_volume(self, path: str, volume: Volume, layer_index: int = -1):
         """Save volume to disk"""
         path_obj = Path(path)
 
-        if path_obj.is_file():
-            # It's a single file (likely TIFF)
-            if path.lower().endswith((".tif", ".tiff")):
-                # Rewrite entire TIFF
-                tifffile.imwrite(path, volume, compression="zlib")
-            else:
-                # Single 2D image file
-                if volume.ndim == 2:
-                    Image.fromarray(volume).save(path)
-
-        elif path_obj.is_dir():
-            # Directory of images
-            for ext in ["*.tif", "*.tiff", "*.png", "*.jpg", "*.jpeg"]:
-                files = sorted(
-                    glob.glob(os.path.join(path, ext))
-                    + glob.glob(os.path.join(path, ext.upper()))
+        if isinstance(volume, ImageSequenceVolume):
+            # Directory of images: only the edited slice file is rewritten
+            if layer_index < 0 or layer_index >= len(volume.files):
+                raise IndexError(
+                    f"Layer index {layer_index} out of range for file list"
                 )
-                if files:
-                    if layer_index >= 0 and layer_index < len(files):
-                        target_file = files[layer_index]
-                        if volume.ndim == 3:
-                            slice_data = volume[layer_index]
-                        else:
-                            slice_data = volume
-                        Image.fromarray(slice_data).save(target_file)
-                        return
-                    else:
-                        raise IndexError(
-                            f"Layer index {layer_index} out of range for file list"
-                        )
+            target_file = volume.files[layer_index]
+            Image.fromarray(volume.snapshot_slice(layer_index)).save(target_file)
+
+        elif isinstance(volume, TiffVolume) and self.mask_store:
+            # Persist only the edited page
+            self.mask_store.write_layer(layer_index, volume.snapshot_slice(layer_index))
+
+        elif getattr(volume, "path", None) is not None:
+            # NPY, HDF5 and zarr are updated in place; other formats raise,
+            # so the journal reports the edit as failed instead of saved
+            data = volume.snapshot_slice(layer_index)
+            volume.write_slice(layer_index, data)
+            volume.discard_overlay(layer_index, expected=data)
+
+        elif path_obj.is_file() and not volume.is_3d:
+            # Single 2D image file
+            Image.fromarray(volume.snapshot_slice(0)).save(path)
+
+        else:
+            raise ValueError(f"Mask edits can't be saved to {path}")
 
     def get_layer(
-        self, layer_index: int, enhance: bool = True
+        self, layer_index: int, enhance: bool = True, clahe: ClaheParams = DEFAULT_CLAHE
     ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
         """Get image and mask for a specific layer"""
-        if layer_index < 0 or layer_index >= self.total_layers:
-            raise IndexError(
-                f"Layer index {layer_index} out of range [0, {self.total_layers})"
-            )
-
-        # Get image slice
-        if self.image_volume.ndim == 3:
-            image = self.image_volume[layer_index]
-        else:
-            image = self.image_volume
+        image = self.get_image(layer_index, enhance=enhance, clahe=clahe)
+        mask = self.get_mask(layer_index) if self.mask_volume is not None else None
+        return image, mask
 
-        image = ensure_grayscale_2d(image)
+    def get_image(
+        self, layer_index: int, enhance: bool = True, clahe: ClaheParams = DEFAULT_CLAHE
+    ) -> np.ndarray:
+        """Get the display-ready uint8 image for a layer"""
+        image = self._normalized_image(layer_index)
 
         if enhance:
-            image = enhance_contrast(image)
-        else:
-            image = to_uint8(image)
+            return enhance_contrast(image, clahe)
+        return image
+
+    def get_images(
+        self,
+        layer_indices: List[int],
+        enhance: bool = True,
+        clahe: ClaheParams = DEFAULT_CLAHE,
+    ) -> List[np.ndarray]:
+        """Display-ready images for a page of layers, enhanced in one batch"""
+        images = [self._normalized_image(layer_index) for layer_index in layer_indices]
+        if enhance:
+            return enhance_contrast_batch(images, clahe)
+        return images
 
-        # Get mask slice if exists
-        mask = None
-        if self.mask_volume is not None:
-            if self.mask_volume.ndim == 3:
-                mask = self.mask_volume[layer_index]
-            else:
-                mask = self.mask_volume
+    def _normalized_image(self, layer_index: int) -> np.ndarray:
+        self._check_layer_index(layer_index)
 
-            mask = ensure_grayscale_2d(mask)
-            mask = to_uint8(mask)
+        # Get image slice (only this slice is decoded)
+        image = ensure_grayscale_2d(self.image_volume.get_slice(layer_index))
+        return self.normalizer(image)
 
-        return image, mask
+    def get_mask(self, layer_index: int) -> np.ndarray:
+        """Get the uint8 mask for a layer"""
+        self._check_layer_index(layer_index)
+        if self.mask_volume is None:
+            raise ValueError("No mask volume loaded")
+
+        mask = ensure_grayscale_2d(self.mask_volume.get_slice(layer_index))
+        return to_uint8(mask)
+
+    def _check_layer_index(self, layer_index: int) -> None:
+        if layer_index < 0 or layer_index >= self.total_layers:
+            raise IndexError(
+                f"Layer index {layer_index} out of range [0, {self.total_layers})"
+            )
 
     def get_layer_base64(
         self, layer_index: int, enhance: bool = True
@@ -199,6 +413,129 @@ class DataManager:
 
         return image_base64, mask_base64
 
+    def encode_image(
+        self,
+        layer_index: int,
+        enhance: bool = True,
+        encoding: ImageEncoding = LOSSLESS,
+        clahe: ClaheParams = DEFAULT_CLAHE,
+    ) -> bytes:
+        """Get a layer's image as encoded image bytes"""
+        image = self.get_image(layer_index, enhance=enhance, clahe=clahe)
+        return encoding.encode(image)
+
+    def encode_mask(self, layer_index: int) -> bytes:
+        """Get a layer's mask as lossless PNG bytes"""
+        return array_to_bytes(self.get_mask(layer_index), format="PNG")
+
+    def get_pyramid(
+        self,
+        layer_index: int,
+        kind: str = "image",
+        enhance: bool = True,
+        clahe: ClaheParams = DEFAULT_CLAHE,
+    ) -> List[np.ndarray]:
+        """Display pyramid (level 0 = full resolution) for a layer image or mask"""
+        key = self._pyramid_key(layer_index, kind, enhance, clahe)
+        levels = self._pyramids.get(key)
+        if levels is None:
+            if kind == "mask":
+                arr = self.get_mask(layer_index)
+            else:
+                arr = self.get_image(layer_index, enhance=enhance, clahe=clahe)
+            levels = build_pyramid(np.ascontiguousarray(arr), is_mask=kind == "mask")
+            self._pyramids.put(key, levels)
+        return levels
+
+    def get_thumbnail(
+        self,
+        layer_index: int,
+        kind: str = "image",
+        enhance: bool = True,
+        clahe: ClaheParams = DEFAULT_CLAHE,
+    ) -> np.ndarray:
+        """
+        Coarsest pyramid level of a layer image or mask
+
+        The slice is downsampled first and enhanced at thumbnail size, so
+        grid thumbnails never build or cache full-resolution levels. get_tile
+        serves the coarsest level from here even when the full pyramid is
+        cached, so the tile doesn't depend on which path rendered it first.
+        """
+        top = len(self.pyramid_levels()) - 1
+        if kind == "mask":
+            return downsample_to_level(self.get_mask(layer_index), top, is_mask=True)
+        image = downsample_to_level(self._normalized_image(layer_index), top)
+        return enhance_contrast(image, clahe) if enhance else image
+
+    def _pyramid_key(
+        self, layer_index: int, kind: str, enhance: bool, clahe: ClaheParams
+    ) -> tuple:
+        if kind == "mask":
+            return ("mask", layer_index, self.mask_version(layer_index))
+        return ("image", layer_index, enhance, clahe)
+
+    def get_tile(
+        self,
+        layer_index: int,
+        level: int,
+        tile_x: int,
+        tile_y: int,
+        kind: str = "image",
+        enhance: bool = True,
+        clahe: ClaheParams = DEFAULT_CLAHE,
+    ) -> np.ndarray:
+        """Get one tile of a layer at a downsample level"""
+        if level == len(self.pyramid_levels()) - 1:
+            thumbnail = self.get_thumbnail(layer_index, kind, enhance, clahe)
+            return extract_tile(thumbnail, tile_x, tile_y)
+        levels = self.get_pyramid(layer_index, kind=kind, enhance=enhance, clahe=clahe)
+        if level < 0 or level >= len(levels):
+            raise IndexError(f"Level {level} out of range [0, {len(levels)})")
+        return extract_tile(levels[level], tile_x, tile_y)
+
+    def encode_tile(
+        self,
+        layer_index: int,
+        level: int,
+        tile_x: int,
+        tile_y: int,
+        kind: str = "image",
+        enhance: bool = True,
+        clahe: ClaheParams = DEFAULT_CLAHE,
+        encoding: ImageEncoding = LOSSLESS,
+    ) -> bytes:
+        """Get one tile as encoded bytes; mask tiles are always lossless PNG"""
+        tile = self.get_tile(layer_index, level, tile_x, tile_y, kind, enhance, clahe)
+        if kind == "mask":
+            return LOSSLESS.encode(tile)
+        return encoding.encode(tile)
+
+    def pyramid_levels(self) -> List[Dict[str, int]]:
+        """Level geometry shared by every slice of the dataset"""
+        return describe_levels(self.image_shape[-2:])
+
+    def mask_version(self, layer_index: int) -> int:
+        """Number of edits applied to a layer's mask in this session"""
+        return self.mask_versions.get(layer_index, 0)
+
+    def mask_stamp(self, layer_index: int) -> str:
+        """
+        Cache key for a layer's current mask content, without reading it
+
+        Saved content is identified by the mask file's fingerprint, which
+        survives reloads and restarts and follows changes made outside
+        EHTool; this session's own writes keep the fingerprint from load.
+        Unsaved edits add the load token and the layer's mask version.
+        """
+        fingerprint = _source_fingerprint(self.mask_path)
+        if fingerprint == self._mask_written:
+            fingerprint = self._mask_fingerprint
+        version = self.mask_version(layer_index)
+        if version == 0:
+            return fingerprint
+        return f"{fingerprint}.{self._load_token}.{version}"
+
     def get_layer_name(self, layer_index: int) -> str:
         """Get the name for a layer"""
         if layer_index < 0 or layer_index >= self.total_layers:
@@ -209,66 +546,69 @@ class DataManager:
         else:
             return "Image"
 
-    def _load_volume(self, path: str) -> Dict[str, Any]:
-        """Load volume data from a path"""
-        path_obj = Path(path)
+    def _load_volume(
+        self, path: str, progress: Optional[Callable[[int, int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """Open volume data from a path; only small image sequences are decoded"""
+        volume = open_volume(path, progress)
+        return {
+            "volume": volume,
+            "shape": volume.shape,
+            "num_slices": volume.num_slices,
+            "is_3d": volume.is_3d,
+        }
 
-        # Single file
-        if path_obj.is_file():
-            if path.lower().endswith((".tif", ".tiff")):
-                volume = tifffile.imread(path)
-                if volume.ndim == 2:
-                    return {
-                        "volume": volume,
-                        "shape": volume.shape,
-                        "num_slices": 1,
-                        "is_3d": False,
-                    }
-                elif volume.ndim == 3:
-                    return {
-                        "volume": volume,
-                        "shape": volume.shape,
-                        "num_slices": volume.shape[0],
-                        "is_3d": True,
-                    }
-                else:
-                    raise ValueError(f"Unsupported TIFF dimensions: {volume.ndim}")
-            else:
-                image = load_image_file(path)
-                return {
-                    "volume": image,
-                    "shape": image.shape,
-                    "num_slices": 1,
-                    "is_3d": False,
-                }
-
-        # Directory or glob pattern
-        elif path_obj.is_dir() or "*" in path or "?" in path:
-            files = []
-            if path_obj.is_dir():
-                for ext in ["*.tif", "*.tiff", "*.png", "*.jpg", "*.jpeg"]:
-                    files.extend(glob.glob(os.path.join(path, ext)))
-                    files.extend(glob.glob(os.path.join(path, ext.upper())))
-            else:
-                files = glob.glob(path)
-
-            if not files:
-                raise ValueError(f"No image files found at: {path}")
-
-            files = sorted(files)
-            slices = []
-            for file_path in files:
-                img = load_image_file(file_path)
-                img = ensure_grayscale_2d(img)
-                slices.append(img)
-
-            volume = np.stack(slices, axis=0)
-            return {
-                "volume": volume,
-                "shape": volume.shape,
-                "num_slices": volume.shape[0],
-                "is_3d": True,
-            }
+    def source_file_count(self) -> int:
+        """Number of files the image and mask volumes were opened from"""
+        return sum(
+            len(volume.files) if isinstance(volume, ImageSequenceVolume) else 1
+            for volume in (self.image_volume, self.mask_volume)
+            if volume is not None
+        )
 
-        else:
-            raise ValueError(f"Invalid path: {path}")
+    def bytes_read(self) -> int:
+        """Slice data decoded from the image and mask files so far"""
+        return sum(
+            volume.bytes_read
+            for volume in (self.image_volume, self.mask_volume)
+            if volume is not None
+        )
+
+    def memory_footprint(self) -> int:
+        """Bytes of image and mask data this manager holds in process memory"""
+        return (
+            self._pyramids.nbytes
+            + self.mask_undo.nbytes
+            + sum(
+                volume.resident_bytes
+                for volume in (self.image_volume, self.mask_volume)
+                if volume is not None
+            )
+        )
+
+    def close(self) -> None:
+        """Release file handles held by the image and mask volumes"""
+        # Unsaved mask edits must reach disk before the mask volume goes away
+        self.flush_masks(final=True)
+        if self.image_volume is not None:
+            self.image_volume.close()
+        if self.mask_store is not None:
+            # Closes the mask volume once outstanding edits are compacted
+            self.mask_store.close()
+            self.mask_store = None
+        elif self.mask_volume is not None:
+            self.mask_volume.close()
+        self.image_volume = None
+        self.mask_volume = None
+        self._pyramids.clear()
+        self.mask_undo.clear()
+
+
+def _source_fingerprint(path: str) -> str:
+    """Identify a dataset by path, size and modification time"""
+    try:
+        stat = os.stat(path)
+        text = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    except OSError:
+        text = os.path.abspath(path)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
@@ -3,7 +3,7 @@ Database models for EHTool
 SQLAlchemy models for sessions and layers
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from server_api.auth.database import Base
@@ -44,3 +44,21 @@ class EHToolLayer(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     session = relationship("EHToolSession", back_populates="layers")
+
+    __table_args__ = (
+        # Page fetches and keyset scans by position in the stack
+        Index("ix_ehtool_layers_session_layer", "session_id", "layer_index"),
+        # Classification filters, per-class counts and "next unreviewed"
+        Index(
+            "ix_ehtool_layers_session_classification",
+            "session_id",
+            "classification",
+            "layer_index",
+        ),
+    )
+
+
+def create_missing_indexes(engine) -> None:
+    """Add indexes declared above to an ehtool_layers table created before them"""
+    for index in EHToolLayer.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
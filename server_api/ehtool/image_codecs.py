@@ -0,0 +1,129 @@
+"""
+Image codecs for EHTool responses
+Masks are always lossless PNG; images may be sent as lossy WebP or JPEG
+"""
+
+import os
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+
+from .utils import array_to_bytes
+
+IMAGE_QUALITY = int(os.environ.get("EHTOOL_IMAGE_QUALITY", 80))
+# libwebp effort, 0 (fastest) to 6 (smallest)
+WEBP_METHOD = int(os.environ.get("EHTOOL_WEBP_METHOD", 0))
+# Thumbnail format the layer grid asks for; background loads pre-render it
+PREVIEW_FORMAT = os.environ.get("EHTOOL_PREVIEW_FORMAT", "jpeg")
+
+
+class ImageCodec(NamedTuple):
+    """An encoding the layer endpoints can serve"""
+
+    name: str
+    media_type: str
+    pil_format: str
+    lossless: bool
+
+
+PNG = ImageCodec("png", "image/png", "PNG", True)
+WEBP = ImageCodec("webp", "image/webp", "WEBP", False)
+JPEG = ImageCodec("jpeg", "image/jpeg", "JPEG", False)
+
+CODECS = {codec.name: codec for codec in (PNG, WEBP, JPEG)}
+_ALIASES = {"jpg": "jpeg"}
+
+# Tie-break when the client accepts several codecs equally; JPEG encodes
+# an order of magnitude faster than WebP for similar size
+_PREFERENCE = (JPEG, WEBP, PNG)
+
+
+class ImageEncoding(NamedTuple):
+    """A codec together with its quality setting"""
+
+    codec: ImageCodec = PNG
+    quality: int = IMAGE_QUALITY
+
+    @property
+    def tag(self) -> str:
+        """Identifies the encoding in render cache keys"""
+        if self.codec.lossless:
+            return self.codec.name
+        return f"{self.codec.name}-q{self.quality}"
+
+    def encode(self, arr: np.ndarray) -> bytes:
+        if self.codec.lossless:
+            return array_to_bytes(arr, format=self.codec.pil_format)
+        options = {"quality": self.quality}
+        if self.codec is WEBP:
+            options["method"] = WEBP_METHOD
+        return array_to_bytes(arr, format=self.codec.pil_format, **options)
+
+
+LOSSLESS = ImageEncoding()
+
+
+def get_codec(name: str) -> ImageCodec:
+    """Look up a codec by name ('png', 'webp', 'jpeg' or 'jpg')"""
+    name = name.lower()
+    codec = CODECS.get(_ALIASES.get(name, name))
+    if codec is None:
+        raise ValueError(
+            f"Unsupported image format '{name}'. Use one of: {', '.join(CODECS)}"
+        )
+    return codec
+
+
+def image_encoding(
+    name: Optional[str], quality: int = IMAGE_QUALITY, accept: Optional[str] = None
+) -> ImageEncoding:
+    """
+    Encoding for an image response from request parameters
+
+    Args:
+        name: Explicit format; None to negotiate from the Accept header
+        quality: Lossy quality, 1-100 (ignored for PNG)
+        accept: Accept header of the request
+
+    Returns:
+        The encoding to use
+    """
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    return ImageEncoding(negotiate_codec(accept, name), quality)
+
+
+def _accepted_types(accept: str) -> Dict[str, float]:
+    """Media type -> q value of an Accept header"""
+    accepted = {}
+    for item in accept.split(","):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[media_type.lower()] = q
+    return accepted
+
+
+def negotiate_codec(
+    accept: Optional[str], requested: Optional[str] = None
+) -> ImageCodec:
+    """
+    Pick the codec for an image response
+
+    An explicit format wins. Otherwise the Accept header may select WebP or
+    JPEG by naming it; wildcards are ignored, so generic clients (fetch,
+    curl) keep getting lossless PNG.
+    """
+    if requested:
+        return get_codec(requested)
+    if not accept:
+        return PNG
+    accepted = _accepted_types(accept)
+    # max keeps the first of equally accepted codecs, i.e. the preferred one
+    best = max(_PREFERENCE, key=lambda codec: accepted.get(codec.media_type, 0.0))
+    return best if accepted.get(best.media_type, 0.0) > 0 else PNG
@@ -0,0 +1,167 @@
+"""
+Set-based queries on EHToolLayer rows
+Inserts, updates and counts run as batched SQL instead of per-row ORM work
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, or_
+from sqlalchemy.orm import Session
+
+from .db_models import EHToolLayer
+
+VALID_CLASSIFICATIONS = ("correct", "incorrect", "unsure", "error")
+
+# Stay well below SQLite's bound-parameter limit in IN (...) lists
+IN_CLAUSE_CHUNK = 500
+
+# Rows per executemany batch when creating a session's layers
+INSERT_BATCH_SIZE = 5000
+
+
+def _chunks(values: List[int], size: int) -> Iterable[List[int]]:
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def insert_layer_rows(
+    db: Session,
+    session_id: int,
+    layer_names: Iterable[str],
+    classification: str = "error",
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Create one layer row per name with executemany INSERTs
+
+    Args:
+        db: Database session (the caller commits)
+        session_id: Session the layers belong to
+        layer_names: Names in layer_index order
+        classification: Initial classification ('error' = unreviewed)
+        on_batch: Called with the row count after every executed batch
+
+    Returns:
+        Number of rows inserted
+    """
+    inserted = 0
+    batch = []
+    for layer_index, layer_name in enumerate(layer_names):
+        batch.append(
+            {
+                "session_id": session_id,
+                "layer_index": layer_index,
+                "layer_name": layer_name,
+                "classification": classification,
+            }
+        )
+        if len(batch) >= INSERT_BATCH_SIZE:
+            inserted += _insert_batch(db, batch, on_batch)
+            batch = []
+    if batch:
+        inserted += _insert_batch(db, batch, on_batch)
+    return inserted
+
+
+def _insert_batch(db: Session, batch: List[dict], on_batch) -> int:
+    db.execute(insert(EHToolLayer), batch)
+    if on_batch is not None:
+        on_batch(len(batch))
+    return len(batch)
+
+
+def classify_layer_selection(
+    db: Session,
+    session_id: int,
+    classification: str,
+    layer_ids: Iterable[int] = (),
+    layer_ranges: Iterable[Tuple[int, int]] = (),
+    select_all: bool = False,
+    filter_classification: Optional[str] = None,
+) -> int:
+    """
+    Set the classification of a selection of a session's layers
+
+    Args:
+        db: Database session (the caller commits)
+        session_id: Session the layers belong to
+        classification: New classification
+        layer_ids: Layer row ids to update
+        layer_ranges: Inclusive (start, end) layer_index ranges to update
+        select_all: Update every layer of the session; ids and ranges are ignored
+        filter_classification: Only update layers currently classified so
+
+    Returns:
+        Number of rows matched by the update
+    """
+    base = db.query(EHToolLayer).filter(EHToolLayer.session_id == session_id)
+    if filter_classification is not None:
+        base = base.filter(EHToolLayer.classification == filter_classification)
+
+    if select_all:
+        return _update(base, classification)
+
+    updated = 0
+    ranges = [
+        EHToolLayer.layer_index.between(start, end) for start, end in layer_ranges
+    ]
+    if ranges:
+        updated += _update(base.filter(or_(*ranges)), classification)
+        # Rows inside a range are done; don't count them again by id
+        base = base.filter(~or_(*ranges))
+    for chunk in _chunks(sorted(set(layer_ids)), IN_CLAUSE_CHUNK):
+        updated += _update(base.filter(EHToolLayer.id.in_(chunk)), classification)
+    return updated
+
+
+def _update(query, classification: str) -> int:
+    return query.update(
+        {EHToolLayer.classification: classification}, synchronize_session=False
+    )
+
+
+def classification_counts(db: Session, session_id: int) -> Dict[str, int]:
+    """Number of a session's layers per classification (one GROUP BY query)"""
+    rows = (
+        db.query(EHToolLayer.classification, func.count(EHToolLayer.id))
+        .filter(EHToolLayer.session_id == session_id)
+        .group_by(EHToolLayer.classification)
+        .all()
+    )
+    return {classification: count for classification, count in rows}
+
+
+def layers_after(
+    db: Session,
+    session_id: int,
+    after: int = -1,
+    limit: int = 12,
+    classification: Optional[str] = None,
+) -> List[EHToolLayer]:
+    """
+    Keyset page: the next layers past a layer_index, optionally of one class
+
+    Seeks straight into the (session_id, layer_index) or
+    (session_id, classification, layer_index) index, so the cost does not
+    grow with how deep into the stack the page is.
+    """
+    query = db.query(EHToolLayer).filter(
+        EHToolLayer.session_id == session_id, EHToolLayer.layer_index > after
+    )
+    if classification is not None:
+        query = query.filter(EHToolLayer.classification == classification)
+    return query.order_by(EHToolLayer.layer_index).limit(limit).all()
+
+
+def next_layer(
+    db: Session,
+    session_id: int,
+    classification: str,
+    after: int = -1,
+    wrap: bool = True,
+) -> Optional[EHToolLayer]:
+    """First layer of a class past a layer_index, wrapping to the start if asked"""
+    layers = layers_after(db, session_id, after, 1, classification)
+    if not layers and wrap and after >= 0:
+        layers = layers_after(db, session_id, -1, 1, classification)
+    return layers[0] if layers else None
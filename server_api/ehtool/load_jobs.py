@@ -0,0 +1,116 @@
+"""
+Background dataset loads for EHTool
+Tracks the progress of a load so clients can follow it as a Server-Sent Events stream
+"""
+
+import os
+import time
+import uuid
+import threading
+from typing import Any, Dict, Optional
+
+JOB_TTL = float(os.environ.get("EHTOOL_LOAD_JOB_TTL", 3600))
+WARM_PAGES = int(os.environ.get("EHTOOL_LOAD_WARM_PAGES", 1))
+
+TERMINAL_STAGES = ("done", "failed")
+
+
+class LoadJob:
+    """
+    Progress of one background dataset load
+
+    Stages run queued -> opening -> creating_layers -> warming -> done (or
+    failed). session_id is set once the session exists; the job only reports
+    done after the first pages have been rendered, so the grid opens warm.
+    Small image sequences are decoded while opening (slices_preloaded);
+    bytes_read counts slice data actually decoded from the files.
+    Every update bumps version, which lets observers detect changes cheaply.
+    """
+
+    def __init__(self, job_id: str, user_id: int):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.stage = "queued"
+        self.session_id: Optional[int] = None
+        self.error: Optional[str] = None
+        self.files_scanned = 0
+        self.slices_to_preload = 0
+        self.slices_preloaded = 0
+        self.total_layers = 0
+        self.layers_created = 0
+        self.slices_to_warm = 0
+        self.slices_decoded = 0
+        self.bytes_read = 0
+        self.timings: Dict[str, float] = {}
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in TERMINAL_STAGES
+
+    def update(self, **fields: Any) -> None:
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            if self.stage in TERMINAL_STAGES and self.finished_at is None:
+                self.finished_at = time.time()
+            self.version += 1
+
+    def add(self, **increments: int) -> None:
+        """Increment counters"""
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+            self.version += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "stage": self.stage,
+                "session_id": self.session_id,
+                "error": self.error,
+                "files_scanned": self.files_scanned,
+                "slices_to_preload": self.slices_to_preload,
+                "slices_preloaded": self.slices_preloaded,
+                "total_layers": self.total_layers,
+                "layers_created": self.layers_created,
+                "slices_to_warm": self.slices_to_warm,
+                "slices_decoded": self.slices_decoded,
+                "bytes_read": self.bytes_read,
+                "timings": dict(self.timings),
+                "version": self.version,
+            }
+
+
+class LoadJobRegistry:
+    """In-process registry of load jobs; finished jobs expire after ttl seconds"""
+
+    def __init__(self, ttl: float = JOB_TTL):
+        self.ttl = ttl
+        self._jobs: Dict[str, LoadJob] = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int) -> LoadJob:
+        job = LoadJob(uuid.uuid4().hex, user_id)
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[LoadJob]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
@@ -0,0 +1,161 @@
+"""
+Write-behind mask persistence for EHTool
+Mask edits are applied in memory at once and written to disk in the background
+"""
+
+import os
+import time
+import weakref
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.environ.get("EHTOOL_MASK_FLUSH_INTERVAL", 2))
+
+
+class MaskJournal:
+    """
+    Mask layers of one session that were edited in memory but not yet saved
+
+    Saving a layer again before it is flushed only replaces its pending
+    entry, so a burst of brush strokes on one layer costs a single disk write.
+    A layer edited again while it is being written stays pending and is
+    written once more on the next flush.
+    """
+
+    def __init__(self):
+        # layer index -> (mask version, time of the first unsaved edit)
+        self._pending: Dict[int, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.saves = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.failed = 0
+        self.last_flush_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def record(self, layer_index: int, version: int) -> None:
+        """Queue a layer for the next flush"""
+        with self._lock:
+            previous = self._pending.get(layer_index)
+            if previous is not None:
+                self.coalesced += 1
+                queued_at = previous[1]
+            else:
+                queued_at = time.time()
+            self._pending[layer_index] = (version, queued_at)
+            self.saves += 1
+
+    def flush(self, write: Callable[[int], None], final: bool = False) -> int:
+        """
+        Write every pending layer
+
+        Args:
+            write: Persists the current in-memory mask of one layer
+            final: Refuse further flushes afterwards (the volume is closing)
+
+        Returns:
+            Number of layers written
+        """
+        with self._flush_lock:
+            if self._closed:
+                return 0
+            if final:
+                self._closed = True
+            with self._lock:
+                snapshot = dict(self._pending)
+
+            written = 0
+            for layer_index, (version, _) in sorted(snapshot.items()):
+                try:
+                    write(layer_index)
+                except Exception as e:
+                    logger.exception("Failed to flush mask layer %d", layer_index)
+                    with self._lock:
+                        self.failed += 1
+                        self.last_error = f"Layer {layer_index}: {e}"
+                    continue
+                with self._lock:
+                    if self._pending.get(layer_index, (None,))[0] == version:
+                        del self._pending[layer_index]
+                    self.flushed += 1
+                written += 1
+
+            if written:
+                with self._lock:
+                    self.last_flush_at = time.time()
+            return written
+
+    def pending_layers(self) -> List[int]:
+        with self._lock:
+            return sorted(self._pending)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = min((queued for _, queued in self._pending.values()), default=None)
+            return {
+                "pending_layers": sorted(self._pending),
+                "oldest_pending_age": (
+                    time.time() - oldest if oldest is not None else None
+                ),
+                "saves": self.saves,
+                "coalesced": self.coalesced,
+                "flushed": self.flushed,
+                "failed": self.failed,
+                "last_flush_at": self.last_flush_at,
+                "last_error": self.last_error,
+            }
+
+
+class MaskFlusher:
+    """
+    Background thread that flushes registered DataManagers on an interval
+
+    Managers are held weakly; one that is closed or evicted flushes itself on
+    close, so the flusher only has to cover idle sessions and shutdown.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL):
+        self.interval = interval
+        self._managers: "weakref.WeakSet[Any]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, data_manager: Any) -> None:
+        """Make sure a DataManager's journal gets flushed"""
+        with self._lock:
+            self._managers.add(data_manager)
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(
+                    target=self._run, name="ehtool-mask-flush", daemon=True
+                )
+                self._thread.start()
+
+    def flush_all(self) -> int:
+        """Flush every registered manager now; returns layers written"""
+        with self._lock:
+            managers = list(self._managers)
+        written = 0
+        for data_manager in managers:
+            try:
+                written += data_manager.flush_masks()
+            except Exception:
+                logger.exception("Mask flush failed")
+        return written
+
+    def stop(self) -> None:
+        """Stop the background thread and write whatever is still pending"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush_all()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush_all()
@@ -0,0 +1,169 @@
+"""
+Mask patches for EHTool
+Small mask edits travel as a bounding box plus run-length or bitmask data
+"""
+
+import os
+import zlib
+import base64
+import itertools
+import threading
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+MAX_UNDO_BYTES = int(os.environ.get("EHTOOL_MASK_UNDO_BYTES", 64 * 1024**2))
+
+PATCH_ENCODINGS = ("rle", "bitmask")
+
+
+def check_values_fit(values, dtype) -> None:
+    """Raise ValueError if label values can't be stored in a mask of dtype"""
+    dtype = np.dtype(dtype)
+    values = np.asarray(values)
+    if np.issubdtype(dtype, np.integer) and values.size:
+        info = np.iinfo(dtype)
+        if values.min() < info.min or values.max() > info.max:
+            raise ValueError(f"Patch values do not fit the {dtype} mask")
+
+
+def decode_rle(runs: List[int], height: int, width: int, dtype=np.int64) -> np.ndarray:
+    """
+    Expand a run-length encoded bounding box
+
+    Args:
+        runs: Flat [value, length, value, length, ...] list in row-major order
+        height: Bounding box height
+        width: Bounding box width
+        dtype: Mask dtype; values are checked against it and expanded
+            straight into it
+
+    Returns:
+        (height, width) array of label values
+    """
+    runs = np.asarray(runs, dtype=np.int64)
+    if runs.ndim != 1 or runs.size % 2:
+        raise ValueError("RLE runs must be a flat list of value/length pairs")
+    values, lengths = runs[0::2], runs[1::2]
+    if (lengths < 0).any() or (values < 0).any():
+        raise ValueError("RLE values and lengths must be non-negative")
+    total = int(lengths.sum())
+    if total != height * width:
+        raise ValueError(f"RLE covers {total} pixels but the box has {height * width}")
+    check_values_fit(values, dtype)
+    return np.repeat(values.astype(dtype), lengths).reshape(height, width)
+
+
+def encode_rle(arr: np.ndarray) -> List[int]:
+    """Run-length encode an array in row-major order (inverse of decode_rle)"""
+    flat = np.ravel(arr)
+    if flat.size == 0:
+        return []
+    starts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+    lengths = np.diff(np.concatenate((starts, [flat.size])))
+    runs = np.empty(starts.size * 2, dtype=np.int64)
+    runs[0::2] = flat[starts]
+    runs[1::2] = lengths
+    return runs.tolist()
+
+
+def decode_bitmask(data: str, height: int, width: int) -> np.ndarray:
+    """
+    Decode a compressed bitmask of the pixels a patch touches
+
+    Args:
+        data: base64 of zlib-compressed np.packbits output (row-major, MSB first)
+        height: Bounding box height
+        width: Bounding box width
+
+    Returns:
+        (height, width) boolean array
+    """
+    try:
+        packed = zlib.decompress(base64.b64decode(data))
+    except (ValueError, zlib.error) as e:
+        raise ValueError(f"Invalid bitmask data: {e}")
+    bits = np.unpackbits(np.frombuffer(packed, dtype=np.uint8))
+    if bits.size < height * width:
+        raise ValueError(
+            f"Bitmask holds {bits.size} pixels but the box has {height * width}"
+        )
+    return bits[: height * width].reshape(height, width).astype(bool)
+
+
+def changed_bbox(
+    before: np.ndarray, after: np.ndarray
+) -> Optional[Tuple[slice, slice]]:
+    """Smallest (rows, cols) slices containing every differing pixel"""
+    diff = before != after
+    rows = np.flatnonzero(diff.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(diff.any(axis=0))
+    return slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1)
+
+
+class InversePatch(NamedTuple):
+    """Pixels a mask edit overwrote, enough to undo it"""
+
+    y: int
+    x: int
+    data: np.ndarray
+
+
+class MaskUndoHistory:
+    """
+    Per-layer stacks of inverse patches for one session
+
+    Only the bounding box an edit changed is kept, so brush strokes cost a
+    few kilobytes. The oldest patches across all layers are dropped once the
+    history exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = MAX_UNDO_BYTES):
+        self.max_bytes = max_bytes
+        # layer index -> stack of (sequence number, patch), oldest first
+        self._stacks: Dict[int, List[Tuple[int, InversePatch]]] = {}
+        self._sequence = itertools.count()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def push(self, layer_index: int, patch: InversePatch) -> None:
+        with self._lock:
+            stack = self._stacks.setdefault(layer_index, [])
+            stack.append((next(self._sequence), patch))
+            self._bytes += patch.data.nbytes
+            self._enforce_budget()
+
+    def pop(self, layer_index: int) -> Optional[InversePatch]:
+        with self._lock:
+            stack = self._stacks.get(layer_index)
+            if not stack:
+                return None
+            _, patch = stack.pop()
+            if not stack:
+                del self._stacks[layer_index]
+            self._bytes -= patch.data.nbytes
+            return patch
+
+    def depth(self, layer_index: int) -> int:
+        with self._lock:
+            return len(self._stacks.get(layer_index, ()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self._bytes = 0
+
+    def _enforce_budget(self) -> None:
+        while self._bytes > self.max_bytes and self._stacks:
+            # Oldest patch is at the bottom of one of the stacks
+            layer_index = min(self._stacks, key=lambda i: self._stacks[i][0][0])
+            stack = self._stacks[layer_index]
+            _, patch = stack.pop(0)
+            if not stack:
+                del self._stacks[layer_index]
+            self._bytes -= patch.data.nbytes
@@ -0,0 +1,261 @@
+"""
+Incremental mask persistence for EHTool
+Saves a single edited TIFF page without rewriting the whole stack
+"""
+
+import os
+import glob
+import tempfile
+import threading
+import logging
+import numpy as np
+import tifffile
+from typing import Dict, List, Optional
+
+from .volume import TiffVolume
+
+logger = logging.getLogger(__name__)
+
+COMPACT_DELAY = float(os.environ.get("EHTOOL_MASK_COMPACT_DELAY", 30))
+EDITS_SUFFIX = ".edits"
+COMPACT_PREFIX = ".compact-"
+
+# A session can be evicted and reloaded while its old store is still
+# compacting, so compaction is serialised per file across store instances
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_guard = threading.Lock()
+
+
+def _compaction_lock(path: str) -> threading.Lock:
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class TiffMaskStore:
+    """
+    Persists per-layer mask edits for a TIFF mask stack
+
+    Uncompressed stacks are patched in place through a writable memory map,
+    touching only the edited page. Compressed stacks get one sidecar file per
+    edited layer (written atomically), and a debounced background compaction
+    folds the sidecars back into the TIFF via a temp file and atomic rename.
+    Sidecars left behind by a crash are re-applied when the store is opened.
+    """
+
+    def __init__(
+        self, path: str, volume: TiffVolume, compact_delay: float = COMPACT_DELAY
+    ):
+        self.path = path
+        self.volume = volume
+        self.compact_delay = compact_delay
+        self.edits_dir = path + EDITS_SUFFIX
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._compact_lock = _compaction_lock(path)
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+        self._remove_stale_temp_files()
+        self._recover()
+
+    # Public API
+
+    def write_layer(self, index: int, data: np.ndarray) -> None:
+        """Persist one edited layer"""
+        if self.volume.is_memmapped:
+            self._write_in_place(index, data)
+            return
+
+        self._write_sidecar(index, data)
+        self._schedule_compaction()
+
+    def pending_layers(self) -> List[int]:
+        """Layers whose edits are only in sidecar files so far"""
+        with self._lock:
+            return sorted(self._versions)
+
+    def compact(self) -> int:
+        """
+        Fold sidecar edits back into the TIFF
+
+        Returns:
+            Number of layers consolidated
+        """
+        with self._compact_lock:
+            with self._lock:
+                snapshot = {
+                    index: (version, _file_identity(self._sidecar_path(index)))
+                    for index, version in self._versions.items()
+                }
+            if not snapshot:
+                return 0
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=self._compact_prefix(), suffix=".tif", dir=directory
+            )
+            os.close(fd)
+            written: Dict[int, np.ndarray] = {}
+
+            def slices():
+                # The volume overlay already holds every edit, so streaming its
+                # slices yields the consolidated stack
+                for index in range(self.volume.num_slices):
+                    data = self.volume.snapshot_slice(index)
+                    if index in snapshot:
+                        written[index] = data
+                    yield data
+
+            try:
+                tifffile.imwrite(
+                    tmp_path,
+                    slices(),
+                    shape=self.volume.shape,
+                    dtype=self.volume.dtype,
+                    compression=_compression_arg(self.volume.compression),
+                )
+                _fsync_path(tmp_path)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self.volume.reopen()
+
+            # Only drop sidecars that were not edited again while compacting
+            with self._lock:
+                for index, (version, identity) in snapshot.items():
+                    if self._versions.get(index) != version:
+                        continue
+                    del self._versions[index]
+                    self.volume.discard_overlay(index, expected=written[index])
+                    sidecar = self._sidecar_path(index)
+                    if _file_identity(sidecar) == identity:
+                        _remove(sidecar)
+                if not self._versions:
+                    try:
+                        os.rmdir(self.edits_dir)
+                    except OSError:
+                        pass
+            logger.info("Compacted %d mask layer(s) into %s", len(snapshot), self.path)
+            return len(snapshot)
+
+    def close(self) -> None:
+        """Stop the timer and consolidate outstanding edits in the background"""
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending = bool(self._versions)
+        if pending:
+            # Non-daemon so shutdown waits for the rewrite to finish
+            threading.Thread(
+                target=self._compact_and_close, name="ehtool-mask-compact"
+            ).start()
+        else:
+            self.volume.close()
+
+    # Internals
+
+    def _write_in_place(self, index: int, data: np.ndarray) -> None:
+        memmap = tifffile.memmap(self.path, mode="r+")
+        try:
+            if self.volume.is_3d:
+                memmap[index] = data
+            else:
+                memmap[...] = data
+            memmap.flush()
+        finally:
+            del memmap
+        # The read-only mapping sees the new page, so the in-memory copy can go
+        self.volume.discard_overlay(index, expected=data)
+
+    def _write_sidecar(self, index: int, data: np.ndarray) -> None:
+        os.makedirs(self.edits_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.edits_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._sidecar_path(index))
+        except Exception:
+            _remove(tmp_path)
+            raise
+        with self._lock:
+            self._versions[index] = self._versions.get(index, 0) + 1
+
+    def _schedule_compaction(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.compact_delay, self._compact_quietly)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _compact_quietly(self) -> None:
+        try:
+            self.compact()
+        except Exception:
+            logger.exception("Mask compaction failed for %s", self.path)
+
+    def _compact_and_close(self) -> None:
+        self._compact_quietly()
+        self.volume.close()
+
+    def _recover(self) -> None:
+        """Re-apply sidecar edits that were never compacted"""
+        for sidecar in sorted(glob.glob(os.path.join(self.edits_dir, "*.npy"))):
+            name = os.path.splitext(os.path.basename(sidecar))[0]
+            try:
+                index = int(name)
+                self.volume.set_slice(index, np.load(sidecar))
+            except (ValueError, IndexError, OSError) as e:
+                logger.warning("Ignoring unreadable mask edit %s: %s", sidecar, e)
+                continue
+            self._versions[index] = 1
+        if self._versions:
+            self._schedule_compaction()
+
+    def _remove_stale_temp_files(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        for path in glob.glob(os.path.join(directory, self._compact_prefix() + "*")):
+            _remove(path)
+        for path in glob.glob(os.path.join(self.edits_dir, "*.tmp")):
+            _remove(path)
+
+    def _compact_prefix(self) -> str:
+        return f".{os.path.basename(self.path)}{COMPACT_PREFIX}"
+
+    def _sidecar_path(self, index: int) -> str:
+        return os.path.join(self.edits_dir, f"{index:06d}.npy")
+
+
+def _compression_arg(compression) -> Optional[object]:
+    """Map a tifffile COMPRESSION value to an imwrite argument"""
+    if compression is None or int(compression) == 1:
+        return None
+    return compression
+
+
+def _file_identity(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _fsync_path(path: str) -> None:
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -3,7 +3,7 @@ Pydantic models for EHTool API endpoints
 """
 
 from pydantic import BaseModel, field_validator
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 import os
 
@@ -42,11 +42,27 @@ class DetectionLoadRequest(BaseModel):
         return normalized
 
 
+class LayerRange(BaseModel):
+    """Inclusive range of layer indices"""
+
+    start: int
+    end: int
+
+
 class LayerClassifyRequest(BaseModel):
-    """Request to classify layer(s)"""
+    """
+    Request to classify layer(s)
+
+    Layers are selected by id, by layer_index ranges, or (select_all) every
+    layer of the session. filter_classification further restricts the
+    selection to layers that currently have that classification.
+    """
 
     session_id: int
-    layer_ids: List[int]
+    layer_ids: List[int] = []
+    layer_ranges: List[LayerRange] = []
+    select_all: bool = False
+    filter_classification: Optional[str] = None
     classification: str  # 'correct', 'incorrect', 'unsure', 'error'
 
 
@@ -58,6 +74,34 @@ class MaskSaveRequest(BaseModel):
     mask_base64: str
 
 
+class MaskPatchRequest(BaseModel):
+    """
+    Request to overwrite a bounding box of a layer mask
+
+    With encoding 'rle', runs is a flat [value, length, ...] list covering the
+    box in row-major order. With encoding 'bitmask', data is the base64 of a
+    zlib-compressed np.packbits array marking the pixels set to value.
+    """
+
+    session_id: int
+    layer_index: int
+    x: int
+    y: int
+    width: int
+    height: int
+    encoding: str = "rle"
+    runs: Optional[List[int]] = None
+    data: Optional[str] = None
+    value: Optional[int] = None
+
+
+class MaskUndoRequest(BaseModel):
+    """Request to revert the most recent edit of a layer mask"""
+
+    session_id: int
+    layer_index: int
+
+
 # Response Models
 class DetectionLoadResponse(BaseModel):
     """Response after loading detection dataset"""
@@ -65,6 +109,27 @@ class DetectionLoadResponse(BaseModel):
     session_id: int
     total_layers: int
     project_name: str
+    # Milliseconds spent on volume discovery, DB insertion and caching
+    timings: Dict[str, float] = {}
+
+
+class LoadJobResponse(BaseModel):
+    """Progress of a background dataset load"""
+
+    job_id: str
+    stage: str  # queued, opening, creating_layers, warming, done, failed
+    session_id: Optional[int] = None
+    error: Optional[str] = None
+    files_scanned: int = 0
+    slices_to_preload: int = 0
+    slices_preloaded: int = 0
+    total_layers: int = 0
+    layers_created: int = 0
+    slices_to_warm: int = 0
+    slices_decoded: int = 0
+    bytes_read: int = 0
+    timings: Dict[str, float] = {}
+    version: int = 0
 
 
 class LayerInfo(BaseModel):
@@ -74,6 +139,10 @@ class LayerInfo(BaseModel):
     layer_index: int
     layer_name: str
     classification: str
+    image_url: Optional[str] = None
+    mask_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    mask_thumbnail_url: Optional[str] = None
     image_base64: Optional[str] = None
     mask_base64: Optional[str] = None
 
@@ -88,6 +157,41 @@ class LayersPageResponse(BaseModel):
     total_pages: int
 
 
+class LayersCursorResponse(BaseModel):
+    """Keyset-paginated layers; pass next_cursor as `after` for the next page"""
+
+    layers: List[LayerInfo]
+    # Matching layers; only counted for the first page (after < 0)
+    total: Optional[int] = None
+    next_cursor: Optional[int] = None
+
+
+class NextLayerResponse(BaseModel):
+    """A layer found by classification, with the grid page it is on"""
+
+    layer: LayerInfo
+    page: int
+
+
+class PyramidLevel(BaseModel):
+    """Geometry of one downsample level"""
+
+    level: int
+    width: int
+    height: int
+    tiles_x: int
+    tiles_y: int
+
+
+class PyramidInfoResponse(BaseModel):
+    """Tile pyramid layout shared by every slice of a session"""
+
+    width: int
+    height: int
+    tile_size: int
+    levels: List[PyramidLevel]
+
+
 class DetectionStatsResponse(BaseModel):
     """Statistics for detection workflow"""
 
@@ -105,3 +209,67 @@ class ClassifyResponse(BaseModel):
 
     updated_count: int
     message: str
+
+
+class SessionCacheStatsResponse(BaseModel):
+    """Occupancy and counters of the DataManager session cache"""
+
+    entries: int
+    total_bytes: int
+    max_bytes: int
+    idle_ttl: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+
+
+class RenderCacheStatsResponse(BaseModel):
+    """Occupancy and counters of the rendered-layer cache"""
+
+    memory_entries: int
+    memory_bytes: int
+    max_bytes: int
+    disk_dir: Optional[str] = None
+    max_disk_bytes: int
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    prefetch_scheduled: int = 0
+    prefetch_completed: int = 0
+    prefetch_cancelled: int = 0
+
+
+class MaskSaveResponse(BaseModel):
+    """Response after a mask edit was applied and queued for saving"""
+
+    message: str
+    layer_index: int
+    mask_version: int
+    pending_layers: List[int]
+    undo_depth: int = 0
+
+
+class MaskUndoResponse(MaskSaveResponse):
+    """Response after an edit was undone; runs hold the restored box (RLE)"""
+
+    x: int
+    y: int
+    width: int
+    height: int
+    runs: List[int]
+
+
+class MaskWriteStatusResponse(BaseModel):
+    """Write-behind state of a session's mask edits"""
+
+    session_id: int
+    loaded: bool
+    pending_layers: List[int] = []
+    oldest_pending_age: Optional[float] = None
+    saves: int = 0
+    coalesced: int = 0
+    flushed: int = 0
+    failed: int = 0
+    last_flush_at: Optional[float] = None
+    last_error: Optional[str] = None
@@ -0,0 +1,135 @@
+"""
+Intensity normalization for EHTool
+Maps slices of any dtype to uint8 through one intensity window per volume
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .utils import ensure_grayscale_2d
+from .volume import Volume
+
+SAMPLE_SLICES = int(os.environ.get("EHTOOL_NORM_SAMPLE_SLICES", 8))
+SAMPLE_PIXELS = int(os.environ.get("EHTOOL_NORM_SAMPLE_PIXELS", 256 * 256))
+LOW_PERCENTILE = float(os.environ.get("EHTOOL_NORM_LOW_PERCENTILE", 0.5))
+HIGH_PERCENTILE = float(os.environ.get("EHTOOL_NORM_HIGH_PERCENTILE", 99.5))
+
+# Integer dtypes up to this many bits are converted through a lookup table
+LUT_MAX_BITS = 16
+
+
+def _uses_lut(dtype: np.dtype) -> bool:
+    return dtype.kind in "biu" and dtype.itemsize * 8 <= LUT_MAX_BITS
+
+
+@lru_cache(maxsize=32)
+def _build_lut(dtype_str: str, low: float, high: float) -> np.ndarray:
+    """uint8 value of every bit pattern of dtype, indexed by its unsigned view"""
+    dtype = np.dtype(dtype_str)
+    bits = dtype.itemsize * 8
+    domain = np.arange(2**bits, dtype=f"u{dtype.itemsize}").view(dtype)
+    lut = _scale(domain, low, high)
+    lut.flags.writeable = False
+    return lut
+
+
+def _scale(arr: np.ndarray, low: float, high: float) -> np.ndarray:
+    out = np.subtract(arr, low, dtype=np.float32)
+    out *= np.float32(255.0 / (high - low))
+    np.clip(out, 0, 255, out=out)
+    return out.astype(np.uint8)
+
+
+class IntensityNormalizer:
+    """
+    Maps slices of one volume to uint8 with a shared intensity window
+
+    Every slice uses the same [low, high] window, so contrast does not change
+    from layer to layer. Integer slices of up to 16 bits are converted with a
+    single table lookup per pixel; wider integers and floats are scaled in
+    float32. uint8 slices are already display-ready and pass through.
+    """
+
+    def __init__(self, dtype: np.dtype, low: float, high: float):
+        self.dtype = np.dtype(dtype)
+        self.low = float(low)
+        self.high = float(high) if high > low else float(low) + 1.0
+
+    @property
+    def key(self) -> str:
+        """Identifies the mapping in render cache keys"""
+        return f"norm={self.low:g}:{self.high:g}"
+
+    def __call__(self, arr: np.ndarray) -> np.ndarray:
+        if arr.dtype == np.uint8:
+            return arr
+        if arr.dtype == self.dtype and _uses_lut(arr.dtype):
+            lut = _build_lut(self.dtype.str, self.low, self.high)
+            return np.take(lut, arr.view(f"u{arr.dtype.itemsize}"))
+        return _scale(arr, self.low, self.high)
+
+
+def sample_intensities(
+    volume: Volume,
+    sample_slices: int = SAMPLE_SLICES,
+    sample_pixels: int = SAMPLE_PIXELS,
+) -> np.ndarray:
+    """
+    Gather a strided subset of pixels from evenly spaced slices
+
+    Args:
+        volume: Volume to sample
+        sample_slices: Maximum number of slices to read
+        sample_pixels: Approximate pixel budget per slice
+
+    Returns:
+        1D array of sampled values in the volume's dtype
+    """
+    count = min(volume.num_slices, max(sample_slices, 1))
+    indices = np.unique(np.linspace(0, volume.num_slices - 1, count).round())
+    samples = []
+    for index in indices.astype(int):
+        image = ensure_grayscale_2d(volume.get_slice(int(index)))
+        step = max(1, int(np.sqrt(image.size / max(sample_pixels, 1))))
+        samples.append(np.ravel(image[::step, ::step]))
+    return np.concatenate(samples)
+
+
+def fit_normalizer(
+    volume: Volume,
+    low_percentile: float = LOW_PERCENTILE,
+    high_percentile: float = HIGH_PERCENTILE,
+) -> IntensityNormalizer:
+    """
+    Compute a volume's intensity window from a sampled histogram
+
+    Args:
+        volume: Image volume the normalizer is for
+        low_percentile: Percentile mapped to 0
+        high_percentile: Percentile mapped to 255
+
+    Returns:
+        Normalizer for the volume's slices
+    """
+    dtype = volume.dtype
+    if dtype == np.uint8:
+        return IntensityNormalizer(dtype, 0, 255)
+
+    values = sample_intensities(volume)
+    if _uses_lut(dtype):
+        # Exact percentiles from a full-range histogram of the sample
+        offset = int(np.iinfo(dtype).min) if dtype.kind != "b" else 0
+        counts = np.bincount(values.astype(np.int64) - offset)
+        cdf = np.cumsum(counts)
+        low, high = (
+            int(np.searchsorted(cdf, cdf[-1] * q / 100.0)) + offset
+            for q in (low_percentile, high_percentile)
+        )
+    else:
+        values = values[np.isfinite(values)].astype(np.float64)
+        if values.size == 0:
+            return IntensityNormalizer(dtype, 0, 1)
+        low, high = np.percentile(values, (low_percentile, high_percentile))
+    return IntensityNormalizer(dtype, low, high)
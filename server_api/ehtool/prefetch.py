@@ -0,0 +1,95 @@
+"""
+Predictive prefetch for EHTool
+Warms the render cache for pages the user is likely to open next
+"""
+
+import os
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFETCH_PAGES = int(os.environ.get("EHTOOL_PREFETCH_PAGES", 1))
+MAX_PREFETCH_PAGES = 5
+DEFAULT_PREFETCH_WORKERS = int(os.environ.get("EHTOOL_PREFETCH_WORKERS", 2))
+
+
+def neighbour_pages(page: int, total_pages: int, depth: int) -> List[int]:
+    """Pages around the current one, nearest first, next before previous"""
+    pages = []
+    for distance in range(1, depth + 1):
+        for candidate in (page + distance, page - distance):
+            if 1 <= candidate <= total_pages:
+                pages.append(candidate)
+    return pages
+
+
+class Prefetcher:
+    """
+    Runs low-priority render tasks on its own small pool
+
+    Each call to schedule() supersedes the previous batch for that session:
+    queued tasks are cancelled and tasks already picked up are skipped, so a
+    user jumping across the stack never waits behind stale prefetch work.
+    """
+
+    def __init__(self, workers: int = DEFAULT_PREFETCH_WORKERS):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="ehtool-prefetch"
+        )
+        self._generations: Dict[int, int] = {}
+        self._futures: Dict[int, List[Future]] = {}
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.completed = 0
+        self.cancelled = 0
+
+    def schedule(self, session_id: int, tasks: Iterable[Callable[[], Any]]) -> None:
+        """Replace the session's pending prefetch work with a new batch"""
+        with self._lock:
+            generation = self._cancel_locked(session_id)
+            futures = []
+            for task in tasks:
+                futures.append(
+                    self._executor.submit(self._run, session_id, generation, task)
+                )
+                self.scheduled += 1
+            self._futures[session_id] = futures
+
+    def cancel(self, session_id: int) -> None:
+        """Drop all pending prefetch work for a session"""
+        with self._lock:
+            self._cancel_locked(session_id)
+            self._generations.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "prefetch_scheduled": self.scheduled,
+                "prefetch_completed": self.completed,
+                "prefetch_cancelled": self.cancelled,
+            }
+
+    def _cancel_locked(self, session_id: int) -> int:
+        """Cancel queued work and start a new generation; returns its number"""
+        for future in self._futures.pop(session_id, []):
+            if future.cancel():
+                self.cancelled += 1
+        generation = self._generations.get(session_id, 0) + 1
+        self._generations[session_id] = generation
+        return generation
+
+    def _run(self, session_id: int, generation: int, task: Callable[[], Any]) -> None:
+        if self._generations.get(session_id) != generation:
+            with self._lock:
+                self.cancelled += 1
+            return
+        try:
+            task()
+        except Exception as e:
+            logger.debug("Prefetch task for session %s failed: %s", session_id, e)
+            return
+        with self._lock:
+            self.completed += 1
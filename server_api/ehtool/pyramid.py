@@ -0,0 +1,153 @@
+"""
+Multiscale tile pyramids for EHTool
+Large slices are served as fixed-size tiles at power-of-two downsample levels
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+TILE_SIZE = int(os.environ.get("EHTOOL_TILE_SIZE", 512))
+DEFAULT_PYRAMID_CACHE_BYTES = int(
+    os.environ.get("EHTOOL_PYRAMID_CACHE_BYTES", 512 * 1024**2)
+)
+
+
+def num_levels(shape: Tuple[int, int], tile_size: int = TILE_SIZE) -> int:
+    """Levels needed until the whole slice fits into a single tile"""
+    height, width = shape
+    levels = 1
+    while max(height, width) > tile_size:
+        height = (height + 1) // 2
+        width = (width + 1) // 2
+        levels += 1
+    return levels
+
+
+def level_shape(shape: Tuple[int, int], level: int) -> Tuple[int, int]:
+    """Shape of a slice at a given downsample level"""
+    height, width = shape
+    for _ in range(level):
+        height = (height + 1) // 2
+        width = (width + 1) // 2
+    return height, width
+
+
+def describe_levels(
+    shape: Tuple[int, int], tile_size: int = TILE_SIZE
+) -> List[Dict[str, int]]:
+    """Width, height and tile counts for every level of a slice"""
+    levels = []
+    for level in range(num_levels(shape, tile_size)):
+        height, width = level_shape(shape, level)
+        levels.append(
+            {
+                "level": level,
+                "width": width,
+                "height": height,
+                "tiles_x": -(-width // tile_size),
+                "tiles_y": -(-height // tile_size),
+            }
+        )
+    return levels
+
+
+def build_pyramid(
+    arr: np.ndarray, is_mask: bool = False, tile_size: int = TILE_SIZE
+) -> List[np.ndarray]:
+    """
+    Downsample a 2D slice by powers of two
+
+    Args:
+        arr: Full-resolution uint8 slice (level 0)
+        is_mask: Use nearest-neighbour so label values are preserved
+        tile_size: Stop once a level fits into a single tile
+
+    Returns:
+        List of arrays, index = level
+    """
+    interpolation = cv2.INTER_NEAREST if is_mask else cv2.INTER_AREA
+    levels = [arr]
+    for level in range(1, num_levels(arr.shape, tile_size)):
+        height, width = level_shape(arr.shape, level)
+        levels.append(
+            cv2.resize(levels[-1], (width, height), interpolation=interpolation)
+        )
+    return levels
+
+
+def downsample_to_level(
+    arr: np.ndarray, level: int, is_mask: bool = False
+) -> np.ndarray:
+    """
+    One pyramid level computed straight from level 0
+
+    Skips the levels in between, for callers that only need the coarsest
+    one (e.g. thumbnails).
+    """
+    height, width = level_shape(arr.shape[:2], level)
+    if (height, width) == arr.shape[:2]:
+        return arr
+    interpolation = cv2.INTER_NEAREST if is_mask else cv2.INTER_AREA
+    return cv2.resize(arr, (width, height), interpolation=interpolation)
+
+
+def extract_tile(
+    level_arr: np.ndarray, tile_x: int, tile_y: int, tile_size: int = TILE_SIZE
+) -> np.ndarray:
+    """Crop one tile out of a pyramid level (edge tiles may be smaller)"""
+    height, width = level_arr.shape[:2]
+    x0 = tile_x * tile_size
+    y0 = tile_y * tile_size
+    if tile_x < 0 or tile_y < 0 or x0 >= width or y0 >= height:
+        raise IndexError(f"Tile ({tile_x}, {tile_y}) out of range")
+    return level_arr[y0 : y0 + tile_size, x0 : x0 + tile_size]
+
+
+class PyramidCache:
+    """Byte-bounded LRU of per-slice pyramids"""
+
+    def __init__(self, max_bytes: int = DEFAULT_PYRAMID_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, List[np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable) -> Optional[List[np.ndarray]]:
+        with self._lock:
+            levels = self._entries.get(key)
+            if levels is not None:
+                self._entries.move_to_end(key)
+            return levels
+
+    def put(self, key: Hashable, levels: List[np.ndarray]) -> None:
+        size = sum(level.nbytes for level in levels)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= sum(level.nbytes for level in previous)
+            self._entries[key] = levels
+            self._bytes += size
+            # Always keep the newest pyramid, even if it alone is over budget
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(level.nbytes for level in evicted)
+
+    def discard(self, predicate) -> None:
+        """Drop every entry whose key matches predicate"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._bytes -= sum(level.nbytes for level in self._entries.pop(key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -0,0 +1,229 @@
+"""
+Rendered-layer cache for EHTool
+Stores encoded layer images in memory and on disk so paging is cheap
+"""
+
+import os
+import glob
+import shutil
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = int(os.environ.get("EHTOOL_RENDER_CACHE_MAX_BYTES", 256 * 1024**2))
+DEFAULT_MAX_DISK_BYTES = int(
+    os.environ.get("EHTOOL_RENDER_CACHE_DISK_BYTES", 2 * 1024**3)
+)
+DEFAULT_DISK_DIR = os.environ.get(
+    "EHTOOL_RENDER_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "pytc-ehtool-render-cache"),
+)
+
+
+class RenderKey(NamedTuple):
+    """
+    Identifies one rendered image
+
+    kind is 'image' or 'mask'; variant encodes everything else that changes
+    the output bytes (source fingerprint, enhance flag, mask version, ...).
+    """
+
+    session_id: int
+    layer_index: int
+    kind: str
+    variant: str
+
+    def digest(self) -> str:
+        text = f"{self.session_id}|{self.layer_index}|{self.kind}|{self.variant}"
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+
+    def filename(self) -> str:
+        return f"{self.layer_index}_{self.kind}_{self.digest()}.bin"
+
+
+class RenderCache:
+    """
+    Two-tier (memory LRU + disk) cache of encoded layer images
+
+    The disk tier survives session eviction and server restarts; entries are
+    grouped per session so a whole session or a single layer can be dropped.
+    Set disk_dir to None to keep the cache in memory only.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        disk_dir: Optional[str] = DEFAULT_DISK_DIR,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[RenderKey, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: Optional[int] = None
+        self._lock = threading.RLock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: RenderKey) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, data)
+        return data
+
+    def put(self, key: RenderKey, data: bytes) -> None:
+        with self._lock:
+            self._put_memory(key, data)
+        self._write_disk(key, data)
+
+    def invalidate_layer(
+        self, session_id: int, layer_index: int, kind: Optional[str] = None
+    ) -> None:
+        """Drop every cached variant of one layer (optionally only one kind)"""
+        with self._lock:
+            for key in list(self._memory):
+                if (
+                    key.session_id == session_id
+                    and key.layer_index == layer_index
+                    and (kind is None or key.kind == kind)
+                ):
+                    self._memory_bytes -= len(self._memory.pop(key))
+        session_dir = self._session_dir(session_id)
+        if session_dir is None:
+            return
+        pattern = f"{layer_index}_{kind or '*'}_*.bin"
+        freed = sum(
+            self._remove_file(path)
+            for path in glob.glob(os.path.join(session_dir, pattern))
+        )
+        self._forget_disk_bytes(freed)
+
+    def invalidate_session(self, session_id: int) -> None:
+        """Drop everything cached for a session"""
+        with self._lock:
+            for key in list(self._memory):
+                if key.session_id == session_id:
+                    self._memory_bytes -= len(self._memory.pop(key))
+            session_dir = self._session_dir(session_id)
+            if session_dir is not None and os.path.isdir(session_dir):
+                freed = sum(size for _, _, size in self._scan_disk(session_dir))
+                shutil.rmtree(session_dir, ignore_errors=True)
+                self._forget_disk_bytes(freed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_dir": self.disk_dir,
+                "max_disk_bytes": self.max_disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    # Memory tier
+
+    def _put_memory(self, key: RenderKey, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # Disk tier
+
+    def _session_dir(self, session_id: int) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        return os.path.join(self.disk_dir, str(session_id))
+
+    def _read_disk(self, key: RenderKey) -> Optional[bytes]:
+        session_dir = self._session_dir(key.session_id)
+        if session_dir is None:
+            return None
+        try:
+            with open(os.path.join(session_dir, key.filename()), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: RenderKey, data: bytes) -> None:
+        session_dir = self._session_dir(key.session_id)
+        if session_dir is None:
+            return
+        try:
+            os.makedirs(session_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=session_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            path = os.path.join(session_dir, key.filename())
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to write render cache entry: %s", e)
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data) - replaced
+            self._enforce_disk_budget()
+
+    def _forget_disk_bytes(self, freed: int) -> None:
+        """Take removed files off the running total instead of rescanning"""
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes = max(0, self._disk_bytes - freed)
+
+    def _enforce_disk_budget(self) -> None:
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, _, size in self._scan_disk())
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        # Drop the least recently written files until 90% of the budget
+        target = int(self.max_disk_bytes * 0.9)
+        for path, _, _ in sorted(self._scan_disk(), key=lambda entry: entry[1]):
+            if self._disk_bytes <= target:
+                break
+            self._disk_bytes -= self._remove_file(path)
+
+    def _scan_disk(self, session_dir: Optional[str] = None):
+        pattern = os.path.join(session_dir or os.path.join(self.disk_dir, "*"), "*.bin")
+        for path in glob.glob(pattern):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat.st_mtime, stat.st_size
+
+    def _remove_file(self, path: str) -> int:
+        """Delete a cache file; returns the bytes freed (0 if already gone)"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        return size
@@ -3,15 +3,24 @@ FastAPI router for EHTool detection workflow
 Handles error detection endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import asyncio
+import atexit
+import functools
+import json
 import math
+import os
+import time
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
-from server_api.auth.database import get_db
+from server_api.auth.database import SessionLocal, get_db
 from server_api.auth.router import get_current_user
 from server_api.auth.models import User
 
@@ -24,25 +33,100 @@ from .models import (
     LayerInfo,
     DetectionStatsResponse,
     MaskSaveRequest,
+    SessionCacheStatsResponse,
+    RenderCacheStatsResponse,
+    PyramidInfoResponse,
+    MaskSaveResponse,
+    MaskWriteStatusResponse,
+    MaskPatchRequest,
+    MaskUndoRequest,
+    MaskUndoResponse,
+    LayersCursorResponse,
+    NextLayerResponse,
+    LoadJobResponse,
 )
 from .db_models import EHToolSession, EHToolLayer
+from .layer_queries import (
+    VALID_CLASSIFICATIONS,
+    classification_counts,
+    classify_layer_selection,
+    insert_layer_rows,
+    layers_after,
+    next_layer,
+)
 from .data_manager import DataManager
+from .session_cache import SessionCache
+from .render_cache import RenderCache, RenderKey
+from .utils import (
+    CLAHE_CLIP_LIMIT,
+    CLAHE_TILE_GRID,
+    DEFAULT_CLAHE,
+    ClaheParams,
+    bytes_to_data_uri,
+)
+from .image_codecs import (
+    IMAGE_QUALITY,
+    LOSSLESS,
+    PREVIEW_FORMAT,
+    ImageEncoding,
+    image_encoding,
+)
+from .pyramid import TILE_SIZE
+from .mask_journal import MaskFlusher
+from .load_jobs import WARM_PAGES, LoadJob, LoadJobRegistry
+from .mask_patch import (
+    PATCH_ENCODINGS,
+    check_values_fit,
+    decode_bitmask,
+    decode_rle,
+    encode_rle,
+)
+from .prefetch import (
+    DEFAULT_PREFETCH_PAGES,
+    MAX_PREFETCH_PAGES,
+    Prefetcher,
+    neighbour_pages,
+)
 
 router = APIRouter()
 
-# DIAGNOSTIC: This should print when the module is loaded
-print("=" * 80)
-print("EHTOOL ROUTER MODULE LOADED - VERSION: DEBUG v2")
-print("=" * 80)
+logger.debug("ehtool router loaded")
+
+# Bounded LRU cache for DataManagers (session_id -> DataManager)
+_data_managers = SessionCache()
 
-# In-memory cache for DataManagers (session_id -> DataManager)
-_data_managers = {}
 
+def data_manager_leases() -> Iterator[List[DataManager]]:
+    """
+    DataManagers referenced by one request
+
+    get_data_manager() adds to the list; the references are released when
+    the request finishes, so an eviction meanwhile can't close a manager
+    that is still in use.
+    """
+    leases: List[DataManager] = []
+    try:
+        yield leases
+    finally:
+        for data_manager in leases:
+            _data_managers.release(data_manager)
 
-def get_data_manager(session_id: int, db: Session) -> DataManager:
-    """Get or create DataManager for a session"""
-    if session_id not in _data_managers:
-        # Try to reload from database
+
+def get_data_manager(
+    session_id: int, db: Session, leases: List[DataManager]
+) -> DataManager:
+    """
+    Get or create DataManager for a session
+
+    Args:
+        session_id: Session to resolve
+        db: Database session
+        leases: Receives the reference taken on the manager; the caller
+            releases it through _data_managers.release()
+    """
+    data_manager = _data_managers.acquire(session_id)
+    if data_manager is None:
+        # Not cached (never loaded or evicted); reload from database
         db_session = (
             db.query(EHToolSession).filter(EHToolSession.id == session_id).first()
         )
@@ -58,63 +142,541 @@ def get_data_manager(session_id: int, db: Session) -> DataManager:
             data_manager.load_dataset(
                 dataset_path=db_session.dataset_path, mask_path=db_session.mask_path
             )
-            # Cache it
-            _data_managers[session_id] = data_manager
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to reload session data: {str(e)}",
             )
+        # Cache it
+        _data_managers.put(session_id, data_manager, retain=True)
 
-    return _data_managers[session_id]
+    leases.append(data_manager)
+    return data_manager
 
 
-@router.post("/detection/load", response_model=DetectionLoadResponse)
-async def load_detection_dataset(
-    request: DetectionLoadRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
+# Two-tier cache of encoded layer images
+_render_cache = RenderCache()
+
+# Bounded pool for CPU-bound slice decoding, CLAHE and encoding. OpenCV and
+# PIL release the GIL, so a page's layers render in parallel while the event
+# loop stays free to serve other requests.
+RENDER_WORKERS = int(
+    os.environ.get("EHTOOL_RENDER_WORKERS", min(32, os.cpu_count() or 4))
+)
+_render_executor = ThreadPoolExecutor(
+    max_workers=RENDER_WORKERS, thread_name_prefix="ehtool-render"
+)
+
+
+# Background warming of neighbouring pages (separate pool, lower priority)
+_prefetcher = Prefetcher()
+
+# Background dataset loads, followed by clients over Server-Sent Events
+_load_jobs = LoadJobRegistry()
+_load_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("EHTOOL_LOAD_WORKERS", 2)),
+    thread_name_prefix="ehtool-load",
+)
+SSE_POLL_INTERVAL = 0.25
+SSE_KEEPALIVE = 15.0
+
+# Write-behind saving of mask edits; pending edits are written on shutdown
+_mask_flusher = MaskFlusher()
+atexit.register(_mask_flusher.stop)
+
+
+def _schedule_prefetch(
+    session_id: int,
+    data_manager: DataManager,
+    page: int,
+    page_size: int,
+    total_layers: int,
+    depth: int,
+    include_images: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+    encoding: ImageEncoding = LOSSLESS,
+) -> None:
+    """Warm the render cache for the pages around the one just served"""
+    total_pages = math.ceil(total_layers / page_size)
+    top = len(data_manager.pyramid_levels()) - 1
+    has_mask = data_manager.mask_volume is not None
+
+    tasks = []
+    for neighbour in neighbour_pages(page, total_pages, depth):
+        start = (neighbour - 1) * page_size
+        for layer_index in range(start, min(start + page_size, total_layers)):
+            if include_images:
+                tasks.append(
+                    functools.partial(
+                        render_layer,
+                        session_id,
+                        data_manager,
+                        layer_index,
+                        True,
+                        clahe,
+                        encoding,
+                    )
+                )
+            else:
+                # The grid shows pyramid thumbnails when images are not inlined
+                kinds = ("image", "mask") if has_mask else ("image",)
+                for kind in kinds:
+                    tasks.append(
+                        functools.partial(
+                            render_tile,
+                            session_id,
+                            data_manager,
+                            layer_index,
+                            kind,
+                            top,
+                            0,
+                            0,
+                            True,
+                            clahe,
+                            encoding,
+                        )
+                    )
+    _prefetcher.schedule(
+        session_id,
+        [functools.partial(_run_leased, data_manager, task) for task in tasks],
+    )
+
+
+def _run_leased(data_manager: DataManager, task) -> None:
+    """Run a background task unless its manager was closed in the meantime"""
+    if not _data_managers.retain(data_manager):
+        return
     try:
-        # Create DataManager and load dataset
-        data_manager = DataManager()
-        dataset_info = data_manager.load_dataset(
-            dataset_path=request.dataset_path, mask_path=request.mask_path
+        task()
+    finally:
+        _data_managers.release(data_manager)
+
+
+async def run_in_render_pool(func, *args, **kwargs):
+    """Run a blocking render function on the render pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _render_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def _display_variant(
+    data_manager: DataManager, enhance: bool, clahe: ClaheParams
+) -> str:
+    """Cache key part for everything that shapes a rendered image's pixels"""
+    variant = f"{data_manager.source_id}|{data_manager.normalizer.key}"
+    if enhance:
+        return f"{variant}|enhance=True|{clahe.key}"
+    return f"{variant}|enhance=False"
+
+
+def _image_key(
+    session_id: int,
+    data_manager: DataManager,
+    layer_index: int,
+    enhance: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+    encoding: ImageEncoding = LOSSLESS,
+) -> RenderKey:
+    variant = f"{_display_variant(data_manager, enhance, clahe)}|{encoding.tag}"
+    return RenderKey(session_id, layer_index, "image", variant)
+
+
+def _image_version(
+    session_id: int,
+    data_manager: DataManager,
+    layer_index: int,
+    enhance: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+) -> str:
+    """
+    v= of a negotiated image URL
+
+    The codec is picked per request from Accept, so the version leaves the
+    encoding out; responses carry Vary: Accept instead.
+    """
+    return _image_key(session_id, data_manager, layer_index, enhance, clahe).digest()
+
+
+def _mask_key(
+    session_id: int, data_manager: DataManager, layer_index: int
+) -> RenderKey:
+    variant = f"{data_manager.source_id}|mask={data_manager.mask_stamp(layer_index)}"
+    return RenderKey(session_id, layer_index, "mask", variant)
+
+
+def render_image(
+    session_id: int,
+    data_manager: DataManager,
+    layer_index: int,
+    enhance: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+    encoding: ImageEncoding = LOSSLESS,
+) -> Tuple[RenderKey, bytes]:
+    """Encoded image for a layer, served from cache if possible"""
+    image_key = _image_key(
+        session_id, data_manager, layer_index, enhance, clahe, encoding
+    )
+    image_bytes = _render_cache.get(image_key)
+    if image_bytes is None:
+        image_bytes = data_manager.encode_image(
+            layer_index, enhance=enhance, encoding=encoding, clahe=clahe
         )
+        _render_cache.put(image_key, image_bytes)
+    return image_key, image_bytes
+
+
+def render_mask(
+    session_id: int, data_manager: DataManager, layer_index: int
+) -> Tuple[RenderKey, bytes]:
+    """Encoded PNG mask for a layer, served from cache if possible"""
+    mask_key = _mask_key(session_id, data_manager, layer_index)
+    mask_bytes = _render_cache.get(mask_key)
+    if mask_bytes is None:
+        mask_bytes = data_manager.encode_mask(layer_index)
+        # Skip caching if the mask was edited while we were encoding
+        if mask_key == _mask_key(session_id, data_manager, layer_index):
+            _render_cache.put(mask_key, mask_bytes)
+    return mask_key, mask_bytes
 
-        # Create session in database
+
+def render_layer(
+    session_id: int,
+    data_manager: DataManager,
+    layer_index: int,
+    enhance: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+    encoding: ImageEncoding = LOSSLESS,
+) -> Tuple[bytes, Optional[bytes]]:
+    """Encoded image and PNG mask bytes for a layer, served from cache if possible"""
+    _, image_bytes = render_image(
+        session_id, data_manager, layer_index, enhance, clahe, encoding
+    )
+    mask_bytes = None
+    if data_manager.mask_volume is not None:
+        _, mask_bytes = render_mask(session_id, data_manager, layer_index)
+    return image_bytes, mask_bytes
+
+
+def render_layers(
+    session_id: int,
+    data_manager: DataManager,
+    layer_indices: List[int],
+    enhance: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+    encoding: ImageEncoding = LOSSLESS,
+) -> List[Tuple[bytes, Optional[bytes]]]:
+    """
+    Batched render_layer for a page: uncached images are enhanced in one call
+
+    Saves dispatching one render task per layer when a whole page misses
+    the cache, e.g. the first visit to a page with new CLAHE settings.
+    """
+    keys = [
+        _image_key(session_id, data_manager, layer_index, enhance, clahe, encoding)
+        for layer_index in layer_indices
+    ]
+    images = {key: _render_cache.get(key) for key in keys}
+    missing = [
+        layer_index
+        for layer_index, key in zip(layer_indices, keys)
+        if images[key] is None
+    ]
+    if missing:
+        arrays = data_manager.get_images(missing, enhance=enhance, clahe=clahe)
+        for layer_index, arr in zip(missing, arrays):
+            key = _image_key(
+                session_id, data_manager, layer_index, enhance, clahe, encoding
+            )
+            images[key] = encoding.encode(arr)
+            _render_cache.put(key, images[key])
+
+    rendered = []
+    for layer_index, key in zip(layer_indices, keys):
+        mask_bytes = None
+        if data_manager.mask_volume is not None:
+            _, mask_bytes = render_mask(session_id, data_manager, layer_index)
+        rendered.append((images[key], mask_bytes))
+    return rendered
+
+
+def _tile_key(
+    session_id: int,
+    data_manager: DataManager,
+    layer_index: int,
+    kind: str,
+    level: int,
+    tile_x: int,
+    tile_y: int,
+    enhance: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+    encoding: ImageEncoding = LOSSLESS,
+) -> RenderKey:
+    tile = f"tile={level}/{tile_x}/{tile_y}"
+    if kind == "mask":
+        mask = data_manager.mask_stamp(layer_index)
+        variant = f"{data_manager.source_id}|mask={mask}|{tile}"
+    else:
+        display = _display_variant(data_manager, enhance, clahe)
+        variant = f"{display}|{tile}|{encoding.tag}"
+    return RenderKey(session_id, layer_index, kind, variant)
+
+
+def _tile_version(
+    session_id: int,
+    data_manager: DataManager,
+    layer_index: int,
+    level: int,
+    tile_x: int,
+    tile_y: int,
+    enhance: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+) -> str:
+    """v= of a negotiated image tile URL; like _image_version it omits the codec"""
+    return _tile_key(
+        session_id,
+        data_manager,
+        layer_index,
+        "image",
+        level,
+        tile_x,
+        tile_y,
+        enhance,
+        clahe,
+    ).digest()
+
+
+def render_tile(
+    session_id: int,
+    data_manager: DataManager,
+    layer_index: int,
+    kind: str,
+    level: int,
+    tile_x: int,
+    tile_y: int,
+    enhance: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+    encoding: ImageEncoding = LOSSLESS,
+) -> Tuple[RenderKey, bytes]:
+    """Encoded tile of a layer image or PNG mask, served from cache if possible"""
+    args = (layer_index, kind, level, tile_x, tile_y, enhance, clahe, encoding)
+    key = _tile_key(session_id, data_manager, *args)
+    content = _render_cache.get(key)
+    if content is None:
+        content = data_manager.encode_tile(
+            layer_index,
+            level,
+            tile_x,
+            tile_y,
+            kind=kind,
+            enhance=enhance,
+            clahe=clahe,
+            encoding=encoding,
+        )
+        if key == _tile_key(session_id, data_manager, *args):
+            _render_cache.put(key, content)
+    return key, content
+
+
+def layer_urls(
+    session_id: int,
+    data_manager: DataManager,
+    layer_index: int,
+    enhance: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+    preview: ImageEncoding = LOSSLESS,
+) -> Dict[str, Optional[str]]:
+    """
+    URLs of the binary image/mask/thumbnail endpoints for a layer
+
+    The version parameter changes whenever the content does, so clients may
+    cache the response for as long as they keep the URL. Thumbnails are the
+    single tile of the coarsest pyramid level, encoded as preview; the full
+    image URL leaves the codec to Accept negotiation.
+    """
+    base = f"/eh/detection/layer/{session_id}/{layer_index}"
+    top = len(data_manager.pyramid_levels()) - 1
+    flag = f"enhance={str(enhance).lower()}"
+    if enhance and clahe != DEFAULT_CLAHE:
+        flag += f"&clip_limit={clahe.clip_limit:g}&tile_grid={clahe.tile_grid}"
+
+    image_version = _image_version(
+        session_id, data_manager, layer_index, enhance, clahe
+    )
+    thumb_flag = flag
+    if preview != LOSSLESS:
+        thumb_flag += f"&format={preview.codec.name}&quality={preview.quality}"
+        thumb_version = _tile_key(
+            session_id,
+            data_manager,
+            layer_index,
+            "image",
+            top,
+            0,
+            0,
+            enhance,
+            clahe,
+            preview,
+        ).digest()
+    else:
+        # No format parameter, so the tile's codec is negotiated from Accept
+        thumb_version = _tile_version(
+            session_id, data_manager, layer_index, top, 0, 0, enhance, clahe
+        )
+    urls = {
+        "image_url": f"{base}/image?{flag}&v={image_version}",
+        "thumbnail_url": (
+            f"{base}/tile/{top}/0/0?kind=image&{thumb_flag}&v={thumb_version}"
+        ),
+        "mask_url": None,
+        "mask_thumbnail_url": None,
+    }
+    if data_manager.mask_volume is not None:
+        mask_version = _mask_key(session_id, data_manager, layer_index).digest()
+        mask_thumb_version = _tile_key(
+            session_id, data_manager, layer_index, "mask", top, 0, 0, enhance
+        ).digest()
+        urls["mask_url"] = f"{base}/mask?v={mask_version}"
+        urls["mask_thumbnail_url"] = (
+            f"{base}/tile/{top}/0/0?kind=mask&v={mask_thumb_version}"
+        )
+    return urls
+
+
+def _binary_image_response(
+    request: Request,
+    key: RenderKey,
+    content: bytes,
+    version: Optional[str],
+    media_type: str = "image/png",
+    negotiated: bool = False,
+    current_version: Optional[str] = None,
+) -> Response:
+    """
+    Cached image response; immutable when the URL's version is current
+
+    current_version defaults to the key's digest; negotiated responses
+    compare against their encoding-independent version instead.
+    """
+    etag = f'"{key.digest()}"'
+    if version == (current_version or key.digest()):
+        cache_control = "private, max-age=31536000, immutable"
+    else:
+        cache_control = "private, no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if negotiated:
+        # The codec was picked from the Accept header
+        headers["Vary"] = "Accept"
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def _load_session(
+    db: Session,
+    request: DetectionLoadRequest,
+    user_id: int,
+    job: Optional[LoadJob] = None,
+) -> Tuple[EHToolSession, Dict[str, float]]:
+    """
+    Open a dataset, create its session and layer rows and cache the manager
+
+    Returns:
+        The new session row and per-step timings in milliseconds
+    """
+    timings = {}
+
+    # Create DataManager and load dataset
+    progress = None
+    if job is not None:
+        job.update(stage="opening")
+
+        def progress(decoded: int, total: int, nbytes: int) -> None:
+            # Small image sequences are decoded up front, file by file
+            if decoded == 1:
+                job.add(slices_to_preload=total)
+            job.add(slices_preloaded=1, bytes_read=nbytes)
+
+    started = time.perf_counter()
+    data_manager = DataManager()
+    dataset_info = data_manager.load_dataset(
+        dataset_path=request.dataset_path,
+        mask_path=request.mask_path,
+        progress=progress,
+    )
+    timings["discovery_ms"] = (time.perf_counter() - started) * 1000
+    if job is not None:
+        # Also counts the slices sampled for the intensity window
+        job.update(bytes_read=data_manager.bytes_read())
+    total_layers = dataset_info["total_layers"]
+
+    try:
+        # Create session and layer records in one transaction
+        if job is not None:
+            job.update(
+                stage="creating_layers",
+                files_scanned=data_manager.source_file_count(),
+                total_layers=total_layers,
+                timings=dict(timings),
+            )
+        started = time.perf_counter()
         db_session = EHToolSession(
-            user_id=current_user.id,
+            user_id=user_id,
             project_name=request.project_name,
             workflow_type="detection",
             dataset_path=request.dataset_path,
             mask_path=request.mask_path,
-            total_layers=dataset_info["total_layers"],
+            total_layers=total_layers,
         )
         db.add(db_session)
+        db.flush()
+        insert_layer_rows(
+            db,
+            db_session.id,
+            (data_manager.get_layer_name(i) for i in range(total_layers)),
+            on_batch=(
+                (lambda count: job.add(layers_created=count))
+                if job is not None
+                else None
+            ),
+        )
         db.commit()
         db.refresh(db_session)
+        timings["db_insert_ms"] = (time.perf_counter() - started) * 1000
+    except Exception:
+        db.rollback()
+        data_manager.close()
+        raise
 
-        # Create layer records
-        for i in range(dataset_info["total_layers"]):
-            layer_name = data_manager.get_layer_name(i)
-            db_layer = EHToolLayer(
-                session_id=db_session.id,
-                layer_index=i,
-                layer_name=layer_name,
-                classification="error",  # Default to 'error' (unreviewed)
-            )
-            db.add(db_layer)
+    # Cache DataManager; drop renders left over from a reused session id
+    started = time.perf_counter()
+    _data_managers.put(db_session.id, data_manager)
+    _render_cache.invalidate_session(db_session.id)
+    timings["caching_ms"] = (time.perf_counter() - started) * 1000
 
-        db.commit()
+    logger.info(
+        "Loaded session %s (%d layers): %s",
+        db_session.id,
+        total_layers,
+        ", ".join(f"{name}={value:.1f}" for name, value in timings.items()),
+    )
+    return db_session, timings
 
-        # Cache DataManager
-        _data_managers[db_session.id] = data_manager
+
+@router.post("/detection/load", response_model=DetectionLoadResponse)
+async def load_detection_dataset(
+    request: DetectionLoadRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    try:
+        db_session, timings = _load_session(db, request, current_user.id)
 
         return DetectionLoadResponse(
             session_id=db_session.id,
-            total_layers=dataset_info["total_layers"],
+            total_layers=db_session.total_layers,
             project_name=request.project_name,
+            timings={name: round(value, 2) for name, value in timings.items()},
         )
 
     except FileNotFoundError as e:
@@ -128,15 +690,266 @@ async def load_detection_dataset(
         )
 
 
+def _run_load_job(
+    job: LoadJob, request: DetectionLoadRequest, user_id: int, page_size: int
+) -> None:
+    """Body of a background load: create the session, then warm its first pages"""
+    db = SessionLocal()
+    leases: List[DataManager] = []
+    try:
+        db_session, timings = _load_session(db, request, user_id, job)
+        session_id = db_session.id
+        data_manager = get_data_manager(session_id, db, leases)
+
+        # Render the thumbnails of the first pages so the grid opens warm
+        started = time.perf_counter()
+        warm = min(db_session.total_layers, max(0, WARM_PAGES) * page_size)
+        job.update(
+            stage="warming",
+            session_id=session_id,
+            slices_to_warm=warm,
+            timings=dict(timings),
+        )
+        top = len(data_manager.pyramid_levels()) - 1
+        kinds = (
+            ("image", "mask") if data_manager.mask_volume is not None else ("image",)
+        )
+        preview = image_encoding(PREVIEW_FORMAT)
+        bytes_read = data_manager.bytes_read()
+        for layer_index in range(warm):
+            for kind in kinds:
+                render_tile(
+                    session_id,
+                    data_manager,
+                    layer_index,
+                    kind,
+                    top,
+                    0,
+                    0,
+                    True,
+                    encoding=preview,
+                )
+            # Slices already decoded (e.g. preloaded) add no bytes
+            total_read = data_manager.bytes_read()
+            job.add(slices_decoded=1, bytes_read=total_read - bytes_read)
+            bytes_read = total_read
+        timings["warming_ms"] = (time.perf_counter() - started) * 1000
+
+        job.update(stage="done", timings=timings)
+    except (FileNotFoundError, ValueError) as e:
+        logger.warning("Background load of %s failed: %s", request.dataset_path, e)
+        job.update(stage="failed", error=str(e))
+    except Exception as e:
+        logger.exception("Background load of %s failed", request.dataset_path)
+        job.update(stage="failed", error=f"Failed to load dataset: {str(e)}")
+    finally:
+        for data_manager in leases:
+            _data_managers.release(data_manager)
+        db.close()
+
+
+@router.post("/detection/load/jobs", response_model=LoadJobResponse)
+async def start_load_job(
+    request: DetectionLoadRequest,
+    page_size: int = 12,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Load a dataset in the background
+
+    Returns a job id right away; follow progress at
+    /detection/load/jobs/{job_id}/events (Server-Sent Events).
+    """
+    job = _load_jobs.create(current_user.id)
+    _load_executor.submit(
+        _run_load_job, job, request, current_user.id, max(1, page_size)
+    )
+    return LoadJobResponse(**job.snapshot())
+
+
+def _get_load_job(job_id: str, user: User) -> LoadJob:
+    job = _load_jobs.get(job_id)
+    if job is None or job.user_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Load job not found"
+        )
+    return job
+
+
+@router.get("/detection/load/jobs/{job_id}", response_model=LoadJobResponse)
+async def get_load_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """Current progress of a background load"""
+    return LoadJobResponse(**_get_load_job(job_id, current_user).snapshot())
+
+
+@router.get("/detection/load/jobs/{job_id}/events")
+async def stream_load_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Server-Sent Events stream of a background load
+
+    Sends a 'progress' event whenever the job changes and ends with a 'done'
+    or 'failed' event carrying the final state.
+    """
+    job = _get_load_job(job_id, current_user)
+
+    async def events():
+        version = -1
+        idle = 0.0
+        while True:
+            snapshot = job.snapshot()
+            if snapshot["version"] != version:
+                version = snapshot["version"]
+                idle = 0.0
+                event = snapshot["stage"] if job.finished else "progress"
+                yield f"event: {event}\ndata: {json.dumps(snapshot)}\n\n"
+                if job.finished:
+                    return
+            elif idle >= SSE_KEEPALIVE:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+            idle += SSE_POLL_INTERVAL
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _clahe_params(clip_limit: float, tile_grid: int) -> ClaheParams:
+    """Validated CLAHE settings from query parameters"""
+    if not 0 < clip_limit <= 40:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="clip_limit must be in (0, 40]",
+        )
+    if not 1 <= tile_grid <= 64:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="tile_grid must be between 1 and 64",
+        )
+    return ClaheParams(float(clip_limit), int(tile_grid))
+
+
+def _image_encoding(
+    format: Optional[str], quality: int, accept: Optional[str] = None
+) -> ImageEncoding:
+    """Validated image encoding from query parameters and the Accept header"""
+    try:
+        return image_encoding(format, quality, accept)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+async def _layer_infos(
+    session_id: int,
+    data_manager: DataManager,
+    db_layers: List[EHToolLayer],
+    include_images: bool,
+    clahe: ClaheParams = DEFAULT_CLAHE,
+    batch: bool = False,
+    preview: ImageEncoding = LOSSLESS,
+) -> List[LayerInfo]:
+    """LayerInfo for each row, with inline base64 images if requested"""
+    renders = []
+    if include_images and batch:
+        # One render task for the whole page, enhanced with a single engine
+        try:
+            renders = await run_in_render_pool(
+                render_layers,
+                session_id,
+                data_manager,
+                [db_layer.layer_index for db_layer in db_layers],
+                True,
+                clahe,
+                preview,
+            )
+        except Exception as e:
+            renders = [e] * len(db_layers)
+    elif include_images:
+        # Render the whole page concurrently on the worker pool
+        renders = await asyncio.gather(
+            *(
+                run_in_render_pool(
+                    render_layer,
+                    session_id,
+                    data_manager,
+                    db_layer.layer_index,
+                    True,
+                    clahe,
+                    preview,
+                )
+                for db_layer in db_layers
+            ),
+            return_exceptions=True,
+        )
+
+    layers = []
+    for i, db_layer in enumerate(db_layers):
+        layer_info = LayerInfo(
+            id=db_layer.id,
+            layer_index=db_layer.layer_index,
+            layer_name=db_layer.layer_name,
+            classification=db_layer.classification,
+            **layer_urls(
+                session_id, data_manager, db_layer.layer_index, True, clahe, preview
+            ),
+        )
+
+        if include_images:
+            if isinstance(renders[i], Exception):
+                logger.debug(
+                    "Failed to render layer %d of session %d: %s",
+                    db_layer.layer_index,
+                    session_id,
+                    renders[i],
+                )
+            else:
+                image_bytes, mask_bytes = renders[i]
+                layer_info.image_base64 = bytes_to_data_uri(
+                    image_bytes, preview.codec.pil_format
+                )
+                if mask_bytes is not None:
+                    layer_info.mask_base64 = bytes_to_data_uri(mask_bytes, "PNG")
+
+        layers.append(layer_info)
+
+    return layers
+
+
 @router.get("/detection/layers", response_model=LayersPageResponse)
 async def get_detection_layers(
     session_id: int,
     page: int = 1,
     page_size: int = 12,
     include_images: bool = True,
+    prefetch: int = DEFAULT_PREFETCH_PAGES,
+    clip_limit: float = CLAHE_CLIP_LIMIT,
+    tile_grid: int = CLAHE_TILE_GRID,
+    batch: bool = False,
+    format: Optional[str] = None,
+    quality: int = IMAGE_QUALITY,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
 ):
+    """
+    One page of layers with image URLs or inline images
+
+    clip_limit and tile_grid set the CLAHE enhancement of every image on the
+    page; batch renders a page of inline images in a single render task.
+    format ('png', 'webp' or 'jpeg') and quality set the encoding of inline
+    images and thumbnails; masks are always PNG.
+    """
+    clahe = _clahe_params(clip_limit, tile_grid)
+    preview = _image_encoding(format or "png", quality)
     # Verify session belongs to user
     db_session = (
         db.query(EHToolSession)
@@ -151,7 +964,7 @@ async def get_detection_layers(
             status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
         )
 
-    data_manager = get_data_manager(session_id, db)
+    data_manager = get_data_manager(session_id, db, leases)
 
     total_layers = db_session.total_layers
     total_pages = math.ceil(total_layers / page_size)
@@ -178,28 +991,24 @@ async def get_detection_layers(
         .all()
     )
 
-    layers = []
-    for db_layer in db_layers:
-        layer_info = LayerInfo(
-            id=db_layer.id,
-            layer_index=db_layer.layer_index,
-            layer_name=db_layer.layer_name,
-            classification=db_layer.classification,
-        )
-
-        if include_images:
-            try:
-                image_base64, mask_base64 = data_manager.get_layer_base64(
-                    db_layer.layer_index, enhance=True
-                )
-                layer_info.image_base64 = image_base64
-                layer_info.mask_base64 = mask_base64
-            except Exception as e:
-                print(
-                    f"[GET_LAYERS] Warning: Failed to load image for layer {db_layer.layer_index}: {e}"
-                )
+    layers = await _layer_infos(
+        session_id, data_manager, db_layers, include_images, clahe, batch, preview
+    )
 
-        layers.append(layer_info)
+    # Warm neighbouring pages; this also cancels prefetch left over from the
+    # page the user was on before
+    depth = max(0, min(prefetch, MAX_PREFETCH_PAGES))
+    _schedule_prefetch(
+        session_id,
+        data_manager,
+        page,
+        page_size,
+        total_layers,
+        depth,
+        include_images,
+        clahe,
+        preview,
+    )
 
     return LayersPageResponse(
         layers=layers,
@@ -210,17 +1019,28 @@ async def get_detection_layers(
     )
 
 
-@router.post("/detection/classify", response_model=ClassifyResponse)
-async def classify_layers(
-    request: LayerClassifyRequest,
+@router.get("/detection/layers/cursor", response_model=LayersCursorResponse)
+async def get_detection_layers_after(
+    session_id: int,
+    after: int = -1,
+    page_size: int = 12,
+    classification: Optional[str] = None,
+    include_images: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
 ):
+    """
+    Keyset-paginated layers, optionally only those of one classification
+
+    Pass the returned next_cursor as `after` to get the following page.
+    total is only counted for the first page; /detection/stats has the
+    counts per classification.
+    """
     db_session = (
         db.query(EHToolSession)
         .filter(
-            EHToolSession.id == request.session_id,
-            EHToolSession.user_id == current_user.id,
+            EHToolSession.id == session_id, EHToolSession.user_id == current_user.id
         )
         .first()
     )
@@ -230,27 +1050,337 @@ async def classify_layers(
             status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
         )
 
-    valid_classifications = ["correct", "incorrect", "unsure", "error"]
-    if request.classification not in valid_classifications:
+    if classification is not None and classification not in VALID_CLASSIFICATIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid classification. Must be one of: {', '.join(valid_classifications)}",
+            detail=f"Invalid classification. Must be one of: {', '.join(VALID_CLASSIFICATIONS)}",
+        )
+    if page_size < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="page_size must be at least 1",
         )
 
-    updated_count = 0
-    for layer_id in request.layer_ids:
-        db_layer = (
-            db.query(EHToolLayer)
-            .filter(
-                EHToolLayer.id == layer_id, EHToolLayer.session_id == request.session_id
-            )
-            .first()
+    data_manager = get_data_manager(session_id, db, leases)
+
+    # One extra row tells whether another page follows
+    db_layers = layers_after(db, session_id, after, page_size + 1, classification)
+    has_more = len(db_layers) > page_size
+    db_layers = db_layers[:page_size]
+
+    total = None
+    if after < 0:
+        counts = classification_counts(db, session_id)
+        total = (
+            counts.get(classification, 0) if classification else sum(counts.values())
         )
 
-        if db_layer:
-            db_layer.classification = request.classification
-            updated_count += 1
+    return LayersCursorResponse(
+        layers=await _layer_infos(session_id, data_manager, db_layers, include_images),
+        total=total,
+        next_cursor=db_layers[-1].layer_index if has_more else None,
+    )
+
+
+@router.get("/detection/layers/next", response_model=NextLayerResponse)
+async def get_next_layer(
+    session_id: int,
+    classification: str = "error",
+    after: int = -1,
+    wrap: bool = True,
+    page_size: int = 12,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
+):
+    """
+    First layer of a classification after a layer_index ('error' = unreviewed)
+
+    Also returns the page that layer is on for the given page_size.
+    """
+    db_session = (
+        db.query(EHToolSession)
+        .filter(
+            EHToolSession.id == session_id, EHToolSession.user_id == current_user.id
+        )
+        .first()
+    )
 
+    if not db_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    if classification not in VALID_CLASSIFICATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid classification. Must be one of: {', '.join(VALID_CLASSIFICATIONS)}",
+        )
+
+    db_layer = next_layer(db, session_id, classification, after=after, wrap=wrap)
+    if db_layer is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No layer classified '{classification}'",
+        )
+
+    data_manager = get_data_manager(session_id, db, leases)
+    (layer_info,) = await _layer_infos(session_id, data_manager, [db_layer], False)
+    return NextLayerResponse(
+        layer=layer_info, page=db_layer.layer_index // max(1, page_size) + 1
+    )
+
+
+@router.get("/detection/layer/{session_id}/{layer_index}/image")
+async def get_layer_image(
+    session_id: int,
+    layer_index: int,
+    request: Request,
+    enhance: bool = True,
+    clip_limit: float = CLAHE_CLIP_LIMIT,
+    tile_grid: int = CLAHE_TILE_GRID,
+    format: Optional[str] = None,
+    quality: int = IMAGE_QUALITY,
+    v: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
+):
+    """
+    Encoded bytes of a layer image, with ETag and Cache-Control headers
+
+    Without a format parameter the codec is negotiated from the Accept
+    header: WebP or JPEG when the client names it, lossless PNG otherwise.
+    """
+    clahe = _clahe_params(clip_limit, tile_grid)
+    encoding = _image_encoding(format, quality, request.headers.get("accept"))
+    data_manager = _get_layer_data_manager(
+        session_id, layer_index, current_user, db, leases
+    )
+    key, content = await run_in_render_pool(
+        render_image, session_id, data_manager, layer_index, enhance, clahe, encoding
+    )
+    negotiated = format is None
+    current_version = None
+    if negotiated:
+        current_version = _image_version(
+            session_id, data_manager, layer_index, enhance, clahe
+        )
+    return _binary_image_response(
+        request,
+        key,
+        content,
+        v,
+        media_type=encoding.codec.media_type,
+        negotiated=negotiated,
+        current_version=current_version,
+    )
+
+
+@router.get("/detection/layer/{session_id}/{layer_index}/mask")
+async def get_layer_mask(
+    session_id: int,
+    layer_index: int,
+    request: Request,
+    v: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
+):
+    """Raw PNG bytes of a layer mask, with ETag and Cache-Control headers"""
+    data_manager = _get_layer_data_manager(
+        session_id, layer_index, current_user, db, leases, kind="mask"
+    )
+    key, content = await run_in_render_pool(
+        render_mask, session_id, data_manager, layer_index
+    )
+    return _binary_image_response(request, key, content, v)
+
+
+@router.get(
+    "/detection/layer/{session_id}/{layer_index}/tile/{level}/{tile_x}/{tile_y}"
+)
+async def get_layer_tile(
+    session_id: int,
+    layer_index: int,
+    level: int,
+    tile_x: int,
+    tile_y: int,
+    request: Request,
+    kind: str = "image",
+    enhance: bool = True,
+    clip_limit: float = CLAHE_CLIP_LIMIT,
+    tile_grid: int = CLAHE_TILE_GRID,
+    format: Optional[str] = None,
+    quality: int = IMAGE_QUALITY,
+    v: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
+):
+    """
+    One tile of a layer's downsample pyramid as encoded image bytes
+
+    Level 0 is full resolution and each level halves both dimensions; the
+    coarsest level is a single tile, which doubles as the grid thumbnail.
+    Image tiles are encoded like /image; mask tiles are always PNG.
+    """
+    if kind not in ("image", "mask"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="kind must be 'image' or 'mask'",
+        )
+    clahe = _clahe_params(clip_limit, tile_grid)
+    negotiated = kind == "image" and format is None
+    encoding = LOSSLESS
+    if kind == "image":
+        encoding = _image_encoding(format, quality, request.headers.get("accept"))
+    data_manager = _get_layer_data_manager(
+        session_id, layer_index, current_user, db, leases, kind=kind
+    )
+    try:
+        key, content = await run_in_render_pool(
+            render_tile,
+            session_id,
+            data_manager,
+            layer_index,
+            kind,
+            level,
+            tile_x,
+            tile_y,
+            enhance,
+            clahe,
+            encoding,
+        )
+    except IndexError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    current_version = None
+    if negotiated:
+        current_version = _tile_version(
+            session_id,
+            data_manager,
+            layer_index,
+            level,
+            tile_x,
+            tile_y,
+            enhance,
+            clahe,
+        )
+    return _binary_image_response(
+        request,
+        key,
+        content,
+        v,
+        media_type=encoding.codec.media_type,
+        negotiated=negotiated,
+        current_version=current_version,
+    )
+
+
+@router.get("/detection/pyramid", response_model=PyramidInfoResponse)
+async def get_detection_pyramid(
+    session_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
+):
+    """Tile size and per-level geometry of the session's slice pyramid"""
+    db_session = (
+        db.query(EHToolSession)
+        .filter(
+            EHToolSession.id == session_id, EHToolSession.user_id == current_user.id
+        )
+        .first()
+    )
+
+    if not db_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    data_manager = get_data_manager(session_id, db, leases)
+    height, width = data_manager.image_shape[-2:]
+    return PyramidInfoResponse(
+        width=width,
+        height=height,
+        tile_size=TILE_SIZE,
+        levels=data_manager.pyramid_levels(),
+    )
+
+
+def _get_layer_data_manager(
+    session_id: int,
+    layer_index: int,
+    current_user: User,
+    db: Session,
+    leases: List[DataManager],
+    kind: str = "image",
+) -> DataManager:
+    """Resolve the DataManager for a user's session and validate the layer"""
+    db_session = (
+        db.query(EHToolSession)
+        .filter(
+            EHToolSession.id == session_id, EHToolSession.user_id == current_user.id
+        )
+        .first()
+    )
+
+    if not db_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    data_manager = get_data_manager(session_id, db, leases)
+
+    if layer_index < 0 or layer_index >= data_manager.total_layers:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Layer {layer_index} not found",
+        )
+    if kind == "mask" and data_manager.mask_volume is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session has no mask",
+        )
+    return data_manager
+
+
+@router.post("/detection/classify", response_model=ClassifyResponse)
+async def classify_layers(
+    request: LayerClassifyRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    db_session = (
+        db.query(EHToolSession)
+        .filter(
+            EHToolSession.id == request.session_id,
+            EHToolSession.user_id == current_user.id,
+        )
+        .first()
+    )
+
+    if not db_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    for value in (request.classification, request.filter_classification):
+        if value is not None and value not in VALID_CLASSIFICATIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid classification. Must be one of: {', '.join(VALID_CLASSIFICATIONS)}",
+            )
+
+    updated_count = classify_layer_selection(
+        db,
+        request.session_id,
+        request.classification,
+        layer_ids=request.layer_ids,
+        layer_ranges=[(r.start, r.end) for r in request.layer_ranges],
+        select_all=request.select_all,
+        filter_classification=request.filter_classification,
+    )
     db.commit()
 
     return ClassifyResponse(
@@ -278,13 +1408,13 @@ async def get_detection_stats(
             status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
         )
 
-    layers = db.query(EHToolLayer).filter(EHToolLayer.session_id == session_id).all()
+    counts = classification_counts(db, session_id)
 
-    correct = sum(1 for l in layers if l.classification == "correct")
-    incorrect = sum(1 for l in layers if l.classification == "incorrect")
-    unsure = sum(1 for l in layers if l.classification == "unsure")
-    error = sum(1 for l in layers if l.classification == "error")
-    total = len(layers)
+    correct = counts.get("correct", 0)
+    incorrect = counts.get("incorrect", 0)
+    unsure = counts.get("unsure", 0)
+    error = counts.get("error", 0)
+    total = sum(counts.values())
     reviewed = total - error
     progress_percent = (reviewed / total * 100) if total > 0 else 0
 
@@ -299,6 +1429,22 @@ async def get_detection_stats(
     )
 
 
+@router.get("/detection/cache/stats", response_model=SessionCacheStatsResponse)
+async def get_session_cache_stats(
+    current_user: User = Depends(get_current_user),
+):
+    """Report occupancy and hit/miss/eviction counters of the session cache"""
+    return SessionCacheStatsResponse(**_data_managers.stats())
+
+
+@router.get("/detection/cache/render/stats", response_model=RenderCacheStatsResponse)
+async def get_render_cache_stats(
+    current_user: User = Depends(get_current_user),
+):
+    """Report occupancy and hit/miss counters of the rendered-layer cache"""
+    return RenderCacheStatsResponse(**_render_cache.stats(), **_prefetcher.stats())
+
+
 @router.delete("/detection/session/{session_id}")
 async def delete_detection_session(
     session_id: int,
@@ -318,8 +1464,10 @@ async def delete_detection_session(
             status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
         )
 
-    if session_id in _data_managers:
-        del _data_managers[session_id]
+    _prefetcher.cancel(session_id)
+    # Closed now, or by the last request still using it
+    _data_managers.discard(session_id)
+    _render_cache.invalidate_session(session_id)
 
     db.delete(db_session)
     db.commit()
@@ -327,13 +1475,19 @@ async def delete_detection_session(
     return {"message": f"Session {session_id} deleted successfully"}
 
 
-@router.post("/detection/mask")
+@router.post("/detection/mask", response_model=MaskSaveResponse)
 async def save_mask(
     request: MaskSaveRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
 ):
-    """Save updated mask for a layer"""
+    """
+    Apply an updated mask for a layer
+
+    The edit is visible immediately; writing it to disk happens in the
+    background (see /detection/mask/status).
+    """
     db_session = (
         db.query(EHToolSession)
         .filter(
@@ -349,9 +1503,20 @@ async def save_mask(
         )
 
     try:
-        data_manager = get_data_manager(request.session_id, db)
-        data_manager.save_mask(request.layer_index, request.mask_base64)
-        return {"message": "Mask saved successfully"}
+        data_manager = get_data_manager(request.session_id, db, leases)
+        new_mask = await run_in_render_pool(
+            data_manager.decode_mask, request.mask_base64
+        )
+        version = data_manager.update_mask(request.layer_index, new_mask)
+        _mask_flusher.register(data_manager)
+        _render_cache.invalidate_layer(
+            request.session_id, request.layer_index, kind="mask"
+        )
+        return MaskSaveResponse(
+            **_mask_edit_summary(
+                data_manager, request.layer_index, version, "Mask saved successfully"
+            )
+        )
     except Exception as e:
         import traceback
 
@@ -360,3 +1525,192 @@ async def save_mask(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to save mask: {str(e)}",
         )
+
+
+def _mask_edit_summary(
+    data_manager: DataManager, layer_index: int, version: int, message: str
+) -> Dict[str, object]:
+    """Fields shared by every mask edit response"""
+    return {
+        "message": message,
+        "layer_index": layer_index,
+        "mask_version": version,
+        "pending_layers": data_manager.mask_journal.pending_layers(),
+        "undo_depth": data_manager.mask_undo.depth(layer_index),
+    }
+
+
+def _decode_mask_patch(request: MaskPatchRequest, data_manager: DataManager):
+    """
+    Turn a patch request into (values, where) arrays for the box
+
+    The box is checked against the layer before anything is decoded, and
+    values are decoded straight into the mask dtype.
+    """
+    if request.encoding not in PATCH_ENCODINGS:
+        raise ValueError(
+            f"Unknown patch encoding '{request.encoding}', "
+            f"expected one of {', '.join(PATCH_ENCODINGS)}"
+        )
+    data_manager.check_mask_patch(
+        request.layer_index, request.y, request.x, request.height, request.width
+    )
+    dtype = data_manager.mask_volume.dtype
+
+    if request.encoding == "rle":
+        if request.runs is None:
+            raise ValueError("RLE patches need runs")
+        return decode_rle(request.runs, request.height, request.width, dtype), None
+
+    if request.data is None or request.value is None:
+        raise ValueError("Bitmask patches need data and value")
+    check_values_fit(request.value, dtype)
+    where = decode_bitmask(request.data, request.height, request.width)
+    values = np.full(where.shape, request.value, dtype=dtype)
+    return values, where
+
+
+@router.post("/detection/mask/patch", response_model=MaskSaveResponse)
+async def patch_mask(
+    request: MaskPatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
+):
+    """Apply a bounding-box mask edit (queued for saving like full saves)"""
+    db_session = (
+        db.query(EHToolSession)
+        .filter(
+            EHToolSession.id == request.session_id,
+            EHToolSession.user_id == current_user.id,
+        )
+        .first()
+    )
+
+    if not db_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    data_manager = get_data_manager(request.session_id, db, leases)
+    try:
+        values, where = _decode_mask_patch(request, data_manager)
+        version = data_manager.apply_mask_patch(
+            request.layer_index, request.y, request.x, values, where
+        )
+    except (ValueError, IndexError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    _mask_flusher.register(data_manager)
+    _render_cache.invalidate_layer(request.session_id, request.layer_index, kind="mask")
+    return MaskSaveResponse(
+        **_mask_edit_summary(
+            data_manager, request.layer_index, version, "Mask patch applied"
+        )
+    )
+
+
+@router.post("/detection/mask/undo", response_model=MaskUndoResponse)
+async def undo_mask_edit(
+    request: MaskUndoRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
+):
+    """Revert the most recent mask edit of a layer and return the restored box"""
+    db_session = (
+        db.query(EHToolSession)
+        .filter(
+            EHToolSession.id == request.session_id,
+            EHToolSession.user_id == current_user.id,
+        )
+        .first()
+    )
+
+    if not db_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    data_manager = get_data_manager(request.session_id, db, leases)
+    result = data_manager.undo_mask(request.layer_index)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Nothing to undo for layer {request.layer_index}",
+        )
+    patch, version = result
+
+    _mask_flusher.register(data_manager)
+    _render_cache.invalidate_layer(request.session_id, request.layer_index, kind="mask")
+    height, width = patch.data.shape
+    return MaskUndoResponse(
+        **_mask_edit_summary(
+            data_manager, request.layer_index, version, "Mask edit undone"
+        ),
+        x=patch.x,
+        y=patch.y,
+        width=width,
+        height=height,
+        runs=encode_rle(patch.data),
+    )
+
+
+@router.get("/detection/mask/status", response_model=MaskWriteStatusResponse)
+async def get_mask_write_status(
+    session_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Report which mask edits of a session are still waiting to be written"""
+    db_session = (
+        db.query(EHToolSession)
+        .filter(
+            EHToolSession.id == session_id, EHToolSession.user_id == current_user.id
+        )
+        .first()
+    )
+
+    if not db_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    # A session that is not loaded has nothing pending: eviction flushes it
+    data_manager = _data_managers.peek(session_id)
+    if data_manager is None:
+        return MaskWriteStatusResponse(session_id=session_id, loaded=False)
+    return MaskWriteStatusResponse(
+        session_id=session_id, loaded=True, **data_manager.mask_journal.status()
+    )
+
+
+@router.post("/detection/mask/flush", response_model=MaskWriteStatusResponse)
+async def flush_mask_edits(
+    session_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    leases: List[DataManager] = Depends(data_manager_leases),
+):
+    """Write a session's pending mask edits now instead of waiting"""
+    db_session = (
+        db.query(EHToolSession)
+        .filter(
+            EHToolSession.id == session_id, EHToolSession.user_id == current_user.id
+        )
+        .first()
+    )
+
+    if not db_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    data_manager = _data_managers.acquire(session_id)
+    if data_manager is None:
+        return MaskWriteStatusResponse(session_id=session_id, loaded=False)
+    leases.append(data_manager)
+    await run_in_render_pool(data_manager.flush_masks)
+    return MaskWriteStatusResponse(
+        session_id=session_id, loaded=True, **data_manager.mask_journal.status()
+    )
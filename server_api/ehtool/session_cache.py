@@ -0,0 +1,212 @@
+"""
+Session cache for EHTool
+Keeps DataManagers for recently used sessions within a memory budget
+"""
+
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .data_manager import DataManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = int(os.environ.get("EHTOOL_CACHE_MAX_BYTES", 4 * 1024**3))
+DEFAULT_IDLE_TTL = float(os.environ.get("EHTOOL_CACHE_IDLE_TTL", 30 * 60))
+
+
+class SessionCache:
+    """
+    Least-recently-used cache of DataManagers keyed by session id
+
+    Entries are evicted when the summed memory footprint exceeds max_bytes
+    or when a session has been idle for longer than idle_ttl seconds (0 disables).
+    Evicted sessions are simply reloaded from their stored paths on next use.
+
+    Managers are reference counted: the cache holds one reference and every
+    acquire() or retain() another, so an evicted manager that is still in use
+    is closed only when its last user calls release(). Closing flushes the
+    mask journal, so it always happens outside the cache lock.
+    """
+
+    def __init__(
+        self, max_bytes: int = DEFAULT_MAX_BYTES, idle_ttl: float = DEFAULT_IDLE_TTL
+    ):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[int, DataManager]" = OrderedDict()
+        self._last_used: Dict[int, float] = {}
+        # References per manager, by id(); a manager is closed at zero
+        self._refs: Dict[int, int] = {}
+        self._closing: List[DataManager] = []
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __contains__(self, session_id: int) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, session_id: int) -> Optional[DataManager]:
+        """
+        Return the cached DataManager and mark it as most recently used
+
+        The manager may be closed by a later eviction; use acquire() to
+        keep it open while working with it.
+        """
+        with self._lock:
+            data_manager = self._lookup(session_id)
+        self._close_pending()
+        return data_manager
+
+    def acquire(self, session_id: int) -> Optional[DataManager]:
+        """Like get(), but the manager stays open until release() is called"""
+        with self._lock:
+            data_manager = self._lookup(session_id)
+            if data_manager is not None:
+                self._refs[id(data_manager)] += 1
+        self._close_pending()
+        return data_manager
+
+    def retain(self, data_manager: DataManager) -> bool:
+        """
+        Take another reference to a manager
+
+        Returns:
+            False if the manager has already been closed
+        """
+        with self._lock:
+            if id(data_manager) not in self._refs:
+                return False
+            self._refs[id(data_manager)] += 1
+            return True
+
+    def release(self, data_manager: DataManager) -> None:
+        """Drop a reference taken by acquire(), retain() or put(retain=True)"""
+        with self._lock:
+            self._unref(data_manager)
+        self._close_pending()
+
+    def peek(self, session_id: int) -> Optional[DataManager]:
+        """Return the cached DataManager without touching LRU order or counters"""
+        with self._lock:
+            return self._entries.get(session_id)
+
+    def put(
+        self, session_id: int, data_manager: DataManager, retain: bool = False
+    ) -> None:
+        """
+        Insert (or replace) a session and evict others to fit the budget
+
+        Args:
+            session_id: Session the manager belongs to
+            data_manager: Loaded manager; the cache takes ownership of it
+            retain: Also take a reference for the caller, as acquire() does
+        """
+        with self._lock:
+            previous = self._entries.pop(session_id, None)
+            if previous is not data_manager:
+                if previous is not None:
+                    self._unref(previous)
+                self._refs[id(data_manager)] = self._refs.get(id(data_manager), 0) + 1
+            self._entries[session_id] = data_manager
+            if retain:
+                self._refs[id(data_manager)] += 1
+            self._touch(session_id)
+            self._expire_idle()
+            self._enforce_budget()
+        self._close_pending()
+
+    def discard(self, session_id: int) -> None:
+        """Remove a session without counting it as an eviction"""
+        with self._lock:
+            self._last_used.pop(session_id, None)
+            data_manager = self._entries.pop(session_id, None)
+            if data_manager is not None:
+                self._unref(data_manager)
+        self._close_pending()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(dm.memory_footprint() for dm in self._entries.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self.total_bytes(),
+                "max_bytes": self.max_bytes,
+                "idle_ttl": self.idle_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _lookup(self, session_id: int) -> Optional[DataManager]:
+        self._expire_idle()
+        data_manager = self._entries.get(session_id)
+        if data_manager is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(session_id)
+        return data_manager
+
+    def _touch(self, session_id: int) -> None:
+        self._entries.move_to_end(session_id)
+        self._last_used[session_id] = time.monotonic()
+
+    def _expire_idle(self) -> None:
+        if self.idle_ttl <= 0:
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        for session_id in list(self._entries):
+            if self._last_used.get(session_id, 0) < cutoff:
+                self._evict(session_id)
+                self.expirations += 1
+
+    def _enforce_budget(self) -> None:
+        # Footprints change as masks are edited, so re-measure every time.
+        # The most recently used entry is always kept, even if it alone is
+        # larger than the budget.
+        sizes = {sid: dm.memory_footprint() for sid, dm in self._entries.items()}
+        total = sum(sizes.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            session_id = next(iter(self._entries))
+            total -= sizes.pop(session_id)
+            self._evict(session_id)
+            self.evictions += 1
+
+    def _evict(self, session_id: int) -> None:
+        data_manager = self._entries.pop(session_id)
+        self._last_used.pop(session_id, None)
+        logger.info("Evicting EHTool session %s from cache", session_id)
+        self._unref(data_manager)
+
+    def _unref(self, data_manager: DataManager) -> None:
+        refs = self._refs[id(data_manager)] - 1
+        if refs:
+            self._refs[id(data_manager)] = refs
+            return
+        del self._refs[id(data_manager)]
+        self._closing.append(data_manager)
+
+    def _close_pending(self) -> None:
+        """Close managers that lost their last reference, outside the lock"""
+        with self._lock:
+            closing, self._closing = self._closing, []
+        for data_manager in closing:
+            try:
+                data_manager.close()
+            except Exception:
+                logger.exception("Failed to close evicted DataManager")
@@ -6,11 +6,18 @@ Adapted from original EHTool for FastAPI integration
 import os
 import base64
 import io
+import threading
 import numpy as np
 from PIL import Image
 import tifffile
 import cv2
-from typing import Optional, Tuple
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+CLAHE_CLIP_LIMIT = float(os.environ.get("EHTOOL_CLAHE_CLIP_LIMIT", 2.0))
+CLAHE_TILE_GRID = int(os.environ.get("EHTOOL_CLAHE_TILE_GRID", 8))
+
+# CLAHE engines kept per thread before the oldest parameter sets are dropped
+MAX_CLAHE_ENGINES = 8
 
 
 def to_uint8(arr: np.ndarray) -> np.ndarray:
@@ -19,12 +26,13 @@ def to_uint8(arr: np.ndarray) -> np.ndarray:
         return arr
 
     # Normalize to 0-255 range
-    if arr.max() > 0:
-        arr_normalized = arr.astype(np.float32) / arr.max() * 255.0
-    else:
-        arr_normalized = arr.astype(np.float32)
+    arr_normalized = arr.astype(np.float32)
+    peak = arr_normalized.max()
+    if peak > 0:
+        arr_normalized *= np.float32(255.0 / peak)
 
-    return np.clip(arr_normalized, 0, 255).astype(np.uint8)
+    np.clip(arr_normalized, 0, 255, out=arr_normalized)
+    return arr_normalized.astype(np.uint8)
 
 
 def ensure_grayscale_2d(arr: np.ndarray) -> np.ndarray:
@@ -41,7 +49,49 @@ def ensure_grayscale_2d(arr: np.ndarray) -> np.ndarray:
     raise ValueError(f"Unsupported array dimensions: {arr.ndim}")
 
 
-def enhance_contrast(arr: np.ndarray) -> np.ndarray:
+class ClaheParams(NamedTuple):
+    """CLAHE settings: contrast clip limit and number of tiles per image side"""
+
+    clip_limit: float = CLAHE_CLIP_LIMIT
+    tile_grid: int = CLAHE_TILE_GRID
+
+    @property
+    def key(self) -> str:
+        """Identifies the settings in render cache keys"""
+        return f"clahe={self.clip_limit:g}x{self.tile_grid}"
+
+
+DEFAULT_CLAHE = ClaheParams()
+
+_clahe_local = threading.local()
+
+
+def get_clahe(params: ClaheParams = DEFAULT_CLAHE) -> "cv2.CLAHE":
+    """
+    This thread's CLAHE engine for a parameter set
+
+    cv2.CLAHE objects carry scratch buffers and must not be shared between
+    threads, so each render thread keeps its own, created on first use.
+    """
+    engines = getattr(_clahe_local, "engines", None)
+    if engines is None:
+        engines = _clahe_local.engines = {}
+    engine = engines.pop(params, None)
+    if engine is None:
+        engine = cv2.createCLAHE(
+            clipLimit=params.clip_limit,
+            tileGridSize=(params.tile_grid, params.tile_grid),
+        )
+        if len(engines) >= MAX_CLAHE_ENGINES:
+            del engines[next(iter(engines))]
+    # Most recently used last
+    engines[params] = engine
+    return engine
+
+
+def enhance_contrast(
+    arr: np.ndarray, params: ClaheParams = DEFAULT_CLAHE
+) -> np.ndarray:
     """
     Apply CLAHE contrast enhancement for better visibility
     """
@@ -52,20 +102,37 @@ def enhance_contrast(arr: np.ndarray) -> np.ndarray:
     arr_uint8 = to_uint8(arr)
 
     # Apply CLAHE
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    return clahe.apply(arr_uint8)
+    return get_clahe(params).apply(arr_uint8)
 
 
-def array_to_base64(arr: np.ndarray, format: str = "PNG") -> str:
+def enhance_contrast_batch(
+    arrays: Sequence[np.ndarray], params: ClaheParams = DEFAULT_CLAHE
+) -> List[np.ndarray]:
     """
-    Convert numpy array to base64-encoded image string
+    Apply CLAHE to a page of slices with one engine
+
+    Args:
+        arrays: Slices to enhance; non-2D arrays are returned unchanged
+        params: CLAHE settings shared by every slice
+
+    Returns:
+        Enhanced slices in input order
+    """
+    clahe = get_clahe(params)
+    return [clahe.apply(to_uint8(arr)) if arr.ndim == 2 else arr for arr in arrays]
+
+
+def array_to_bytes(arr: np.ndarray, format: str = "PNG", **save_options) -> bytes:
+    """
+    Encode numpy array as image file bytes
 
     Args:
         arr: Image array
         format: Image format ('PNG', 'JPEG', etc.)
+        save_options: Encoder options passed to PIL (e.g. quality)
 
     Returns:
-        Base64-encoded string
+        Encoded image bytes
     """
     # Ensure uint8
     arr_uint8 = to_uint8(arr)
@@ -85,16 +152,31 @@ def array_to_base64(arr: np.ndarray, format: str = "PNG") -> str:
     else:
         raise ValueError(f"Unsupported array dimensions: {arr_uint8.ndim}")
 
-    # Convert to base64
     buffer = io.BytesIO()
-    img.save(buffer, format=format)
-    buffer.seek(0)
-    img_bytes = buffer.read()
-    img_base64 = base64.b64encode(img_bytes).decode("utf-8")
+    img.save(buffer, format=format, **save_options)
+    return buffer.getvalue()
 
+
+def bytes_to_data_uri(img_bytes: bytes, format: str = "PNG") -> str:
+    """Wrap encoded image bytes in a base64 data URI"""
+    img_base64 = base64.b64encode(img_bytes).decode("utf-8")
     return f"data:image/{format.lower()};base64,{img_base64}"
 
 
+def array_to_base64(arr: np.ndarray, format: str = "PNG") -> str:
+    """
+    Convert numpy array to base64-encoded image string
+
+    Args:
+        arr: Image array
+        format: Image format ('PNG', 'JPEG', etc.)
+
+    Returns:
+        Base64-encoded string
+    """
+    return bytes_to_data_uri(array_to_bytes(arr, format=format), format=format)
+
+
 def base64_to_array(base64_str: str) -> np.ndarray:
     """
     Convert base64-encoded image string to numpy array
@@ -0,0 +1,466 @@
+"""
+Lazy volume backends for EHTool
+Slices are decoded on demand so large stacks never have to fit in RAM
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+import tifffile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from server_api.utils.formats import (
+    VolumeHandle,
+    detect_format,
+    image_file_info,
+    list_image_files,
+    open_handle,
+)
+
+from .utils import ensure_grayscale_2d, load_image_file
+
+# Directory stacks up to this size are decoded up front instead of per access
+SEQUENCE_PRELOAD_BYTES = int(
+    os.environ.get("EHTOOL_SEQUENCE_PRELOAD_BYTES", 512 * 1024**2)
+)
+DECODE_WORKERS = int(
+    os.environ.get("EHTOOL_DECODE_WORKERS", min(32, os.cpu_count() or 4))
+)
+
+
+class Volume(ABC):
+    """
+    A stack of 2D slices that is read one slice at a time
+    Edited slices are kept in an in-memory overlay on top of the backing data
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype: np.dtype, is_3d: bool):
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.is_3d = is_3d
+        self.num_slices = self.shape[0] if is_3d else 1
+        self._overlay: Dict[int, np.ndarray] = {}
+        # Overlay slices handed out by snapshot_slice; edits copy them first
+        self._shared: Set[int] = set()
+        self._lock = threading.Lock()
+        # Serialises overlay edits, which may read the backing data
+        self._edit_lock = threading.Lock()
+        # Bytes of slice data decoded from the backing files so far
+        self.bytes_read = 0
+        self._read_lock = threading.Lock()
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def slice_shape(self) -> Tuple[int, int]:
+        return self.shape[-2:]
+
+    @property
+    def nbytes(self) -> int:
+        """Logical size of the full volume"""
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    @property
+    def resident_bytes(self) -> int:
+        """Bytes held in process memory (not counting the page cache)"""
+        return sum(arr.nbytes for arr in self._overlay.values())
+
+    def __len__(self) -> int:
+        return self.num_slices
+
+    def get_slice(self, index: int) -> np.ndarray:
+        """Return a single 2D slice, decoding only that slice"""
+        self._check_index(index)
+        if index in self._overlay:
+            return self._overlay[index]
+        return self._read_slice(index)
+
+    def snapshot_slice(self, index: int) -> np.ndarray:
+        """
+        Return a slice to save; later edits leave the returned array alone
+
+        Pass it as expected to discard_overlay once the backing data holds it.
+        """
+        self._check_index(index)
+        with self._lock:
+            if index in self._overlay:
+                self._shared.add(index)
+                return self._overlay[index]
+        return self._read_slice(index)
+
+    def set_slice(self, index: int, data: np.ndarray) -> None:
+        """Replace a slice in memory; the backing file is left untouched"""
+        self._check_index(index)
+        if data.shape != self.slice_shape:
+            raise ValueError(
+                f"Slice shape {data.shape} does not match volume slice shape "
+                f"{self.slice_shape}"
+            )
+        with self._edit_lock, self._lock:
+            self._overlay[index] = data
+            self._shared.discard(index)
+
+    def set_region(
+        self,
+        index: int,
+        y: int,
+        x: int,
+        data: np.ndarray,
+        where: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Overwrite a box of a slice in memory
+
+        The slice is copied on its first edit and after snapshot_slice has
+        handed it out; other edits update the overlay in place.
+
+        Args:
+            index: Slice to edit
+            y: Top row of the box
+            x: Left column of the box
+            data: New values for the box, cast to the volume dtype
+            where: Optional boolean mask; only these pixels of the box change
+
+        Returns:
+            Copy of the box as it was before the edit
+        """
+        with self._edit_lock:
+            with self._lock:
+                current = self._overlay.get(index)
+                if current is not None and index not in self._shared:
+                    return _overwrite_box(current, y, x, data, where)
+            # Reading may take _lock, so the copy is made outside it
+            current = np.array(self.get_slice(index))
+            with self._lock:
+                previous = _overwrite_box(current, y, x, data, where)
+                self._overlay[index] = current
+                self._shared.discard(index)
+            return previous
+
+    def discard_overlay(
+        self, index: int, expected: Optional[np.ndarray] = None
+    ) -> None:
+        """
+        Forget an in-memory edit once the backing data holds it
+
+        If expected is given, the edit is only dropped while it is still that
+        array, so an edit made after the write started is never lost.
+        """
+        with self._lock:
+            if expected is None or self._overlay.get(index) is expected:
+                self._overlay.pop(index, None)
+                self._shared.discard(index)
+
+    def iter_slices(self):
+        """Yield every slice in order"""
+        for index in range(self.num_slices):
+            yield self.get_slice(index)
+
+    @abstractmethod
+    def _read_slice(self, index: int) -> np.ndarray:
+        """Read a slice from the backing data"""
+
+    def write_slice(self, index: int, data: np.ndarray) -> None:
+        """Write a slice back to the backing file, where the format allows it"""
+        raise ValueError(f"{type(self).__name__} can't be written back")
+
+    def _check_index(self, index: int) -> None:
+        if index < 0 or index >= self.num_slices:
+            raise IndexError(f"Slice index {index} out of range [0, {self.num_slices})")
+
+    def _count_read(self, data: np.ndarray) -> np.ndarray:
+        """Add a slice read from the backing files to bytes_read"""
+        with self._read_lock:
+            self.bytes_read += data.nbytes
+        return data
+
+    def close(self) -> None:
+        """Release any open file handles"""
+        pass
+
+
+def _overwrite_box(
+    array: np.ndarray, y: int, x: int, data: np.ndarray, where: Optional[np.ndarray]
+) -> np.ndarray:
+    height, width = data.shape
+    box = array[y : y + height, x : x + width]
+    previous = box.copy()
+    np.copyto(box, data, casting="unsafe", where=True if where is None else where)
+    return previous
+
+
+class ArrayVolume(Volume):
+    """
+    Volume backed by an array (in-memory or memory-mapped)
+
+    Arrays mapped from an NPY file at path can be written back slice by slice.
+    """
+
+    def __init__(self, array: np.ndarray, path: Optional[str] = None):
+        is_3d = array.ndim == 3
+        super().__init__(array.shape, array.dtype, is_3d)
+        self._array = array
+        self.path = path
+
+    @property
+    def resident_bytes(self) -> int:
+        overlay = super().resident_bytes
+        if isinstance(self._array, np.memmap):
+            return overlay
+        return overlay + self._array.nbytes
+
+    def _read_slice(self, index: int) -> np.ndarray:
+        data = np.asarray(self._array[index]) if self.is_3d else self._array
+        if isinstance(self._array, np.memmap):
+            self._count_read(data)
+        return data
+
+    def write_slice(self, index: int, data: np.ndarray) -> None:
+        if self.path is None:
+            super().write_slice(index, data)
+            return
+        # A writable mapping of its own; the read-only one sees the new data
+        detect_format(self.path).write(self.path, index if self.is_3d else None, data)
+
+    def close(self) -> None:
+        mmap = getattr(self._array, "_mmap", None)
+        self._array = None
+        if mmap is not None:
+            try:
+                mmap.close()
+            except (BufferError, ValueError):
+                # Slices handed out earlier still reference the mapping
+                pass
+
+
+class TiffVolume(Volume):
+    """Multi-page TIFF that is memory-mapped when possible, else decoded per page"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tif = tifffile.TiffFile(path)
+        series = self._tif.series[0]
+        shape = tuple(series.shape)
+        if len(shape) == 2:
+            is_3d = False
+        elif len(shape) == 3:
+            is_3d = True
+        else:
+            self._tif.close()
+            raise ValueError(f"Unsupported TIFF dimensions: {len(shape)}")
+        super().__init__(shape, series.dtype, is_3d)
+        self.compression = series.keyframe.compression
+        self._memmap = self._open_memmap()
+
+    def _open_memmap(self) -> Optional[np.ndarray]:
+        # Uncompressed, contiguous stacks can be mapped directly
+        try:
+            memmap = tifffile.memmap(self.path, mode="r")
+        except (ValueError, OSError):
+            return None
+        return memmap if memmap.shape == self.shape else None
+
+    @property
+    def is_memmapped(self) -> bool:
+        return self._memmap is not None
+
+    def reopen(self) -> None:
+        """Pick up a file that was replaced on disk (e.g. after compaction)"""
+        tif = tifffile.TiffFile(self.path)
+        if tuple(tif.series[0].shape) != self.shape:
+            tif.close()
+            raise ValueError(f"Replaced TIFF has a different shape: {self.path}")
+        with self._lock:
+            old_tif, self._tif = self._tif, tif
+            self.compression = tif.series[0].keyframe.compression
+            self._memmap = self._open_memmap()
+        old_tif.close()
+
+    def _read_slice(self, index: int) -> np.ndarray:
+        if self._memmap is not None:
+            data = np.asarray(self._memmap[index] if self.is_3d else self._memmap)
+        else:
+            with self._lock:
+                data = self._tif.asarray(key=index)
+        return self._count_read(data)
+
+    def close(self) -> None:
+        self._memmap = None
+        self._tif.close()
+
+
+class ImageSequenceVolume(Volume):
+    """
+    Sorted list of 2D image files, one file per slice
+
+    Files are decoded on access unless preload() has filled the whole stack
+    into memory.
+    """
+
+    def __init__(self, files: List[str]):
+        if not files:
+            raise ValueError("Image sequence is empty")
+        self.files = files
+        # The header is enough; grayscale conversion keeps the dtype
+        shape, dtype = image_file_info(files[0])
+        super().__init__((len(files),) + shape[:2], dtype, True)
+        self._array: Optional[np.ndarray] = None
+
+    @property
+    def is_preloaded(self) -> bool:
+        return self._array is not None
+
+    @property
+    def resident_bytes(self) -> int:
+        preloaded = self._array.nbytes if self._array is not None else 0
+        return super().resident_bytes + preloaded
+
+    def preload(
+        self,
+        workers: int = DECODE_WORKERS,
+        progress: Optional[Callable[[int, int, int], None]] = None,
+    ) -> None:
+        """
+        Decode every file into one preallocated array
+
+        Files are decoded on a thread pool (PIL and tifffile release the GIL)
+        and written straight into their slot, so the stack is never copied
+        a second time.
+
+        Args:
+            workers: Decoding threads
+            progress: Called as progress(decoded, total, nbytes) after each
+                file, in file order
+        """
+        out = np.empty(self.shape, dtype=self.dtype)
+
+        def decode_into(index: int) -> int:
+            img = self._decode(index)
+            out[index] = img
+            return img.nbytes
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="ehtool-decode"
+        ) as pool:
+            # Consuming the results re-raises the first decoding error
+            results = pool.map(decode_into, range(self.num_slices))
+            for decoded, nbytes in enumerate(results, 1):
+                if progress is not None:
+                    progress(decoded, self.num_slices, nbytes)
+        self._array = out
+
+    def _read_slice(self, index: int) -> np.ndarray:
+        if self._array is not None:
+            return self._array[index]
+        return self._decode(index)
+
+    def close(self) -> None:
+        self._array = None
+
+    def _decode(self, index: int) -> np.ndarray:
+        img = ensure_grayscale_2d(load_image_file(self.files[index]))
+        if img.shape != self.slice_shape:
+            raise ValueError(
+                f"Slice {self.files[index]} has shape {img.shape}, "
+                f"expected {self.slice_shape}"
+            )
+        if img.dtype != self.dtype:
+            # The stack's dtype comes from the first file; casting would
+            # silently wrap or truncate values
+            raise ValueError(
+                f"Slice {self.files[index]} has dtype {img.dtype}, "
+                f"expected {self.dtype} like {self.files[0]}"
+            )
+        return self._count_read(img)
+
+
+class HandleVolume(Volume):
+    """
+    Volume over a format-registry handle (HDF5, zarr, NIfTI and others)
+
+    Slices are written back through the format when it supports writing.
+    """
+
+    def __init__(self, handle: VolumeHandle, path: Optional[str] = None):
+        if handle.ndim not in (2, 3):
+            handle.close()
+            raise ValueError(f"Unsupported volume dimensions: {handle.ndim}")
+        super().__init__(handle.shape, handle.dtype, handle.ndim == 3)
+        self._handle = handle
+        self.path = path
+
+    def _read_slice(self, index: int) -> np.ndarray:
+        with self._lock:
+            data = self._handle[index] if self.is_3d else self._handle[...]
+        return self._count_read(data)
+
+    def write_slice(self, index: int, data: np.ndarray) -> None:
+        if self.path is None:
+            super().write_slice(index, data)
+            return
+        volume_format = detect_format(self.path)
+        with self._lock:
+            # HDF5 refuses a writable open while the file is open read-only
+            self._handle.close()
+            try:
+                volume_format.write(self.path, index if self.is_3d else None, data)
+            finally:
+                self._handle = volume_format.open(self.path)
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+def open_volume(
+    path: str, progress: Optional[Callable[[int, int, int], None]] = None
+) -> Volume:
+    """
+    Open a dataset lazily
+
+    Args:
+        path: Any path the format registry reads (TIFF, NPY, HDF5, zarr/N5,
+            NIfTI, 2D image file, directory or glob pattern)
+        progress: Preload progress callback of small image sequences, see
+            ImageSequenceVolume.preload
+
+    Returns:
+        Volume whose slices are decoded on access
+    """
+    path_obj = Path(path)
+    try:
+        volume_format = detect_format(path).name
+    except ValueError:
+        # Anything else PIL can open is read as a single image
+        volume_format = "image" if path_obj.is_file() else None
+
+    if volume_format == "sequence":
+        files = list_image_files(path)
+        if not files:
+            raise ValueError(f"No image files found at: {path}")
+        volume = ImageSequenceVolume(files)
+        if volume.nbytes <= SEQUENCE_PRELOAD_BYTES:
+            volume.preload(progress=progress)
+        return volume
+
+    if volume_format in ("zarr", "n5"):
+        return HandleVolume(open_handle(path), path)
+    if not path_obj.is_file():
+        raise ValueError(f"Invalid path: {path}")
+
+    if volume_format == "tiff":
+        return TiffVolume(path)
+    if volume_format == "npy":
+        array = np.load(path, mmap_mode="r")
+        if array.ndim not in (2, 3):
+            raise ValueError(f"Unsupported NPY dimensions: {array.ndim}")
+        return ArrayVolume(array, path)
+    if volume_format == "image":
+        image = ensure_grayscale_2d(load_image_file(path))
+        return ArrayVolume(image)
+    # HDF5, NIfTI and the rest read through the format registry
+    return HandleVolume(open_handle(path), path)
@@ -9,11 +9,20 @@ import requests
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from server_api.utils.chunked_source import ChunkedSource, local_volume
+from server_api.utils.file_metadata import label_verdict, volume_info
 from server_api.utils.io import readVol
 from server_api.utils.utils import process_path
+from server_api.utils.viewer_pool import (
+    ViewerEntry,
+    ensure_server,
+    viewer_key,
+    viewer_pool,
+)
 from server_api.auth import models, database, router as auth_router
 from server_api.synanno import router as synanno_router
 from server_api.ehtool import router as ehtool_router
+from server_api.ehtool import db_models as ehtool_db_models
 
 from fastapi.staticfiles import StaticFiles
 import os
@@ -51,6 +60,7 @@ REACT_APP_SERVER_PROTOCOL = "http"
 REACT_APP_SERVER_URL = "localhost:4243"
 
 models.Base.metadata.create_all(bind=database.engine)
+ehtool_db_models.create_missing_indexes(database.engine)
 
 app = FastAPI()
 
@@ -191,35 +201,50 @@ async def neuroglancer(req: Request):
                 status_code=400, detail="Image path or file is required."
             )
 
-        # neuroglancer setting -- bind to this to make accessible outside of container
-        ip = "0.0.0.0"
-        port = 4244
-        neuroglancer.set_server_bind_address(ip, port)
+        # Reopening a dataset reuses its viewer; a file changed on disk (or a
+        # new upload) gets a new one
+        key = viewer_key(image, label, scales)
+        entry = viewer_pool.get(key)
+        if entry is not None:
+            return entry.url
+
+        ensure_server()
         viewer = neuroglancer.Viewer()
         # SNEMI (# 3d vol dim: z,y,x)
         res = neuroglancer.CoordinateSpace(
             names=["z", "y", "x"], units=["nm", "nm", "nm"], scales=scales
         )
+        volumes = []
         try:
-            im = readVol(image, image_type="im")
-            gt = readVol(label, image_type="im") if label else None
+            # Lazy chunked sources: nothing is read until the browser asks
+            # for a chunk, and zoomed-out scales are downsampled on demand
+            im = ChunkedSource(readVol(image, image_type="im", lazy=True))
+            volumes.append(im)
+            if label:
+                gt = ChunkedSource(readVol(label, image_type="im", lazy=True))
+                volumes.append(gt)
+            else:
+                gt = None
         except Exception as e:
+            for volume in volumes:
+                volume.close()
             raise HTTPException(
                 status_code=400, detail=f"Failed to read image volume: {str(e)}"
             )
 
         def ngLayer(data, res, oo=[0, 0, 0], tt="segmentation"):
-            return neuroglancer.LocalVolume(
-                data, dimensions=res, volume_type=tt, voxel_offset=oo
-            )
+            return local_volume(data, dimensions=res, volume_type=tt, voxel_offset=oo)
 
         with viewer.txn() as s:
             s.layers.append(name="im", layer=ngLayer(im, res, tt="image"))
             if gt is not None:
                 s.layers.append(name="gt", layer=ngLayer(gt, res, tt="segmentation"))
 
-        print(viewer)
-        return str(viewer)
+        # The pool owns uploaded files from here on and deletes them on eviction
+        entry = viewer_pool.put(key, ViewerEntry(viewer, volumes, cleanup_paths))
+        cleanup_paths = []
+        print(entry.url)
+        return entry.url
     finally:
         for path in cleanup_paths:
             try:
@@ -230,6 +255,11 @@ async def neuroglancer(req: Request):
                 pass
 
 
+@app.get("/neuroglancer/stats")
+def neuroglancer_stats():
+    return viewer_pool.stats()
+
+
 @app.post("/start_model_training")
 async def start_model_training(req: Request):
     print("\n========== SERVER_API: START_MODEL_TRAINING ENDPOINT CALLED ==========")
@@ -450,9 +480,6 @@ async def get_tensorboard_url():
 
 @app.post("/check_files")
 async def check_files(req: Request):
-    import numpy as np
-    import os
-
     try:
         im = await req.json()
         print(f"Received check_files payload: {im}")
@@ -467,42 +494,22 @@ async def check_files(req: Request):
         print(f"Checking file at: {image_path}")
 
         try:
-            # Use readVol to support all project-standard formats (TIFF, H5, etc.)
-            image_array = readVol(image_path, image_type="im")
+            # Samples chunks or slices; the verdict is stored per file version
+            verdict = label_verdict(image_path)
+            # Stored together with the verdict, so this doesn't reopen the file
+            info = volume_info(image_path)
         except Exception as e:
             print(f"Failed to read file: {e}")
             return {"error": f"Failed to open image: {str(e)}"}
 
-        # Heuristic for label detection:
-        # 1. Must be integer type
-        # 2. Low number of unique values (e.g. < 50) relative to size
-        # 3. Or explicit binary (0, 255) or (0, 1)
-
-        unique_values = np.unique(image_array)
-        num_unique = len(unique_values)
-        is_integer = np.issubdtype(image_array.dtype, np.integer)
-
-        is_label = False
-        if is_integer:
-            if num_unique < 50:
-                is_label = True
-            elif np.array_equal(unique_values, np.array([0, 255])) or np.array_equal(
-                unique_values, np.array([0, 1])
-            ):
-                is_label = True
-
-        if is_label:
-            print(
-                f"The image {im['name']} is likely a label (unique values: {num_unique})"
-            )
-            label = True
-        else:
-            print(
-                f"The image {im['name']} is likely not a label (unique values: {num_unique})"
-            )
-            label = False
+        label = verdict.is_label
+        print(
+            f"The image {im['name']} is likely {'' if label else 'not '}a label "
+            f"(unique values: {verdict.num_values}"
+            f"{'' if verdict.exact else ', sampled'})"
+        )
 
-        return {"label": label}
+        return {"label": label, "shape": info.shape, "dtype": info.dtype.name}
     except Exception as e:
         return {"error": str(e)}
 
@@ -0,0 +1,105 @@
+"""
+Benchmark EHTool CLAHE enhancement.
+Compares creating a cv2 CLAHE object per slice, as enhance_contrast used to,
+with the per-thread engines and the batched page mode in
+server_api.ehtool.utils.
+
+Usage (from the repository root):
+    python -m server_api.scripts.benchmark_ehtool_clahe --size 1024 --page 12
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from server_api.ehtool.utils import (
+    ClaheParams,
+    enhance_contrast,
+    enhance_contrast_batch,
+    to_uint8,
+)
+
+
+def enhance_fresh(arr, params):
+    """The original implementation: a new CLAHE object for every slice"""
+    clahe = cv2.createCLAHE(
+        clipLimit=params.clip_limit, tileGridSize=(params.tile_grid, params.tile_grid)
+    )
+    return clahe.apply(to_uint8(arr))
+
+
+def timed(label, func, repeats):
+    func()  # warm up engines and allocator
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    elapsed = (time.perf_counter() - start) / repeats
+    print(f"  {label:<40} {elapsed * 1000:10.2f} ms per page")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--page", type=int, default=12)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--clip-limit", type=float, default=2.0)
+    parser.add_argument("--tile-grid", type=int, default=8)
+    args = parser.parse_args()
+
+    params = ClaheParams(args.clip_limit, args.tile_grid)
+    rng = np.random.default_rng(0)
+    page = [
+        rng.integers(0, 256, (args.size, args.size), dtype=np.uint8)
+        for _ in range(args.page)
+    ]
+
+    print(
+        f"Enhancing a page of {args.page} {args.size}x{args.size} slices "
+        f"(clip limit {params.clip_limit:g}, {params.tile_grid}x{params.tile_grid} tiles):"
+    )
+    timed(
+        "new CLAHE object per slice",
+        lambda: [enhance_fresh(arr, params) for arr in page],
+        args.repeats,
+    )
+    timed(
+        "per-thread engine per slice",
+        lambda: [enhance_contrast(arr, params) for arr in page],
+        args.repeats,
+    )
+    timed(
+        "batched page",
+        lambda: enhance_contrast_batch(page, params),
+        args.repeats,
+    )
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        print(f"\nSame page spread over {args.threads} threads:")
+        timed(
+            "new CLAHE object per slice",
+            lambda: list(pool.map(lambda arr: enhance_fresh(arr, params), page)),
+            args.repeats,
+        )
+        timed(
+            "per-thread engine per slice",
+            lambda: list(pool.map(lambda arr: enhance_contrast(arr, params), page)),
+            args.repeats,
+        )
+
+    # The pooled engines must give the same pixels as a fresh object
+    assert all(
+        np.array_equal(a, b)
+        for a, b in zip(
+            enhance_contrast_batch(page, params),
+            [enhance_fresh(arr, params) for arr in page],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
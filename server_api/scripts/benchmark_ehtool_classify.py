@@ -0,0 +1,139 @@
+"""
+Benchmark EHTool layer classification on large sessions.
+Compares the per-row ORM loop the classify endpoint used to run with the
+set-based UPDATE statements in server_api.ehtool.layer_queries.
+
+Usage (from the repository root):
+    python -m server_api.scripts.benchmark_ehtool_classify --layers 100000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from server_api.auth.database import Base
+import server_api.auth.models  # noqa: F401  (registers the users table)
+from server_api.ehtool.db_models import EHToolSession, EHToolLayer
+from server_api.ehtool.layer_queries import (
+    classify_layer_selection,
+    insert_layer_rows,
+)
+
+
+def create_session(db, num_layers):
+    """Create a session with num_layers unreviewed layer rows"""
+    db_session = EHToolSession(
+        user_id=1, project_name="benchmark", total_layers=num_layers
+    )
+    db.add(db_session)
+    db.commit()
+    insert_layer_rows(db, db_session.id, (f"Layer {i + 1}" for i in range(num_layers)))
+    db.commit()
+    return db_session.id
+
+
+def classify_per_row(db, session_id, layer_ids, classification):
+    """The original implementation: one SELECT and ORM update per id"""
+    updated = 0
+    for layer_id in layer_ids:
+        db_layer = (
+            db.query(EHToolLayer)
+            .filter(EHToolLayer.id == layer_id, EHToolLayer.session_id == session_id)
+            .first()
+        )
+        if db_layer:
+            db_layer.classification = classification
+            updated += 1
+    db.commit()
+    return updated
+
+
+def classify_bulk(db, session_id, classification, **selection):
+    updated = classify_layer_selection(db, session_id, classification, **selection)
+    db.commit()
+    return updated
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<45} {elapsed * 1000:10.1f} ms  ({result} rows)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--layers", type=int, default=100_000)
+    parser.add_argument("--selected", type=int, default=500)
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    try:
+        print(f"Creating a session with {args.layers} layers...")
+        session_id = create_session(db, args.layers)
+        ids = [
+            row.id
+            for row in db.query(EHToolLayer.id).filter(
+                EHToolLayer.session_id == session_id
+            )
+        ]
+        selected = random.sample(ids, min(args.selected, len(ids)))
+
+        print(f"\nClassifying {len(selected)} selected layers:")
+        timed(
+            "per-row SELECT + ORM update",
+            classify_per_row,
+            db,
+            session_id,
+            selected,
+            "correct",
+        )
+        timed(
+            "UPDATE ... WHERE id IN (...)",
+            classify_bulk,
+            db,
+            session_id,
+            "incorrect",
+            layer_ids=selected,
+        )
+
+        print("\nClassifying the first half of the stack by layer_index range:")
+        half = [(0, args.layers // 2 - 1)]
+        timed(
+            "UPDATE ... WHERE layer_index BETWEEN",
+            classify_bulk,
+            db,
+            session_id,
+            "unsure",
+            layer_ranges=half,
+        )
+
+        print("\nClassifying every layer still marked 'error':")
+        timed(
+            "UPDATE ... WHERE classification = 'error'",
+            classify_bulk,
+            db,
+            session_id,
+            "correct",
+            select_all=True,
+            filter_classification="error",
+        )
+    finally:
+        db.close()
+        engine.dispose()
+        os.remove(db_path)
+
+
+if __name__ == "__main__":
+    main()
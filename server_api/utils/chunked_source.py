@@ -0,0 +1,427 @@
+"""
+Chunked volume sources for neuroglancer
+Lazy arrays that read and cache whole bricks and build downsampled levels on demand
+"""
+
+import itertools
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .formats import ArrayHandle, VolumeHandle
+
+# Decoded bricks kept across all sources and levels
+CHUNK_CACHE_BYTES = int(os.environ.get("PYTC_NG_CHUNK_CACHE_BYTES", 1024**3))
+DEFAULT_BRICK = (32, 256, 256)
+
+
+class BrickCache:
+    """
+    Bounded LRU of decoded bricks keyed by (owner, level, brick index)
+
+    One cache is shared by every source, so the byte cap holds however many
+    viewers are open; owner_nbytes() tells how much of it one source uses.
+    """
+
+    def __init__(self, max_bytes: int = CHUNK_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._bricks: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._owner_bytes: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        with self._lock:
+            brick = self._bricks.get(key)
+            if brick is not None:
+                self._bricks.move_to_end(key)
+            return brick
+
+    def put(self, key: tuple, brick: np.ndarray) -> None:
+        with self._lock:
+            previous = self._bricks.pop(key, None)
+            if previous is not None:
+                self._account(key, -previous.nbytes)
+            self._bricks[key] = brick
+            self._account(key, brick.nbytes)
+            # The newest brick is kept even if it alone exceeds the budget
+            while self.nbytes > self.max_bytes and len(self._bricks) > 1:
+                evicted_key, evicted = self._bricks.popitem(last=False)
+                self._account(evicted_key, -evicted.nbytes)
+
+    def owner_nbytes(self, owner: int) -> int:
+        with self._lock:
+            return self._owner_bytes.get(owner, 0)
+
+    def discard(self, owner: int) -> None:
+        """Drop every brick of one owner"""
+        with self._lock:
+            for key in [key for key in self._bricks if key[0] == owner]:
+                self._account(key, -self._bricks.pop(key).nbytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bricks.clear()
+            self._owner_bytes.clear()
+            self.nbytes = 0
+
+    def _account(self, key: tuple, nbytes: int) -> None:
+        self.nbytes += nbytes
+        owned = self._owner_bytes.get(key[0], 0) + nbytes
+        if owned:
+            self._owner_bytes[key[0]] = owned
+        else:
+            self._owner_bytes.pop(key[0], None)
+
+
+# Shared by every ChunkedSource
+brick_cache = BrickCache()
+_owner_ids = itertools.count()
+
+
+def _axis_ranges(index, shape: Tuple[int, ...]) -> Tuple[List[range], List[int]]:
+    """Per-axis ranges of a basic index, and the axes indexed by an integer"""
+    index = index if isinstance(index, tuple) else (index,)
+    if Ellipsis in index:
+        at = index.index(Ellipsis)
+        fill = (slice(None),) * (len(shape) - len(index) + 1)
+        index = index[:at] + fill + index[at + 1 :]
+    index = index + (slice(None),) * (len(shape) - len(index))
+    if len(index) != len(shape):
+        raise IndexError(f"Too many indices for a {len(shape)}D volume")
+    ranges, squeeze = [], []
+    for axis, (item, size) in enumerate(zip(index, shape)):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(size)
+            if step < 1:
+                raise IndexError("Negative steps are not supported")
+            ranges.append(range(start, max(start, stop), step))
+        else:
+            item = int(item)
+            if not -size <= item < size:
+                raise IndexError(f"Index {item} is out of range for size {size}")
+            item %= size
+            ranges.append(range(item, item + 1))
+            squeeze.append(axis)
+    return ranges, squeeze
+
+
+def _brick_groups(coords: range, brick: int) -> List[Tuple[int, slice, slice]]:
+    """(brick number, slice of the output, slice inside the brick) per brick"""
+    groups = []
+    position = 0
+    step = coords.step
+    while position < len(coords):
+        first = coords[position]
+        number = first // brick
+        # Coordinates inside this brick: first, first + step, ... < brick end
+        count = min(
+            len(coords) - position, ((number + 1) * brick - first - 1) // step + 1
+        )
+        local = first - number * brick
+        groups.append(
+            (
+                number,
+                slice(position, position + count),
+                slice(local, local + (count - 1) * step + 1, step),
+            )
+        )
+        position += count
+    return groups
+
+
+def _downsample_mean(arr: np.ndarray, factor: Sequence[int]) -> np.ndarray:
+    """Average factor-sized blocks; partial blocks at the edges average what exists"""
+    shape = tuple(-(-s // f) for s, f in zip(arr.shape, factor))
+    total = np.zeros(shape, dtype=np.float32)
+    counts = np.zeros(shape, dtype=np.int32)
+    for offset in np.ndindex(*factor):
+        part = arr[tuple(slice(o, None, f) for o, f in zip(offset, factor))]
+        region = tuple(slice(0, s) for s in part.shape)
+        total[region] += part
+        counts[region] += 1
+    total /= counts
+    return total.astype(arr.dtype)
+
+
+class ChunkedArray(ABC):
+    """
+    Read-only 3D array assembled from cached bricks
+
+    Indexing with integers and slices (steps allowed) reads only the bricks
+    that contain requested voxels; subclasses decode one brick at a time.
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, ...],
+        dtype,
+        brick: Tuple[int, ...],
+        cache: BrickCache,
+        owner: int,
+        level_key: tuple,
+    ):
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.brick = tuple(max(1, min(int(b), s)) for b, s in zip(brick, self.shape))
+        # Identify the source and level of the bricks in the shared cache
+        self.owner = owner
+        self.level_key = level_key
+        self._cache = cache
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[...]
+        return out if dtype is None else out.astype(dtype)
+
+    def __getitem__(self, index) -> np.ndarray:
+        self._mark_access()
+        ranges, squeeze = _axis_ranges(index, self.shape)
+        out = np.empty(tuple(len(r) for r in ranges), dtype=self.dtype)
+        if out.size:
+            groups = [_brick_groups(r, b) for r, b in zip(ranges, self.brick)]
+            for parts in itertools.product(*groups):
+                number, target, local = zip(*parts)
+                out[target] = self._get_brick(number)[local]
+        return out.reshape(
+            tuple(n for axis, n in enumerate(out.shape) if axis not in squeeze)
+        )
+
+    def _get_brick(self, number: Tuple[int, ...]) -> np.ndarray:
+        key = (self.owner, self.level_key, number)
+        brick = self._cache.get(key)
+        if brick is None:
+            region = tuple(
+                slice(n * b, min((n + 1) * b, s))
+                for n, b, s in zip(number, self.brick, self.shape)
+            )
+            brick = np.ascontiguousarray(self._read(region), dtype=self.dtype)
+            self._cache.put(key, brick)
+        return brick
+
+    @abstractmethod
+    def _read(self, region: Tuple[slice, ...]) -> np.ndarray:
+        """Decode the voxels of one brick-aligned region"""
+
+    def _mark_access(self) -> None:
+        """Record a read for idle tracking (see ChunkedSource.last_access)"""
+
+
+class DownsampledLevel(ChunkedArray):
+    """A coarser level computed brick by brick from a finer one"""
+
+    def __init__(
+        self,
+        parent: ChunkedArray,
+        factor: Tuple[int, ...],
+        relative: Tuple[int, ...],
+        mode: str,
+    ):
+        shape = tuple(-(-s // r) for s, r in zip(parent.shape, relative))
+        super().__init__(
+            shape,
+            parent.dtype,
+            DEFAULT_BRICK,
+            parent._cache,
+            parent.owner,
+            (factor, mode),
+        )
+        self.parent = parent
+        self.relative = relative
+        self.mode = mode
+
+    def _read(self, region: Tuple[slice, ...]) -> np.ndarray:
+        if self.mode == "stride":
+            # Labels keep one voxel per block; only bricks holding it are read
+            return self.parent[
+                tuple(
+                    slice(sl.start * r, sl.stop * r, r)
+                    for sl, r in zip(region, self.relative)
+                )
+            ]
+        source = self.parent[
+            tuple(
+                slice(sl.start * r, sl.stop * r) for sl, r in zip(region, self.relative)
+            )
+        ]
+        return _downsample_mean(source, self.relative)
+
+    def _mark_access(self) -> None:
+        # Cached bricks never reach the parent, so pass the read up explicitly
+        self.parent._mark_access()
+
+
+class ChunkedSource(ChunkedArray):
+    """
+    Lazy 3D view of a VolumeHandle for neuroglancer layers
+
+    Nothing is read until a region is requested. Chunked backends (HDF5,
+    zarr, NPY) are read in chunk-aligned bricks; paged backends (TIFF,
+    image sequences) one whole slice at a time, since that is what they
+    decode anyway. Downsampled levels are built on demand, each from the
+    next finer level. Bricks of all levels go to a cache shared with other
+    sources (brick_cache by default). 2D images get a z axis of length 1.
+    """
+
+    def __init__(self, handle: VolumeHandle, cache: Optional[BrickCache] = None):
+        if handle.ndim not in (2, 3):
+            handle.close()
+            raise ValueError(
+                f"Neuroglancer layers need a 2D or 3D volume, got {handle.ndim}D"
+            )
+        self.handle = handle
+        self._flat = handle.ndim == 2
+        shape = (1,) + handle.shape if self._flat else handle.shape
+        chunks = handle.chunks
+        if chunks is not None and self._flat:
+            chunks = (1,) + chunks
+        if not isinstance(handle, ArrayHandle):
+            brick = (1,) + shape[1:]
+        elif chunks is None:
+            brick = DEFAULT_BRICK
+        else:
+            # Whole storage chunks, grouped up to about the default brick size
+            brick = tuple(c * max(1, d // c) for c, d in zip(chunks, DEFAULT_BRICK))
+        super().__init__(
+            shape,
+            handle.dtype,
+            brick,
+            brick_cache if cache is None else cache,
+            next(_owner_ids),
+            ((1,) * 3, None),
+        )
+        self._levels: Dict[Tuple[Tuple[int, ...], str], ChunkedArray] = {}
+        self._levels_lock = threading.RLock()
+        # Monotonic time of the last read from any level, cached or not
+        self.last_access = time.monotonic()
+
+    def _mark_access(self) -> None:
+        self.last_access = time.monotonic()
+
+    def _read(self, region: Tuple[slice, ...]) -> np.ndarray:
+        if self._flat:
+            return self.handle[region[1:]][np.newaxis]
+        return self.handle[region]
+
+    def level(self, factor: Sequence[int], mode: str = "mean") -> ChunkedArray:
+        """
+        Array downsampled by factor along (z, y, x)
+
+        Args:
+            factor: Downsampling factor per axis
+            mode: "mean" averages blocks (images); "stride" keeps the first
+                voxel of each block (labels)
+
+        Returns:
+            The level, built on first use
+        """
+        factor = tuple(int(f) for f in factor)
+        if any(f < 1 for f in factor):
+            raise ValueError(f"Invalid downsampling factor {factor}")
+        if all(f == 1 for f in factor):
+            return self
+        with self._levels_lock:
+            level = self._levels.get((factor, mode))
+            if level is None:
+                # Halve even factors to find the next finer level, so coarse
+                # levels reuse the bricks of finer ones
+                parent_factor = tuple(f // 2 if f % 2 == 0 else 1 for f in factor)
+                parent = self.level(parent_factor, mode)
+                relative = tuple(f // p for f, p in zip(factor, parent_factor))
+                level = DownsampledLevel(parent, factor, relative, mode)
+                self._levels[(factor, mode)] = level
+        return level
+
+    def memory_footprint(self) -> int:
+        """Bytes of this source's bricks in the shared cache"""
+        return self._cache.owner_nbytes(self.owner)
+
+    def transpose(self) -> np.ndarray:
+        """Whole volume in (x, y, z) order, as the mesh generator expects"""
+        return np.asarray(self).transpose()
+
+    def close(self) -> None:
+        self._cache.discard(self.owner)
+        self.handle.close()
+
+
+class _ScaledReads:
+    """
+    LocalVolume data that reads downsampled scales from cached source levels
+
+    LocalVolume validates a chunk request, reads the full-resolution voxels
+    under it and downsamples them itself. While a request for a coarser
+    scale is served, reads come from the matching source level instead and
+    are repeated back up to full resolution, which LocalVolume's own
+    downsampling (averaging or striding) reduces to the level's values.
+    """
+
+    def __init__(self, source: ChunkedSource):
+        self.source = source
+        self.shape = source.shape
+        self.dtype = source.dtype
+        self._request = threading.local()
+
+    @contextmanager
+    def scale(self, scale_key: str, mode: str):
+        """Serve reads in this thread for a chunk request at scale_key"""
+        self._request.scale = (scale_key, mode)
+        try:
+            yield
+        finally:
+            self._request.scale = None
+
+    def transpose(self) -> np.ndarray:
+        return self.source.transpose()
+
+    def __getitem__(self, index) -> np.ndarray:
+        scale = getattr(self._request, "scale", None)
+        if scale is None:
+            return self.source[index]
+        # LocalVolume has validated the scale key before reading
+        factor = tuple(int(f) for f in scale[0].split(","))
+        if all(f == 1 for f in factor):
+            return self.source[index]
+        region = tuple(
+            slice(sl.start // f, -(-sl.stop // f)) for sl, f in zip(index, factor)
+        )
+        data = self.source.level(factor, scale[1])[region]
+        for axis, f in enumerate(factor):
+            if f > 1:
+                data = np.repeat(data, f, axis=axis)
+        return data[tuple(slice(0, sl.stop - sl.start) for sl in index)]
+
+
+def local_volume(source: ChunkedSource, **kwargs):
+    """neuroglancer.LocalVolume serving every scale from a ChunkedSource"""
+    return _lazy_local_volume_class()(source, **kwargs)
+
+
+@lru_cache(maxsize=None)
+def _lazy_local_volume_class():
+    import neuroglancer
+
+    class LazyLocalVolume(neuroglancer.LocalVolume):
+        """LocalVolume whose downsampled scales come from cached source levels"""
+
+        def __init__(self, source: ChunkedSource, **kwargs):
+            self._reads = _ScaledReads(source)
+            super().__init__(self._reads, **kwargs)
+            self.source = source
+
+        def get_encoded_subvolume(self, data_format, start, end, scale_key):
+            mode = "mean" if self.volume_type == "image" else "stride"
+            with self._reads.scale(scale_key, mode):
+                return super().get_encoded_subvolume(data_format, start, end, scale_key)
+
+    return LazyLocalVolume
@@ -0,0 +1,215 @@
+"""
+Persistent file-metadata cache
+Header metadata, label verdicts, intensity windows and thumbnails per file
+"""
+
+import os
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+from server_api.auth import database, models
+
+from .formats import VolumeInfo, probe
+from .labels import LabelVerdict, detect_label
+
+
+class FileSignature(NamedTuple):
+    """Identifies one version of a file on disk"""
+
+    physical_path: str
+    size: int
+    mtime_ns: int
+
+
+def file_signature(path: str) -> Optional[FileSignature]:
+    """
+    Signature of a file or directory; None if it does not exist (globs)
+
+    A directory (image sequence, zarr store) is signed by the total size and
+    latest mtime of everything inside it, so rewriting one member file in
+    place gives it a new signature.
+    """
+    path = os.path.abspath(str(path))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if os.path.isdir(path):
+        size, mtime_ns = _tree_stat(path, stat.st_mtime_ns)
+        return FileSignature(path, size, mtime_ns)
+    return FileSignature(path, stat.st_size, stat.st_mtime_ns)
+
+
+def _tree_stat(path: str, mtime_ns: int) -> Tuple[int, int]:
+    """Total file size and latest mtime below a directory"""
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue  # removed while walking
+            mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+            if name in files:
+                size += stat.st_size
+    return size, mtime_ns
+
+
+def _load(signature: FileSignature, *columns: str) -> Optional[Dict[str, object]]:
+    """Cached columns for a signature; None unless all of them are set"""
+    db = database.SessionLocal()
+    try:
+        row = (
+            db.query(models.FileMetadata).filter_by(**signature._asdict()).one_or_none()
+        )
+        if row is None:
+            return None
+        values = {column: getattr(row, column) for column in columns}
+    finally:
+        db.close()
+    if any(value is None for value in values.values()):
+        return None
+    return values
+
+
+def _store(signature: FileSignature, **values) -> None:
+    """Record columns for a signature and drop rows of older file versions"""
+    db = database.SessionLocal()
+    try:
+        for _ in range(2):
+            query = db.query(models.FileMetadata)
+            query.filter(
+                models.FileMetadata.physical_path == signature.physical_path,
+                (models.FileMetadata.size != signature.size)
+                | (models.FileMetadata.mtime_ns != signature.mtime_ns),
+            ).delete(synchronize_session=False)
+            row = query.filter_by(**signature._asdict()).one_or_none()
+            if row is None:
+                row = models.FileMetadata(**signature._asdict())
+                db.add(row)
+            for column, value in values.items():
+                setattr(row, column, value)
+            try:
+                db.commit()
+                return
+            except IntegrityError:
+                # Another request inserted the row first; update it instead
+                db.rollback()
+    finally:
+        db.close()
+
+
+def _cached(
+    path: str,
+    columns: Tuple[str, ...],
+    compute: Callable[[], Dict[str, object]],
+) -> Dict[str, object]:
+    signature = file_signature(path)
+    if signature is not None:
+        cached = _load(signature, *columns)
+        if cached is not None:
+            return cached
+    values = compute()
+    if signature is not None:
+        _store(signature, **values)
+    return values
+
+
+def _join(values) -> Optional[str]:
+    return ",".join(str(v) for v in values) if values else None
+
+
+def _split(text: Optional[str]) -> Optional[Tuple[int, ...]]:
+    return tuple(int(v) for v in text.split(",")) if text else None
+
+
+_HEADER_COLUMNS = ("format", "shape", "dtype", "chunks")
+
+
+def _header(path: str) -> Dict[str, object]:
+    info = probe(path)
+    return {
+        "format": info.format,
+        "shape": _join(info.shape),
+        "dtype": info.dtype.str,
+        "chunks": _join(info.chunks) or "",  # "" marks "not chunked" as known
+    }
+
+
+def volume_info(path: str) -> VolumeInfo:
+    """Shape, dtype and chunking of a dataset; opens the file on a miss"""
+    values = _cached(path, _HEADER_COLUMNS, lambda: _header(path))
+    return VolumeInfo(
+        str(path),
+        values["format"],
+        _split(values["shape"]),
+        np.dtype(values["dtype"]),
+        _split(values["chunks"]),
+    )
+
+
+def label_verdict(path: str) -> LabelVerdict:
+    """Whether a file holds labels; samples the file on a miss"""
+
+    def compute():
+        verdict = detect_label(path)
+        return {
+            # The handle is already cached, so the header comes for free
+            **_header(path),
+            "is_label": verdict.is_label,
+            "label_values": verdict.num_values,
+            "label_exact": verdict.exact,
+        }
+
+    values = _cached(path, ("is_label", "label_values", "label_exact"), compute)
+    return LabelVerdict(
+        values["is_label"], values["label_values"], values["label_exact"]
+    )
+
+
+def intensity_window(
+    path: str, percentiles: str, fit: Callable[[], Tuple[float, float]]
+) -> Tuple[float, float]:
+    """
+    Display intensity window of a dataset
+
+    Args:
+        path: Dataset path
+        percentiles: Identifies the fitting parameters, e.g. "0.5:99.5";
+            a window fitted with other parameters is recomputed
+        fit: Computes (low, high) on a miss
+
+    Returns:
+        (low, high)
+    """
+    signature = file_signature(path)
+    if signature is not None:
+        cached = _load(
+            signature, "intensity_low", "intensity_high", "intensity_percentiles"
+        )
+        if cached is not None and cached["intensity_percentiles"] == percentiles:
+            return cached["intensity_low"], cached["intensity_high"]
+    low, high = fit()
+    if signature is not None:
+        _store(
+            signature,
+            intensity_low=float(low),
+            intensity_high=float(high),
+            intensity_percentiles=percentiles,
+        )
+    return low, high
+
+
+def thumbnail(path: str, render: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+    """PNG thumbnail of a file; render() returns None if it can't be made"""
+    signature = file_signature(path)
+    if signature is not None:
+        cached = _load(signature, "thumbnail")
+        if cached is not None:
+            return cached["thumbnail"]
+    data = render()
+    if data is not None and signature is not None:
+        _store(signature, thumbnail=data)
+    return data
@@ -0,0 +1,560 @@
+"""
+Volume format registry
+Opens TIFF, HDF5, zarr, N5, NPY, NIfTI and image stacks behind one handle type
+"""
+
+import os
+import glob
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+MAX_OPEN_HANDLES = int(os.environ.get("PYTC_MAX_OPEN_VOLUMES", 32))
+
+IMAGE_EXTENSIONS = ["*.tif", "*.tiff", "*.png", "*.jpg", "*.jpeg"]
+
+# PIL modes that np.array() keeps as a single channel, and their dtypes
+_PIL_DTYPES = {
+    "1": np.bool_,
+    "L": np.uint8,
+    "P": np.uint8,
+    "I;16": np.uint16,
+    "I;16B": np.uint16,
+    "I": np.int32,
+    "F": np.float32,
+}
+
+
+class VolumeInfo(NamedTuple):
+    """Metadata of a dataset, read without decoding pixel data"""
+
+    path: str
+    format: str
+    shape: Tuple[int, ...]
+    dtype: np.dtype
+    chunks: Optional[Tuple[int, ...]]
+
+
+class VolumeHandle(ABC):
+    """
+    An open dataset
+
+    shape, dtype and chunks come from headers only; indexing reads just the
+    requested region (whole chunks, pages or files). Handles are not
+    thread-safe unless the backend is; close() releases the file.
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, ...],
+        dtype,
+        chunks: Optional[Tuple[int, ...]] = None,
+    ):
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.chunks = tuple(int(c) for c in chunks) if chunks else None
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    @abstractmethod
+    def __getitem__(self, index) -> np.ndarray:
+        """Read the indexed region"""
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[...]
+        return out if dtype is None else out.astype(dtype)
+
+    def read(self, z=None, y=None, x=None) -> np.ndarray:
+        """Read the region inside (z, y, x) bounds; None keeps an axis whole"""
+        return self[region_index(self.ndim, z, y, x)]
+
+    def close(self) -> None:
+        pass
+
+
+def region_index(ndim: int, z=None, y=None, x=None) -> tuple:
+    """Index tuple for (z, y, x) bounds; 2D data only has slice 0"""
+    yx = tuple(slice(None) if b is None else b for b in (y, x))
+    if ndim == 2:
+        if z not in (None, 0):
+            raise IndexError(f"z={z} is out of range for a 2D image")
+        return yx
+    return (slice(None) if z is None else z,) + yx
+
+
+class ArrayHandle(VolumeHandle):
+    """Handle over an array-like (h5py dataset, zarr array, memmap, ...)"""
+
+    def __init__(self, array, owner=None, chunks=None):
+        super().__init__(
+            array.shape, array.dtype, chunks or getattr(array, "chunks", None)
+        )
+        self.array = array
+        self._owner = owner
+
+    def __getitem__(self, index) -> np.ndarray:
+        return np.asarray(self.array[index])
+
+    def close(self) -> None:
+        if self._owner is not None:
+            self._owner.close()
+            self._owner = None
+
+
+class TiffHandle(VolumeHandle):
+    """TIFF series; indexing the first axis of a stack decodes only those pages"""
+
+    def __init__(self, path: str):
+        import tifffile
+
+        self._tif = tifffile.TiffFile(path)
+        self._lock = threading.Lock()
+        series = self._tif.series[0]
+        page = series.keyframe
+        if page.is_tiled:
+            plane = (page.tilelength, page.tilewidth)
+        else:
+            rows = getattr(page, "rowsperstrip", 0) or page.shape[0]
+            plane = (min(rows, page.shape[0]), page.shape[1])
+        chunks = (1,) * (len(series.shape) - 2) + plane
+        super().__init__(series.shape, series.dtype, chunks)
+        # One page per z-slice: z can be read page by page
+        self._paged = self.ndim >= 3 and len(self._tif.pages) == self.shape[0]
+
+    def __getitem__(self, index) -> np.ndarray:
+        index = index if isinstance(index, tuple) else (index,)
+        if self._paged and index and index[0] is not Ellipsis:
+            keys = np.arange(self.shape[0])[index[0]]
+            with self._lock:
+                out = self._tif.asarray(key=keys.tolist())
+            if keys.ndim and out.ndim == self.ndim - 1:
+                out = out[np.newaxis]  # a one-page selection keeps its z axis
+            return out[(slice(None),) * keys.ndim + index[1:]]
+        with self._lock:
+            out = self._tif.series[0].asarray()
+        return out[index]
+
+    def close(self) -> None:
+        self._tif.close()
+
+
+class ImageSequenceHandle(VolumeHandle):
+    """Sorted image files stacked along z; only the indexed files are decoded"""
+
+    def __init__(self, files: List[str]):
+        if not files:
+            raise ValueError("Image sequence is empty")
+        self.files = files
+        shape, dtype = image_file_info(files[0])
+        super().__init__((len(files),) + shape, dtype, (1,) + shape)
+
+    def __getitem__(self, index) -> np.ndarray:
+        index = index if isinstance(index, tuple) else (index,)
+        if not index or index[0] is Ellipsis:
+            index = (slice(None),) + index
+        keys = np.arange(self.shape[0])[index[0]]
+        if keys.ndim == 0:
+            return read_image_file(self.files[int(keys)])[index[1:]]
+        out = np.empty((len(keys),) + self.shape[1:], dtype=self.dtype)
+        for i, key in enumerate(keys):
+            out[i] = read_image_file(self.files[key])
+        return out[(slice(None),) + index[1:]]
+
+
+class ImageFileHandle(VolumeHandle):
+    """Single 2D image; the header gives the shape, indexing decodes it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        shape, dtype = image_file_info(path)
+        super().__init__(shape, dtype, shape)
+
+    def __getitem__(self, index) -> np.ndarray:
+        return read_image_file(self.path)[index]
+
+
+def image_file_info(path: str) -> Tuple[Tuple[int, ...], np.dtype]:
+    """Shape and dtype of a 2D image file from its header"""
+    if path.lower().endswith((".tif", ".tiff")):
+        import tifffile
+
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            return tuple(page.shape), np.dtype(page.dtype)
+
+    from PIL import Image
+
+    with Image.open(path) as img:
+        width, height = img.size
+        if img.mode in _PIL_DTYPES:
+            return (height, width), np.dtype(_PIL_DTYPES[img.mode])
+        return (height, width, len(img.getbands())), np.dtype(np.uint8)
+
+
+def read_image_file(path: str) -> np.ndarray:
+    """Decode a 2D image file"""
+    if path.lower().endswith((".tif", ".tiff")):
+        import tifffile
+
+        return tifffile.imread(path, key=0)
+
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return np.array(img)
+
+
+def first_dataset_key(group) -> Optional[str]:
+    """Find the first array-like member of an HDF5/zarr group (depth-first)"""
+    for name in sorted(group.keys()):
+        member = group[name]
+        if _is_array(member):
+            return name
+        if hasattr(member, "keys"):
+            child = first_dataset_key(member)
+            if child is not None:
+                return f"{name}/{child}"
+    return None
+
+
+def _is_array(node) -> bool:
+    return hasattr(node, "shape") and hasattr(node, "dtype")
+
+
+def list_image_files(path: str) -> List[str]:
+    """List the image slices of a directory or glob pattern in sorted order"""
+    files = []
+    if os.path.isdir(path):
+        for ext in IMAGE_EXTENSIONS:
+            files.extend(glob.glob(os.path.join(path, ext)))
+            files.extend(glob.glob(os.path.join(path, ext.upper())))
+    else:
+        files = glob.glob(path)
+    # Case-insensitive filesystems return the same file for both patterns
+    return sorted(set(files))
+
+
+class VolumeFormat(ABC):
+    """
+    A readable dataset format
+
+    Subclasses set name and extensions and implement open(); matches() may
+    be overridden for formats recognised by content (e.g. zarr directories),
+    and write() for formats that can be updated in place.
+    """
+
+    name = ""
+    extensions: Tuple[str, ...] = ()
+
+    def matches(self, path: str) -> bool:
+        if "*" in path or "?" in path:
+            return False  # glob patterns are image sequences
+        return path.lower().rstrip("/\\").endswith(self.extensions)
+
+    @abstractmethod
+    def open(self, path: str, key: Optional[str] = None) -> VolumeHandle:
+        """Open a dataset; key selects one inside a container format"""
+
+    def write(
+        self,
+        path: str,
+        index: Optional[int],
+        data: np.ndarray,
+        key: Optional[str] = None,
+    ) -> None:
+        """
+        Overwrite one z-slice of a dataset in place
+
+        Args:
+            path: Dataset path
+            index: Slice to replace; None replaces a whole 2D dataset
+            data: New slice
+            key: Dataset inside a container format (default: first one)
+        """
+        raise ValueError(f"Writing {self.name} files is not supported")
+
+
+class TiffFormat(VolumeFormat):
+    name = "tiff"
+    extensions = (".tif", ".tiff")
+
+    def open(self, path, key=None):
+        return TiffHandle(path)
+
+
+class HDF5Format(VolumeFormat):
+    name = "hdf5"
+    extensions = (".h5", ".hdf5", ".hdf")
+
+    def open(self, path, key=None):
+        import h5py
+
+        f = h5py.File(path, "r")
+        key = key or first_dataset_key(f)
+        if key is None:
+            f.close()
+            raise ValueError(f"No dataset found in HDF5 file: {path}")
+        return ArrayHandle(f[key], owner=f)
+
+    def write(self, path, index, data, key=None):
+        import h5py
+
+        with h5py.File(path, "r+") as f:
+            key = key or first_dataset_key(f)
+            if key is None:
+                raise ValueError(f"No dataset found in HDF5 file: {path}")
+            f[key][_slice_index(index)] = data
+
+
+class ZarrFormat(VolumeFormat):
+    name = "zarr"
+    extensions = (".zarr", ".zip")
+    markers = (".zarray", ".zgroup", "zarr.json")
+
+    def matches(self, path):
+        if super().matches(path):
+            return True
+        return os.path.isdir(path) and any(
+            os.path.exists(os.path.join(path, marker)) for marker in self.markers
+        )
+
+    def open(self, path, key=None):
+        return _zarr_handle(self._root(path, "r"), path, key)
+
+    def write(self, path, index, data, key=None):
+        _zarr_handle(self._root(path, "r+"), path, key).array[
+            _slice_index(index)
+        ] = data
+
+    def _root(self, path: str, mode: str):
+        import zarr
+
+        return zarr.open(path, mode=mode)
+
+
+class N5Format(ZarrFormat):
+    name = "n5"
+    extensions = (".n5",)
+    markers = ("attributes.json",)
+
+    def _root(self, path: str, mode: str):
+        import zarr
+
+        n5_store = getattr(zarr, "N5Store", None)
+        if n5_store is None:
+            raise ValueError("Reading N5 requires zarr<3")
+        return zarr.open(n5_store(path), mode=mode)
+
+
+def _slice_index(index: Optional[int]):
+    return Ellipsis if index is None else index
+
+
+def _zarr_handle(root, path: str, key: Optional[str]) -> ArrayHandle:
+    if not _is_array(root):
+        key = key or first_dataset_key(root)
+        if key is None:
+            raise ValueError(f"No array found in zarr group: {path}")
+        root = root[key]
+    return ArrayHandle(root)
+
+
+class NpyFormat(VolumeFormat):
+    name = "npy"
+    extensions = (".npy",)
+
+    def open(self, path, key=None):
+        return ArrayHandle(np.load(path, mmap_mode="r"))
+
+    def write(self, path, index, data, key=None):
+        array = np.load(path, mmap_mode="r+")
+        array[_slice_index(index)] = data
+        array.flush()
+        del array
+
+
+class NiftiFormat(VolumeFormat):
+    name = "nifti"
+    extensions = (".nii", ".nii.gz")
+
+    def open(self, path, key=None):
+        try:
+            import nibabel
+        except ImportError:
+            raise ValueError("Reading NIfTI requires nibabel")
+
+        img = nibabel.load(path)
+        # The array proxy reads only the indexed region, in the file's axis order
+        return ArrayHandle(img.dataobj, chunks=None)
+
+
+class TextFormat(VolumeFormat):
+    name = "txt"
+    extensions = (".txt",)
+
+    def open(self, path, key=None):
+        return ArrayHandle(np.loadtxt(path))
+
+
+class ImageFormat(VolumeFormat):
+    name = "image"
+    extensions = (".png", ".jpg", ".jpeg", ".bmp")
+
+    def open(self, path, key=None):
+        return ImageFileHandle(path)
+
+
+class ImageSequenceFormat(VolumeFormat):
+    name = "sequence"
+
+    def matches(self, path):
+        return os.path.isdir(path) or "*" in path or "?" in path
+
+    def open(self, path, key=None):
+        files = list_image_files(path)
+        if not files:
+            raise ValueError(f"No image files found at: {path}")
+        return ImageSequenceHandle(files)
+
+
+# Checked in order; directory formats come before the image sequence catch-all
+_FORMATS: List[VolumeFormat] = [
+    ZarrFormat(),
+    N5Format(),
+    TiffFormat(),
+    HDF5Format(),
+    NpyFormat(),
+    NiftiFormat(),
+    TextFormat(),
+    ImageFormat(),
+    ImageSequenceFormat(),
+]
+
+
+def register_format(volume_format: VolumeFormat) -> None:
+    """Add a format; it takes precedence over the built-in ones"""
+    _FORMATS.insert(0, volume_format)
+
+
+def detect_format(path: str) -> VolumeFormat:
+    """The format that reads a path"""
+    path = str(path)
+    for volume_format in _FORMATS:
+        if volume_format.matches(path):
+            return volume_format
+    raise ValueError(f"Can't read the file {path}")
+
+
+def open_handle(path: str, key: Optional[str] = None) -> VolumeHandle:
+    """Open a dataset; the caller owns the handle and must close it"""
+    path = str(path)
+    return detect_format(path).open(path, key)
+
+
+class HandleCache:
+    """
+    Bounded LRU of open dataset handles shared by metadata and region reads
+
+    Entries are keyed by path, dataset key and modification time, so a file
+    replaced on disk is reopened. A handle evicted while in use is closed
+    once its last user releases it.
+    """
+
+    def __init__(self, max_handles: int = MAX_OPEN_HANDLES):
+        self.max_handles = max_handles
+        self._handles: "OrderedDict[tuple, VolumeHandle]" = OrderedDict()
+        self._users = {}
+        self._evicted = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def acquire(self, path: str, key: Optional[str] = None) -> Iterator[VolumeHandle]:
+        path = str(path)
+        cache_key = (os.path.abspath(path), key, _mtime(path))
+        # A handle is registered as in use in the same locked block that
+        # finds or inserts it, so a concurrent eviction defers closing it
+        with self._lock:
+            handle = self._handles.get(cache_key)
+            if handle is not None:
+                self._handles.move_to_end(cache_key)
+                self.hits += 1
+                self._add_user(handle)
+        if handle is None:
+            opened = open_handle(path, key)
+            with self._lock:
+                self.misses += 1
+                handle = self._handles.get(cache_key)
+                if handle is None:
+                    handle = self._handles[cache_key] = opened
+                    opened = None
+                self._add_user(handle)
+                self._evict()
+            if opened is not None:
+                # Another thread opened the same file first
+                opened.close()
+        try:
+            yield handle
+        finally:
+            self._release(handle)
+
+    def clear(self) -> None:
+        with self._lock:
+            while self._handles:
+                self._drop(next(iter(self._handles)))
+
+    def _add_user(self, handle: VolumeHandle) -> None:
+        self._users[id(handle)] = self._users.get(id(handle), 0) + 1
+
+    def _release(self, handle: VolumeHandle) -> None:
+        with self._lock:
+            users = self._users[id(handle)] - 1
+            if users:
+                self._users[id(handle)] = users
+                return
+            del self._users[id(handle)]
+            if id(handle) not in self._evicted:
+                return
+            self._evicted.discard(id(handle))
+        handle.close()
+
+    def _evict(self) -> None:
+        while len(self._handles) > self.max_handles:
+            self._drop(next(iter(self._handles)))
+
+    def _drop(self, cache_key: tuple) -> None:
+        handle = self._handles.pop(cache_key)
+        if id(handle) in self._users:
+            self._evicted.add(id(handle))
+        else:
+            handle.close()
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None  # glob patterns
+
+
+handle_cache = HandleCache()
+
+
+def probe(path: str, key: Optional[str] = None) -> VolumeInfo:
+    """Shape, dtype and chunking of a dataset without reading pixel data"""
+    path = str(path)
+    with handle_cache.acquire(path, key) as handle:
+        return VolumeInfo(
+            path, detect_format(path).name, handle.shape, handle.dtype, handle.chunks
+        )
@@ -3,6 +3,8 @@ import sys
 
 import numpy as np
 
+from .formats import detect_format, handle_cache, open_handle
+
 
 def mkdir(fn, opt=""):
     if opt == "parent":  # until the last path separator
@@ -15,44 +17,33 @@ def mkdir(fn, opt=""):
             os.mkdir(fn)
 
 
-def readVol(filename, z=None, kk=None, image_type="im"):
+def readVol(filename, z=None, kk=None, image_type="im", y=None, x=None, lazy=False):
+    """
+    Read a volume or a region of it
 
-    filename = str(filename)
+    z, y and x are an index or slice along each axis; only the chunks,
+    pages or files inside the region are read. Without bounds a TIFF
+    returns its first page, as it always has; pass z=slice(None) for the
+    whole stack. With lazy=True an open VolumeHandle is returned instead
+    (index it to read; the caller closes it), and region bounds are not
+    allowed.
+    """
     # image_type="seg": 1-channel
-    if filename[-2:] == "h5":
-        import h5py
-
-        tmp = h5py.File(filename, "r")
-        if kk is None:
-            kk = list(tmp)[0]
-        if z is not None:
-            out = np.array(tmp[kk][z])
-        else:
-            out = np.array(tmp[kk])
-    elif filename[-3:] == "zip":
-        import zarr
-
-        tmp = zarr.open_group(filename)
-        if kk is None:
-            kk = tmp.info_items()[-1][1]
-            if "," in kk:
-                kk = kk[: kk.find(",")]
-        out = np.array(tmp[kk][z])
-    elif filename[-3:] in ["jpg", "png", "tif", "iff"]:
-        import imageio
-
-        if z is None:  # image
-            out = imageio.imread(filename)
-        else:  # volume data (tif)
-            out = imageio.volread(filename)
-    elif filename[-3:] == "txt":
-        out = np.loadtxt(filename)
-    elif filename[-3:] == "npy":
-        out = np.load(filename)
-    else:
-        raise ValueError(f"Can't read the file {filename}")
-
-    return out
+    filename = str(filename)
+    has_roi = any(b is not None for b in (z, y, x))
+    if lazy:
+        if has_roi:
+            raise ValueError("Region bounds can't be combined with lazy=True")
+        return open_handle(filename, kk)
+    if not has_roi and detect_format(filename).name == "tiff":
+        import tifffile
+
+        return tifffile.imread(filename, key=0)
+
+    with handle_cache.acquire(filename, kk) as handle:
+        if has_roi:
+            return handle.read(z, y, x)
+        return handle[...]
 
 
 def readImage(filename):
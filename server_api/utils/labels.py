@@ -0,0 +1,137 @@
+"""
+Label detection for volumes
+Decides whether a file holds labels from a sample of its chunks or slices
+"""
+
+import os
+from functools import lru_cache
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+from .formats import ArrayHandle, VolumeHandle, handle_cache
+
+# A label volume has fewer distinct values than this
+LABEL_MAX_VALUES = int(os.environ.get("PYTC_LABEL_MAX_VALUES", 50))
+# Volumes up to this size are read whole and classified exactly
+LABEL_FULL_READ_BYTES = int(os.environ.get("PYTC_LABEL_FULL_READ_BYTES", 16 * 1024**2))
+LABEL_SAMPLE_SLICES = int(os.environ.get("PYTC_LABEL_SAMPLE_SLICES", 16))
+# Blocks per slice along y and x when the backend can read regions
+LABEL_SAMPLE_GRID = int(os.environ.get("PYTC_LABEL_SAMPLE_GRID", 3))
+LABEL_SAMPLE_BLOCK = int(os.environ.get("PYTC_LABEL_SAMPLE_BLOCK", 256))
+VERDICT_CACHE_SIZE = 1024
+
+
+class LabelVerdict(NamedTuple):
+    """Outcome of label detection"""
+
+    is_label: bool
+    # Distinct values seen before the verdict was reached
+    num_values: int
+    # True if every voxel was examined
+    exact: bool
+
+
+def _distinct(arr: np.ndarray) -> np.ndarray:
+    """Sorted distinct values; bincount is linear time for small integers"""
+    if arr.dtype.kind in "bu" and arr.dtype.itemsize <= 2:
+        return np.flatnonzero(np.bincount(arr.ravel()))
+    return np.unique(arr)
+
+
+def _block_starts(length: int, block: int, count: int, align: int) -> np.ndarray:
+    """Evenly spread block origins along an axis, aligned to chunk edges"""
+    if length <= block:
+        return np.zeros(1, dtype=int)
+    starts = np.linspace(0, length - block, count).astype(int)
+    return np.unique(starts // align * align)
+
+
+def _sample_regions(handle: VolumeHandle) -> Iterator[tuple]:
+    """Index tuples of the sampled slices or blocks, in reading order"""
+    if handle.ndim >= 3:
+        count = min(handle.shape[0], LABEL_SAMPLE_SLICES)
+        slices = np.unique(np.linspace(0, handle.shape[0] - 1, count).astype(int))
+        prefix, axes = [(int(z),) for z in slices], 1
+    else:
+        prefix, axes = [()], 0
+
+    if not isinstance(handle, ArrayHandle):
+        # Pages and image files decode whole slices; read each one once
+        yield from prefix
+        return
+
+    chunks = handle.chunks or handle.shape
+    edges = []
+    for axis in (axes, axes + 1):
+        length, chunk = handle.shape[axis], max(chunks[axis], 1)
+        block = min(length, max(chunk, LABEL_SAMPLE_BLOCK))
+        starts = _block_starts(length, block, LABEL_SAMPLE_GRID, chunk)
+        edges.append([slice(int(s), int(s) + block) for s in starts])
+    for index in prefix:
+        for y in edges[0]:
+            for x in edges[1]:
+                yield index + (y, x)
+
+
+def classify_label(
+    handle: VolumeHandle, max_values: int = LABEL_MAX_VALUES
+) -> LabelVerdict:
+    """
+    Decide whether a dataset holds labels
+
+    Integer volumes with fewer than max_values distinct values are labels.
+    Small volumes are read whole; larger ones are sampled at evenly spaced
+    slices (and chunk-aligned blocks where the backend reads regions), and
+    reading stops as soon as the distinct values exceed the threshold.
+
+    Args:
+        handle: Open dataset
+        max_values: Distinct-value threshold for labels
+
+    Returns:
+        The verdict
+    """
+    if handle.dtype.kind not in "biu":
+        return LabelVerdict(False, 0, True)
+
+    exact = handle.nbytes <= LABEL_FULL_READ_BYTES
+    regions = [Ellipsis] if exact else _sample_regions(handle)
+    seen = np.empty(0, dtype=handle.dtype)
+    for index in regions:
+        seen = np.union1d(seen, _distinct(handle[index]))
+        if len(seen) >= max_values:
+            return LabelVerdict(False, len(seen), exact)
+    return LabelVerdict(True, len(seen), exact)
+
+
+@lru_cache(maxsize=VERDICT_CACHE_SIZE)
+def _cached_verdict(
+    path: str, key: Optional[str], mtime_ns: int, max_values: int
+) -> LabelVerdict:
+    with handle_cache.acquire(path, key) as handle:
+        return classify_label(handle, max_values)
+
+
+def detect_label(
+    path: str, key: Optional[str] = None, max_values: int = LABEL_MAX_VALUES
+) -> LabelVerdict:
+    """
+    Label verdict for a file, cached by path and modification time
+
+    Args:
+        path: Any path the format registry reads
+        key: Dataset inside an HDF5/zarr container (default: first one)
+        max_values: Distinct-value threshold for labels
+
+    Returns:
+        The verdict
+    """
+    path = os.path.abspath(str(path))
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        # Glob patterns have no single mtime; classify without caching
+        with handle_cache.acquire(path, key) as handle:
+            return classify_label(handle, max_values)
+    return _cached_verdict(path, key, mtime_ns, max_values)
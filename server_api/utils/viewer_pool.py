@@ -0,0 +1,233 @@
+"""
+Neuroglancer viewer pool
+Keeps viewers for recently opened datasets within an idle TTL and memory budget
+"""
+
+import logging
+import os
+import pathlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NG_BIND_ADDRESS = os.environ.get("PYTC_NG_BIND_ADDRESS", "0.0.0.0")
+NG_PORT = int(os.environ.get("PYTC_NG_PORT", 4244))
+DEFAULT_MAX_BYTES = int(os.environ.get("PYTC_NG_CACHE_MAX_BYTES", 2 * 1024**3))
+DEFAULT_IDLE_TTL = float(os.environ.get("PYTC_NG_CACHE_IDLE_TTL", 30 * 60))
+DEFAULT_MAX_VIEWERS = int(os.environ.get("PYTC_NG_CACHE_MAX_VIEWERS", 16))
+
+_server_lock = threading.Lock()
+_server_bound = False
+
+
+def ensure_server() -> None:
+    """Bind the neuroglancer server once; every viewer shares it"""
+    global _server_bound
+    import neuroglancer
+
+    with _server_lock:
+        if not _server_bound:
+            # Bind to all interfaces so the viewer is reachable from outside
+            # a container
+            neuroglancer.set_server_bind_address(NG_BIND_ADDRESS, NG_PORT)
+            _server_bound = True
+
+
+def _file_version(path) -> tuple:
+    path = os.path.abspath(str(path))
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None  # glob patterns
+
+
+def viewer_key(image, label, scales: Sequence[float]) -> tuple:
+    """Pool key of a dataset; a file changed on disk gets a new viewer"""
+    return (
+        _file_version(image),
+        _file_version(label) if label else None,
+        tuple(float(s) for s in scales),
+    )
+
+
+def _resident_bytes(volume) -> int:
+    """Memory a volume holds; lazy handles and memmaps only hold metadata"""
+    if hasattr(volume, "memory_footprint"):
+        return volume.memory_footprint()
+    array = getattr(volume, "array", volume)
+    if isinstance(array, np.ndarray) and not isinstance(array, np.memmap):
+        return array.nbytes
+    return 0
+
+
+class ViewerEntry:
+    """A viewer together with the volumes and temporary files behind it"""
+
+    def __init__(
+        self,
+        viewer,
+        volumes: Iterable[Any],
+        cleanup_paths: Iterable[pathlib.Path] = (),
+    ):
+        self.viewer = viewer
+        self.url = str(viewer)
+        self.volumes = list(volumes)
+        self.cleanup_paths = list(cleanup_paths)
+
+    def memory_footprint(self) -> int:
+        return sum(_resident_bytes(volume) for volume in self.volumes)
+
+    def last_access(self) -> float:
+        """Monotonic time the browser last read a chunk of these volumes"""
+        return max(
+            (getattr(volume, "last_access", 0.0) for volume in self.volumes),
+            default=0.0,
+        )
+
+    def close(self) -> None:
+        """Detach the layers, close the volumes and remove uploaded files"""
+        with self.viewer.txn() as s:
+            s.layers.clear()
+        for volume in self.volumes:
+            if hasattr(volume, "close"):
+                volume.close()
+        for path in self.cleanup_paths:
+            try:
+                path.unlink()
+            except (FileNotFoundError, PermissionError):
+                pass
+
+
+class ViewerPool:
+    """
+    Least-recently-used pool of neuroglancer viewers keyed by dataset
+
+    Viewers are evicted when they have been idle for longer than idle_ttl
+    seconds (0 disables; a chunk read counts as use, so a viewer being
+    browsed never expires), when the volumes they hold exceed max_bytes, or
+    when more than max_viewers are open. Evicted viewers are rebuilt on the
+    next request for their dataset.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        idle_ttl: float = DEFAULT_IDLE_TTL,
+        max_viewers: int = DEFAULT_MAX_VIEWERS,
+    ):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.max_viewers = max_viewers
+        self._entries: "OrderedDict[tuple, ViewerEntry]" = OrderedDict()
+        self._last_used: Dict[tuple, float] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: tuple) -> Optional[ViewerEntry]:
+        """Return the pooled viewer and mark it as most recently used"""
+        with self._lock:
+            self._expire_idle()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key)
+            # Lazy sources grow as bricks are read, not only when pooled
+            self._enforce_budget()
+            return entry
+
+    def put(self, key: tuple, entry: ViewerEntry) -> ViewerEntry:
+        """
+        Pool a viewer and evict others to fit the budget
+
+        If a viewer for the key was pooled meanwhile, that one is kept and
+        returned, and the new one is closed.
+        """
+        with self._lock:
+            pooled = self._entries.get(key)
+            if pooled is not None and pooled is not entry:
+                self._release(entry)
+                entry = pooled
+            self._entries[key] = entry
+            self._touch(key)
+            self._expire_idle()
+            self._enforce_budget()
+            return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.memory_footprint() for entry in self._entries.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "viewers": len(self._entries),
+                "total_bytes": self.total_bytes(),
+                "max_bytes": self.max_bytes,
+                "max_viewers": self.max_viewers,
+                "idle_ttl": self.idle_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _touch(self, key: tuple) -> None:
+        self._entries.move_to_end(key)
+        self._last_used[key] = time.monotonic()
+
+    def _expire_idle(self) -> None:
+        if self.idle_ttl <= 0:
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        for key, entry in list(self._entries.items()):
+            last_used = max(self._last_used.get(key, 0), entry.last_access())
+            if last_used < cutoff:
+                self._evict(key)
+                self.expirations += 1
+
+    def _enforce_budget(self) -> None:
+        # The most recently used viewer is always kept, even if it alone is
+        # larger than the budget.
+        sizes = {key: entry.memory_footprint() for key, entry in self._entries.items()}
+        total = sum(sizes.values())
+        while len(self._entries) > 1 and (
+            total > self.max_bytes or len(self._entries) > self.max_viewers
+        ):
+            key = next(iter(self._entries))
+            total -= sizes.pop(key)
+            self._evict(key)
+            self.evictions += 1
+
+    def _evict(self, key: tuple) -> None:
+        entry = self._entries.pop(key)
+        self._last_used.pop(key, None)
+        logger.info("Evicting neuroglancer viewer %s", entry.url)
+        self._release(entry)
+
+    def _release(self, entry: ViewerEntry) -> None:
+        try:
+            entry.close()
+        except Exception:
+            logger.exception("Failed to close evicted neuroglancer viewer")
+
+
+viewer_pool = ViewerPool()
@@ -0,0 +1,76 @@
+"""
+Tests for the lazy neuroglancer volume
+LazyLocalVolume must encode chunks exactly like neuroglancer's own LocalVolume
+"""
+
+import importlib.util
+import unittest
+
+import numpy as np
+
+from server_api.utils.chunked_source import BrickCache, ChunkedSource, local_volume
+from server_api.utils.formats import ArrayHandle
+
+HAS_NEUROGLANCER = importlib.util.find_spec("neuroglancer") is not None
+
+
+@unittest.skipUnless(HAS_NEUROGLANCER, "neuroglancer is not installed")
+class LazyLocalVolumeTest(unittest.TestCase):
+    def setUp(self):
+        import neuroglancer
+
+        self.neuroglancer = neuroglancer
+        self.dimensions = neuroglancer.CoordinateSpace(
+            names=["z", "y", "x"], units="nm", scales=[1, 1, 1]
+        )
+        rng = np.random.default_rng(0)
+        self.image = rng.integers(0, 256, (6, 37, 29), dtype=np.uint8)
+        self.labels = rng.integers(0, 5, (6, 37, 29), dtype=np.uint32)
+
+    def volumes(self, array, volume_type):
+        source = ChunkedSource(ArrayHandle(array), cache=BrickCache())
+        self.addCleanup(source.close)
+        kwargs = dict(dimensions=self.dimensions, volume_type=volume_type)
+        return (
+            local_volume(source, **kwargs),
+            self.neuroglancer.LocalVolume(array, **kwargs),
+        )
+
+    def assert_same_chunks(self, lazy, upstream, scale_key, start, end):
+        start, end = np.array(start), np.array(end)
+        for data_format in ("npz", "raw"):
+            self.assertEqual(
+                lazy.get_encoded_subvolume(data_format, start, end, scale_key),
+                upstream.get_encoded_subvolume(data_format, start, end, scale_key),
+            )
+
+    def test_full_resolution(self):
+        lazy, upstream = self.volumes(self.image, "image")
+        self.assert_same_chunks(lazy, upstream, "1,1,1", [0, 0, 0], [6, 37, 29])
+        self.assert_same_chunks(lazy, upstream, "1,1,1", [2, 5, 3], [4, 20, 17])
+
+    def test_downsampled_image(self):
+        lazy, upstream = self.volumes(self.image, "image")
+        # Edge blocks are partial: 37 and 29 are not multiples of 2
+        self.assert_same_chunks(lazy, upstream, "1,2,2", [0, 0, 0], [6, 19, 15])
+        self.assert_same_chunks(lazy, upstream, "2,2,2", [1, 3, 2], [3, 19, 15])
+
+    def test_downsampled_labels(self):
+        lazy, upstream = self.volumes(self.labels, "segmentation")
+        self.assert_same_chunks(lazy, upstream, "1,2,2", [0, 0, 0], [6, 19, 15])
+        self.assert_same_chunks(lazy, upstream, "1,4,4", [0, 1, 1], [6, 10, 8])
+
+    def test_invalid_requests_are_rejected(self):
+        lazy, _ = self.volumes(self.image, "image")
+        start = np.array([0, 0, 0])
+        for scale_key, end in (
+            ("1,2,2", [6, 20, 15]),  # past the end of the scale
+            ("0,1,1", [6, 37, 29]),
+            ("1,1,128", [6, 37, 1]),  # beyond max_downsampling on one axis
+        ):
+            with self.assertRaises(ValueError):
+                lazy.get_encoded_subvolume("npz", start, np.array(end), scale_key)
+
+
+if __name__ == "__main__":
+    unittest.main()